@@ -0,0 +1,394 @@
+"""
+Typed client for the Mood Music FastAPI server (server/main.py).
+
+Both clients keep a pool of keep-alive connections, apply per-phase
+timeouts and retry requests shed with 429, honouring Retry-After. They send
+the server a request deadline a little inside their own read timeout, so a
+slow search comes back with partial results instead of timing out.
+
+    with MoodMusicClient("http://localhost:8000") as client:
+        mood = client.detect_mood(image_bytes)
+        music = client.get_music(manual_mood=mood.emotion, language="hindi")
+
+    async with AsyncMoodMusicClient("http://localhost:8000") as client:
+        music = await client.get_music(image=image_bytes)
+"""
+import asyncio
+import base64
+import struct
+import time
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+
+ImageInput = Union[bytes, str]
+
+DEFAULT_TIMEOUT = httpx.Timeout(connect=3.0, read=90.0, write=15.0, pool=5.0)
+MAX_RETRY_AFTER_SECONDS = 10.0
+# Matches server/deadline.py
+DEADLINE_HEADER = "X-Request-Timeout"
+DEADLINE_MARGIN_SECONDS = 2.0
+
+
+class MoodMusicAPIError(Exception):
+    """Raised for non-2xx responses from the server"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class EmotionResult:
+    emotion: str
+    confidence: float
+    deepface_available: bool
+
+
+@dataclass
+class Video:
+    url: str
+    title: str
+    duration: Optional[str] = None
+    duration_seconds: Optional[int] = None
+    view_count: Optional[int] = None
+    channel: Optional[str] = None
+    thumbnail: Optional[str] = None
+    published: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Video":
+        # Ignore fields added by newer servers
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+
+
+@dataclass
+class MusicResult:
+    videos: List[Video]
+    total_count: int
+    mood: str
+    language: str
+    search_stats: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class BatchItem:
+    index: int
+    language: str
+    mood: Optional[str] = None
+    confidence: Optional[float] = None
+    videos: List[Video] = field(default_factory=list)
+    total_count: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchResult:
+    results: List[BatchItem]
+    distinct_queries: int
+    total_queries: int
+    search_stats: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class SimilarResult:
+    videos: List[Video]
+    scores: List[float]
+    seeds_found: int
+    index_size: int
+
+
+@dataclass
+class ServerStatus:
+    deepface_available: bool
+    deepface_error: Optional[str]
+    supported_emotions: List[str]
+    supported_languages: List[str]
+    search_history_stats: Dict[str, Any] = field(default_factory=dict)
+
+
+def encode_image(image: ImageInput) -> str:
+    """Base64-encode raw image bytes; strings are assumed to be encoded already"""
+    if isinstance(image, str):
+        return image
+    return base64.b64encode(image).decode("ascii")
+
+
+# Face tensor format, matching server/face_tensor.py
+FACE_TENSOR_CONTENT_TYPE = "application/x-face-tensor"
+FACE_TENSOR_HEADER = struct.Struct("<4sBBHHH")
+FACE_SIZE = 48
+
+
+def build_face_tensor(pixels: bytes, height: int = FACE_SIZE, width: int = FACE_SIZE) -> bytes:
+    """
+    Wrap one grayscale uint8 face crop (row-major, e.g. numpy's tobytes())
+    for /detect-mood/face or build_capture(face_tensor=...)
+    """
+    if len(pixels) != height * width:
+        raise ValueError(f"Expected {height * width} pixels, got {len(pixels)}")
+    return FACE_TENSOR_HEADER.pack(b"MFT1", 0, 0, 1, height, width) + pixels
+
+
+def build_capture(image: Optional[ImageInput] = None, manual_mood: Optional[str] = None,
+                  language: str = "english", custom_preferences: str = "",
+                  max_results: int = 15, session_id: Optional[str] = None,
+                  clear_history: bool = False, face_tensor: Optional[bytes] = None) -> Dict[str, Any]:
+    """Build a WebcamCapture request body; face_tensor comes from build_face_tensor()"""
+    if image is None and manual_mood is None and face_tensor is None:
+        raise ValueError("One of image, face_tensor or manual_mood is required")
+    body: Dict[str, Any] = {
+        "image_data": encode_image(image) if image is not None else "",
+        "language": language,
+        "custom_preferences": custom_preferences,
+        "max_results": max_results,
+        "clear_history": clear_history,
+    }
+    if face_tensor is not None:
+        body["face_tensor"] = base64.b64encode(face_tensor).decode("ascii")
+    if manual_mood:
+        body["manual_mood"] = manual_mood
+    if session_id:
+        body["session_id"] = session_id
+    return body
+
+
+def _parse_emotion(data: Dict[str, Any]) -> EmotionResult:
+    return EmotionResult(
+        emotion=data.get("emotion", "neutral"),
+        confidence=data.get("confidence", 0.0),
+        deepface_available=data.get("deepface_available", False),
+    )
+
+
+def _parse_status(data: Dict[str, Any]) -> ServerStatus:
+    return ServerStatus(
+        deepface_available=data.get("deepface_available", False),
+        deepface_error=data.get("deepface_error"),
+        supported_emotions=data.get("supported_emotions", []),
+        supported_languages=data.get("supported_languages", []),
+        search_history_stats=data.get("search_history_stats", {}),
+    )
+
+
+def _parse_music(data: Dict[str, Any]) -> MusicResult:
+    return MusicResult(
+        videos=[Video.from_dict(v) for v in data.get("videos", [])],
+        total_count=data.get("total_count", 0),
+        mood=data.get("mood", ""),
+        language=data.get("language", ""),
+        search_stats=data.get("search_stats", {}),
+    )
+
+
+def _parse_batch(data: Dict[str, Any]) -> BatchResult:
+    items = []
+    for item in data.get("results", []):
+        # Explicit keys so fields added by newer servers are ignored
+        items.append(BatchItem(
+            index=item["index"],
+            language=item.get("language", ""),
+            mood=item.get("mood"),
+            confidence=item.get("confidence"),
+            videos=[Video.from_dict(v) for v in item.get("videos", [])],
+            total_count=item.get("total_count", 0),
+            error=item.get("error"),
+        ))
+    return BatchResult(
+        results=items,
+        distinct_queries=data.get("distinct_queries", 0),
+        total_queries=data.get("total_queries", 0),
+        search_stats=data.get("search_stats", {}),
+    )
+
+
+def _parse_similar(data: Dict[str, Any]) -> SimilarResult:
+    videos = data.get("videos", [])
+    return SimilarResult(
+        videos=[Video.from_dict(v) for v in videos],
+        scores=[v.get("score", 0.0) for v in videos],
+        seeds_found=data.get("seeds_found", 0),
+        index_size=data.get("index_size", 0),
+    )
+
+
+def build_similar(seeds: Optional[List[str]] = None, seed_titles: Optional[List[str]] = None,
+                  max_results: int = 15, exclude_history: bool = True) -> Dict[str, Any]:
+    """Request body for /similar: seeds are watch URLs or video IDs"""
+    return {
+        "seeds": list(seeds or []),
+        "seed_titles": list(seed_titles or []),
+        "max_results": max_results,
+        "exclude_history": exclude_history,
+    }
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _check(response: httpx.Response) -> Dict[str, Any]:
+    """Return the JSON body or raise MoodMusicAPIError"""
+    if response.is_success:
+        return response.json()
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    raise MoodMusicAPIError(response.status_code, str(detail), _retry_after(response))
+
+
+def _deadline_headers(timeout: httpx.Timeout, deadline: Optional[float]) -> Dict[str, str]:
+    """Server-side deadline: explicit, or just inside the client's read timeout"""
+    if deadline is None and timeout.read is not None:
+        deadline = max(1.0, timeout.read - DEADLINE_MARGIN_SECONDS)
+    return {DEADLINE_HEADER: f"{deadline:g}"} if deadline else {}
+
+
+def _limits(max_connections: int, max_keepalive: int) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=30.0,
+    )
+
+
+class MoodMusicClient:
+    """Synchronous client with a pooled keep-alive connection set"""
+
+    def __init__(self, base_url: str, timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+                 max_connections: int = 10, max_keepalive: int = 5, max_retries: int = 2,
+                 deadline: Optional[float] = None):
+        self.max_retries = max_retries
+        self._client = httpx.Client(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            headers=_deadline_headers(timeout, deadline),
+            limits=_limits(max_connections, max_keepalive),
+        )
+
+    def _request(self, method: str, path: str, json: Optional[Dict[str, Any]] = None,
+                 content: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            response = self._client.request(method, path, json=json, content=content, headers=headers)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return _check(response)
+            time.sleep(min(_retry_after(response) or 1.0, MAX_RETRY_AFTER_SECONDS))
+        raise AssertionError("unreachable")
+
+    def status(self) -> ServerStatus:
+        return _parse_status(self._request("GET", "/status"))
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+    def detect_mood(self, image: ImageInput) -> EmotionResult:
+        return _parse_emotion(self._request("POST", "/detect-mood", build_capture(image=image)))
+
+    def detect_mood_face(self, face_tensor: bytes) -> EmotionResult:
+        """Classify a face cropped client-side, sent as a raw build_face_tensor() body"""
+        return _parse_emotion(self._request(
+            "POST", "/detect-mood/face", content=face_tensor,
+            headers={"Content-Type": FACE_TENSOR_CONTENT_TYPE}
+        ))
+
+    def get_music(self, image: Optional[ImageInput] = None, manual_mood: Optional[str] = None,
+                  **options) -> MusicResult:
+        return _parse_music(self._request(
+            "POST", "/get-music", build_capture(image=image, manual_mood=manual_mood, **options)
+        ))
+
+    def get_music_batch(self, captures: List[Dict[str, Any]]) -> BatchResult:
+        """captures are request bodies from build_capture()"""
+        return _parse_batch(self._request("POST", "/get-music/batch", {"captures": captures}))
+
+    def more_like_this(self, seeds: Optional[List[str]] = None, seed_titles: Optional[List[str]] = None,
+                       **options) -> SimilarResult:
+        """Tracks similar to the seeds, from the server's index without new searches"""
+        return _parse_similar(self._request("POST", "/similar", build_similar(seeds, seed_titles, **options)))
+
+    def clear_session(self) -> Dict[str, Any]:
+        return self._request("POST", "/clear-session")
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncMoodMusicClient:
+    """asyncio client with a pooled keep-alive connection set"""
+
+    def __init__(self, base_url: str, timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+                 max_connections: int = 20, max_keepalive: int = 10, max_retries: int = 2,
+                 deadline: Optional[float] = None):
+        self.max_retries = max_retries
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            headers=_deadline_headers(timeout, deadline),
+            limits=_limits(max_connections, max_keepalive),
+        )
+
+    async def _request(self, method: str, path: str, json: Optional[Dict[str, Any]] = None,
+                       content: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            response = await self._client.request(method, path, json=json, content=content, headers=headers)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return _check(response)
+            await asyncio.sleep(min(_retry_after(response) or 1.0, MAX_RETRY_AFTER_SECONDS))
+        raise AssertionError("unreachable")
+
+    async def status(self) -> ServerStatus:
+        return _parse_status(await self._request("GET", "/status"))
+
+    async def health(self) -> Dict[str, Any]:
+        return await self._request("GET", "/health")
+
+    async def detect_mood(self, image: ImageInput) -> EmotionResult:
+        return _parse_emotion(await self._request("POST", "/detect-mood", build_capture(image=image)))
+
+    async def detect_mood_face(self, face_tensor: bytes) -> EmotionResult:
+        """Classify a face cropped client-side, sent as a raw build_face_tensor() body"""
+        return _parse_emotion(await self._request(
+            "POST", "/detect-mood/face", content=face_tensor,
+            headers={"Content-Type": FACE_TENSOR_CONTENT_TYPE}
+        ))
+
+    async def get_music(self, image: Optional[ImageInput] = None, manual_mood: Optional[str] = None,
+                        **options) -> MusicResult:
+        return _parse_music(await self._request(
+            "POST", "/get-music", build_capture(image=image, manual_mood=manual_mood, **options)
+        ))
+
+    async def get_music_batch(self, captures: List[Dict[str, Any]]) -> BatchResult:
+        """captures are request bodies from build_capture()"""
+        return _parse_batch(await self._request("POST", "/get-music/batch", {"captures": captures}))
+
+    async def more_like_this(self, seeds: Optional[List[str]] = None, seed_titles: Optional[List[str]] = None,
+                             **options) -> SimilarResult:
+        """Tracks similar to the seeds, from the server's index without new searches"""
+        return _parse_similar(await self._request("POST", "/similar", build_similar(seeds, seed_titles, **options)))
+
+    async def clear_session(self) -> Dict[str, Any]:
+        return await self._request("POST", "/clear-session")
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -1,3 +1,5 @@
+import copy
+import time
 import streamlit as st
 from emotion_detector import (
     is_deepface_available, 
@@ -28,16 +30,21 @@ DEFAULT_KEYS = {
     "current_mood": None,
     "search_history": set(),
     "last_search_time": 0,
+    "analysis_cache": {},
+    "cache_stats": {},
+    "last_rerun_ms": None,
+    "playlist": None,
 }
 
 def init_session_state():
     """Initialize session state with default values"""
     for k, v in DEFAULT_KEYS.items():
         if k not in st.session_state:
-            st.session_state[k] = v if not isinstance(v, set) else set()
+            st.session_state[k] = copy.deepcopy(v)
 
 def main():
     """Main application function"""
+    rerun_start = time.perf_counter()
     init_session_state()
     
     st.title("🎵 Facial Expression Driven Audio Playback System")
@@ -87,5 +94,7 @@ def main():
 
     render_sidebar()
 
+    st.session_state["last_rerun_ms"] = (time.perf_counter() - rerun_start) * 1000
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,10 +1,12 @@
 import os
 import warnings
 import tempfile
+import hashlib
 import numpy as np
 from PIL import Image
 from typing import Tuple
 import streamlit as st
+from remote_backend import REMOTE_MODE, get_server_status, remote_detect_mood
 
 # Suppress TensorFlow warnings
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
@@ -12,42 +14,58 @@ os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-DEEPFACE_AVAILABLE = False
-DEEPFACE_ERROR = None
+# Camera images analyzed per session before the oldest result is dropped
+MAX_CACHED_ANALYSES = 16
 
-try:
-    import cv2
-    import tensorflow as tf
-    
-    # suppress tf warnings
-    tf.get_logger().setLevel('ERROR')
-    
-    from deepface import DeepFace
-    
-    # test DeepFace with a dummy analysis to ensure it's working
-    # create a small test image
-    test_img = np.ones((48, 48, 3), dtype=np.uint8) * 128
-    test_path = "temp_test.jpg"
-    cv2.imwrite(test_path, test_img)
+@st.cache_resource(show_spinner="🧠 Loading emotion model...")
+def load_emotion_model():
+    """
+    Import DeepFace and warm up its emotion model once per server process,
+    shared by all sessions and reruns
     
+    Returns:
+        Tuple of (DeepFace module or None, error message or None)
+    """
     try:
-        _ = DeepFace.analyze(
-            img_path=test_path,
-            actions=["emotion"],
-            enforce_detection=False,
-            silent=True
-        )
-        DEEPFACE_AVAILABLE = True
-        os.remove(test_path)
-    except Exception as test_error:
-        DEEPFACE_ERROR = f"DeepFace test failed: {str(test_error)}"
-        if os.path.exists(test_path):
+        import cv2
+        import tensorflow as tf
+        
+        # suppress tf warnings
+        tf.get_logger().setLevel('ERROR')
+        
+        from deepface import DeepFace
+        
+        # test DeepFace with a dummy analysis to ensure it's working
+        # create a small test image
+        test_img = np.ones((48, 48, 3), dtype=np.uint8) * 128
+        test_path = "temp_test.jpg"
+        cv2.imwrite(test_path, test_img)
+        
+        try:
+            _ = DeepFace.analyze(
+                img_path=test_path,
+                actions=["emotion"],
+                enforce_detection=False,
+                silent=True
+            )
             os.remove(test_path)
-    
-except ImportError as e:
-    DEEPFACE_ERROR = f"Import error: {str(e)}"
-except Exception as e:
-    DEEPFACE_ERROR = f"DeepFace initialization error: {str(e)}"
+            return DeepFace, None
+        except Exception as test_error:
+            if os.path.exists(test_path):
+                os.remove(test_path)
+            return None, f"DeepFace test failed: {str(test_error)}"
+        
+    except ImportError as e:
+        return None, f"Import error: {str(e)}"
+    except Exception as e:
+        return None, f"DeepFace initialization error: {str(e)}"
+
+if REMOTE_MODE:
+    # The server runs the model; don't load TensorFlow in this process
+    DeepFace, DEEPFACE_ERROR = None, None
+else:
+    DeepFace, DEEPFACE_ERROR = load_emotion_model()
+DEEPFACE_AVAILABLE = DeepFace is not None
 
 # mood keywords for validation
 MOOD_KEYWORDS = {
@@ -56,10 +74,16 @@ MOOD_KEYWORDS = {
 
 def is_deepface_available() -> bool:
     """Check if DeepFace is available for use"""
+    if REMOTE_MODE:
+        status, _ = get_server_status()
+        return status is not None and status.deepface_available
     return DEEPFACE_AVAILABLE
 
 def get_deepface_error() -> str:
     """Get the DeepFace error message if any"""
+    if REMOTE_MODE:
+        status, error = get_server_status()
+        return error or (status and status.deepface_error) or "No error"
     return DEEPFACE_ERROR or "No error"
 
 def analyze_emotion_deepface(img_bytes) -> Tuple[str, float]:
@@ -157,8 +181,24 @@ def process_emotion_detection(img_bytes, manual_mood):
     confidence = 100.0
 
     if img_bytes is not None:
-        with st.spinner("🧠 Analyzing your emotion..."):
-            detected_mood, confidence = analyze_emotion_deepface(img_bytes)
+        # Reruns hand back the same camera image; only analyze new captures
+        digest = hashlib.sha1(img_bytes.getvalue()).hexdigest()
+        analyses = st.session_state.setdefault("analysis_cache", {})
+        stats = st.session_state.setdefault("cache_stats", {})
+        
+        if digest in analyses:
+            detected_mood, confidence = analyses[digest]
+            stats["analysis_hits"] = stats.get("analysis_hits", 0) + 1
+        else:
+            with st.spinner("🧠 Analyzing your emotion..."):
+                if REMOTE_MODE:
+                    detected_mood, confidence = remote_detect_mood(img_bytes)
+                else:
+                    detected_mood, confidence = analyze_emotion_deepface(img_bytes)
+            stats["analysis_misses"] = stats.get("analysis_misses", 0) + 1
+            analyses[digest] = (detected_mood, confidence)
+            while len(analyses) > MAX_CACHED_ANALYSES:
+                analyses.pop(next(iter(analyses)))
 
     st.success(f"😊 Detected Mood: **{detected_mood.title()}** (Confidence: {confidence:.1f}%)")
     return detected_mood, confidence
\ No newline at end of file
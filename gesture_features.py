@@ -0,0 +1,157 @@
+"""
+Hand landmark features and gesture classification.
+
+MediaPipe landmarks are converted once per frame into a (21, 3) float32
+array; every feature is then computed with array operations on it. Poses
+(Open, Fist, Point, or anything recorded) come from a k-NN classifier over
+samples recorded with `gesture_local.py --record <label>`, falling back to
+finger-extension rules when no sample file exists. Swipes are motion, not
+poses, and are detected from the wrist trajectory.
+"""
+import os
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+
+# Landmark chains per finger (thumb, index, middle, ring, pinky), starting at the wrist
+FINGER_CHAINS = np.array([
+    [0, 1, 2, 3, 4],
+    [0, 5, 6, 7, 8],
+    [0, 9, 10, 11, 12],
+    [0, 13, 14, 15, 16],
+    [0, 17, 18, 19, 20],
+])
+FINGERTIPS = FINGER_CHAINS[:, -1]
+WRIST = 0
+MIDDLE_MCP = 9
+
+# Summed joint bend (in units of pi) below which a finger counts as extended
+EXTENDED_BEND = 0.35
+
+NO_GESTURE = "None"
+
+
+def landmarks_to_array(hand_landmarks) -> np.ndarray:
+    """MediaPipe NormalizedLandmarkList -> (21, 3) float32 array of x, y, z"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], dtype=np.float32)
+
+
+def joint_angles(points: np.ndarray) -> np.ndarray:
+    """Bend at each finger's three joints, 0 (straight) to 1 (folded back), shape (5, 3)"""
+    prev = points[FINGER_CHAINS[:, :3]]
+    joint = points[FINGER_CHAINS[:, 1:4]]
+    nxt = points[FINGER_CHAINS[:, 2:5]]
+    a = joint - prev
+    b = nxt - joint
+    cos = np.einsum("fjk,fjk->fj", a, b) / (
+        np.linalg.norm(a, axis=2) * np.linalg.norm(b, axis=2) + 1e-6
+    )
+    return np.arccos(np.clip(cos, -1.0, 1.0)) / np.pi
+
+
+def hand_features(points: np.ndarray) -> np.ndarray:
+    """
+    Position-, scale- and rotation-tolerant feature vector (24 values):
+    15 joint bends, 5 fingertip-to-wrist distances and 4 thumb-to-fingertip
+    distances, with distances in units of palm length
+    """
+    palm = np.linalg.norm(points[MIDDLE_MCP] - points[WRIST]) + 1e-6
+    tips = points[FINGERTIPS]
+    tip_to_wrist = np.linalg.norm(tips - points[WRIST], axis=1) / palm
+    thumb_to_tips = np.linalg.norm(tips[1:] - tips[0], axis=1) / palm
+    return np.concatenate([joint_angles(points).ravel(), tip_to_wrist, thumb_to_tips]).astype(np.float32)
+
+
+def hand_side(points: np.ndarray) -> str:
+    """Which half of the (mirrored) frame the hand is in"""
+    return "Left" if points[:, 0].mean() < 0.5 else "Right"
+
+
+def rule_based_pose(features: np.ndarray) -> str:
+    """Pose from finger extension alone, used when no recorded samples exist"""
+    extended = features[:15].reshape(5, 3).sum(axis=1) < EXTENDED_BEND
+    fingers = extended[1:]  # thumb position varies too much to rely on
+    if not fingers.any():
+        return "Fist"
+    if fingers[0] and not fingers[1:].any():
+        return "Point"
+    if fingers.sum() >= 3:
+        return "Open"
+    return NO_GESTURE
+
+
+class GestureClassifier:
+    """k-nearest-neighbour classifier over recorded feature samples"""
+
+    def __init__(self, features: np.ndarray, labels: np.ndarray, k: int = 5, max_distance: float = 0.8):
+        self.features = features.astype(np.float32)
+        self.labels = labels
+        self.k = min(k, len(labels))
+        self.max_distance = max_distance
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "GestureClassifier":
+        data = np.load(path)
+        return cls(data["features"], data["labels"], **kwargs)
+
+    def classify(self, features: np.ndarray) -> str:
+        distances = np.sum((self.features - features) ** 2, axis=1)
+        nearest = np.argpartition(distances, self.k - 1)[:self.k]
+        # Too far from every sample: not a gesture we know
+        if np.sqrt(distances[nearest].min()) > self.max_distance:
+            return NO_GESTURE
+        labels, counts = np.unique(self.labels[nearest], return_counts=True)
+        return str(labels[np.argmax(counts)])
+
+
+def load_classifier(path: Optional[str]) -> Optional[GestureClassifier]:
+    """Classifier for a sample file, or None to use rule_based_pose"""
+    if path and os.path.exists(path):
+        return GestureClassifier.load(path)
+    return None
+
+
+def save_samples(path: str, features: List[np.ndarray], label: str):
+    """Append feature samples for one label to a sample file"""
+    new_features = np.stack(features).astype(np.float32)
+    new_labels = np.array([label] * len(features))
+    if os.path.exists(path):
+        data = np.load(path)
+        new_features = np.concatenate([data["features"], new_features])
+        new_labels = np.concatenate([data["labels"], new_labels])
+    np.savez(path, features=new_features, labels=new_labels)
+
+
+class SwipeTracker:
+    """Detects horizontal swipes from the wrist position over a short window"""
+
+    def __init__(self, window: float = 0.4, distance: float = 0.2, steady: float = 0.04):
+        self.window = window
+        self.distance = distance
+        self.steady = steady
+        self.history: Deque[Tuple[float, float]] = deque()
+
+    def update(self, x: float, now: Optional[float] = None) -> Optional[str]:
+        """Add a wrist x position (normalized); returns a swipe direction when one completes"""
+        now = time.time() if now is None else now
+        self.history.append((now, x))
+        while self.history and now - self.history[0][0] > self.window:
+            self.history.popleft()
+
+        dx = x - self.history[0][1]
+        if abs(dx) >= self.distance:
+            self.history.clear()
+            return "Swipe Right" if dx > 0 else "Swipe Left"
+        return None
+
+    def is_steady(self) -> bool:
+        """Whether the hand has barely moved within the window, so static poses can fire"""
+        if len(self.history) < 2:
+            return True
+        xs = [x for _, x in self.history]
+        return max(xs) - min(xs) < self.steady
+
+    def reset(self):
+        self.history.clear()
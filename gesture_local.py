@@ -1,107 +1,673 @@
+"""
+Hand-gesture media controller.
+
+Capture and processing run in separate stages: a capture thread decodes,
+mirrors and colour-converts each frame once into a shared ring buffer
+(stale frames are dropped instead of queueing up), and the processing loop
+runs MediaPipe at its own rate on an optionally downscaled copy. With
+--emotion-interval, emotion inference runs on the same buffer on its own
+thread, so one camera drives both gesture control and continuous mood.
+
+    python gesture_local.py                       # webcam with preview window
+    python gesture_local.py --source clip.mp4 --headless --no-actions
+    python gesture_local.py --source synthetic --headless --duration 20
+    python gesture_local.py --emotion-interval 1.0   # gestures + mood every second
+
+With --headless, nothing is drawn and no window is opened. FPS,
+capture-to-decision latency and per-frame classification cost are printed
+on exit.
+
+Poses are classified with k-NN over samples in --gesture-file (see
+gesture_features.py). To record samples, hold a pose in front of the camera:
+    python gesture_local.py --record Point --duration 10
+
+Gestures press OS media keys by default. With --events they are sent
+instead as compact messages over a WebSocket to the server's /ws/control
+endpoint, which tracks playback state; acknowledgement round-trip times are
+reported on exit:
+    python gesture_local.py --events ws://localhost:8000/ws/control --session me
+"""
+import argparse
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
 import cv2
 import mediapipe as mp
-import pyautogui
-import time
+import numpy as np
+
+from gesture_features import (
+    NO_GESTURE,
+    SwipeTracker,
+    hand_features,
+    hand_side,
+    landmarks_to_array,
+    load_classifier,
+    rule_based_pose,
+    save_samples,
+)
 
-# Initialize webcam
-cap = cv2.VideoCapture(0)
+try:
+    import pyautogui
+    PYAUTOGUI_AVAILABLE = True
+except Exception:  # no display (e.g. headless benchmark machines)
+    PYAUTOGUI_AVAILABLE = False
+
+try:
+    from websockets.sync.client import connect as ws_connect
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
 
-# Mediapipe hands model
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(max_num_hands=2, min_detection_confidence=0.7, min_tracking_confidence=0.6)
 mp_draw = mp.solutions.drawing_utils
 
-# State variables
-last_gesture = ""
-last_action_time = 0
-toggle_time = 0
-cooldown = 1.5  # seconds
-gesture_control_enabled = False
-just_toggled = False  # <-- New flag
-
-def detect_hand_side(landmarks):
-    x_coords = [lm.x for lm in landmarks.landmark]
-    avg_x = sum(x_coords) / len(x_coords)
-    return "Left" if avg_x < 0.5 else "Right"
-
-def get_gesture(landmarks):
-    fingers = []
-    for i in [8, 12, 16, 20]:
-        tip_y = landmarks.landmark[i].y
-        pip_y = landmarks.landmark[i - 2].y
-        fingers.append(tip_y < pip_y)
-    if all(not f for f in fingers):
-        return "Fist"
-    return "Open"
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    frame = cv2.flip(frame, 1)
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    result = hands.process(rgb)
-
-    gesture = ""
-    current_time = time.time()
-    h, w, _ = frame.shape
-    num_hands = 0
-
-    if result.multi_hand_landmarks:
-        num_hands = len(result.multi_hand_landmarks)
-
-        # Toggle gesture control if both hands are visible
-        if num_hands == 2 and (current_time - toggle_time) > 2:
-            gesture_control_enabled = not gesture_control_enabled
-            toggle_time = current_time
-            just_toggled = True  # set flag to skip gesture processing
-            print(f"🌀 Gesture Control Toggled: {'ON' if gesture_control_enabled else 'OFF'}")
-
-        if gesture_control_enabled and not just_toggled:
-            for hand_landmarks in result.multi_hand_landmarks:
-                mp_draw.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-                hand_side = detect_hand_side(hand_landmarks)
-                hand_pose = get_gesture(hand_landmarks)
-
-                if hand_pose == "Fist":
-                    gesture = "Fist"
-                elif hand_side == "Right" and hand_pose == "Open":
-                    gesture = "Volume Up"
-                elif hand_side == "Left" and hand_pose == "Open":
-                    gesture = "Volume Down"
-
-                if gesture and (current_time - last_action_time) > cooldown:
-                    if gesture == "Fist":
-                        pyautogui.press("playpause")
-                        print("▶️ Play/Pause")
-                    elif gesture == "Volume Up":
-                        for _ in range(3):
-                            pyautogui.press("volumeup")
-                        print("🔊 Volume Up x3")
-                    elif gesture == "Volume Down":
-                        for _ in range(3):
-                            pyautogui.press("volumedown")
-                        print("🔉 Volume Down x3")
-
-                    last_action_time = current_time
-                    last_gesture = gesture
-
-                cv2.putText(frame, f"{gesture}", (20, 60), cv2.FONT_HERSHEY_SIMPLEX,
-                            1.5, (0, 255, 0), 3)
-
-    # Reset toggle-skip flag after one frame
-    if just_toggled:
-        just_toggled = False
-
-    # Show gesture control state
-    state_text = f"Gesture Control: {'ON' if gesture_control_enabled else 'OFF'}"
-    cv2.putText(frame, state_text, (10, h - 20), cv2.FONT_HERSHEY_SIMPLEX,
-                0.9, (0, 255, 255) if gesture_control_enabled else (0, 0, 255), 2)
-
-    cv2.imshow("🖐 Gesture Media Controller", frame)
-    if cv2.waitKey(1) & 0xFF == 27:  # ESC key
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+COOLDOWN_SECONDS = 1.5
+TOGGLE_COOLDOWN_SECONDS = 2.0
+
+# Event-channel debouncing: frames a pose must be held, and minimum gap between events
+EVENT_HOLD_FRAMES = 3
+EVENT_MIN_INTERVAL = 0.5
+
+# gesture -> (media key, presses, message)
+ACTIONS = {
+    "Fist": ("playpause", 1, "▶️ Play/Pause"),
+    "Volume Up": ("volumeup", 3, "🔊 Volume Up x3"),
+    "Volume Down": ("volumedown", 3, "🔉 Volume Down x3"),
+    "Point": ("volumemute", 1, "🔇 Mute"),
+    "Swipe Right": ("nexttrack", 1, "⏭️ Next Track"),
+    "Swipe Left": ("prevtrack", 1, "⏮️ Previous Track"),
+}
+
+# gesture -> control-channel command (see server/playback.py)
+EVENT_COMMANDS = {
+    "Fist": "play_pause",
+    "Volume Up": "volume_up",
+    "Volume Down": "volume_down",
+    "Point": "mute",
+    "Swipe Right": "next",
+    "Swipe Left": "previous",
+}
+
+
+class CameraSource:
+    """Live webcam"""
+
+    def __init__(self, index: int = 0):
+        self.cap = cv2.VideoCapture(index)
+        # Ask the driver not to buffer frames; the ring keeps the latest anyway
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource:
+    """Video file played back at its native frame rate, optionally looped"""
+
+    def __init__(self, path: str, loop: bool = False):
+        self.path = path
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video file: {path}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.interval = 1.0 / fps
+        self.next_time = time.perf_counter()
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        # Pace reads like a camera would deliver them
+        delay = self.next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + self.interval, time.perf_counter())
+
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        return ok, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class SyntheticSource:
+    """Generated frames at a fixed rate, for throughput tests without a camera"""
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 30.0):
+        self.interval = 1.0 / fps
+        self.next_time = time.perf_counter()
+        self.count = 0
+        y, x = np.mgrid[0:height, 0:width]
+        self.base = ((x + y) % 256).astype(np.uint8)
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        delay = self.next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + self.interval, time.perf_counter())
+
+        self.count += 1
+        shifted = np.roll(self.base, self.count * 4, axis=1)
+        return True, cv2.merge([shifted, np.flipud(shifted), np.full_like(shifted, 96)])
+
+    def release(self):
+        pass
+
+
+def open_source(spec: str, loop: bool = False):
+    """camera index ("0"), "synthetic", or a video file path"""
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if spec == "synthetic":
+        return SyntheticSource()
+    return VideoFileSource(spec, loop=loop)
+
+
+class FrameRef:
+    """A pinned ring slot: views into the shared buffers, valid until released"""
+
+    __slots__ = ("seq", "slot", "captured_at", "bgr", "rgb")
+
+    def __init__(self, seq: int, slot: int, captured_at: float, bgr: np.ndarray, rgb: np.ndarray):
+        self.seq = seq
+        self.slot = slot
+        self.captured_at = captured_at
+        self.bgr = bgr
+        self.rgb = rgb
+
+
+class FrameRing:
+    """
+    Shared ring of preallocated frame slots filled by one capture thread.
+
+    Each frame is read, mirrored and colour-converted exactly once, into the
+    slot's BGR and RGB buffers. Consumers (hand tracking, emotion inference)
+    pin the newest slot and work on views of it without copying; the writer
+    skips pinned slots, so a frame is never overwritten while in use and
+    stale unpinned frames are simply dropped.
+    """
+
+    def __init__(self, source, capacity: int = 4):
+        ok, frame = source.read()
+        if not ok:
+            raise ValueError("Frame source produced no frames")
+        h, w = frame.shape[:2]
+        self.source = source
+        self.capacity = capacity
+        self.bgr = np.empty((capacity, h, w, 3), dtype=np.uint8)
+        self.rgb = np.empty((capacity, h, w, 3), dtype=np.uint8)
+        self.slot_seq = [0] * capacity
+        self.slot_time = [0.0] * capacity
+        self.pins = [0] * capacity
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.latest_slot = -1
+        self.running = True
+        self.finished = False
+        self._write(frame)
+        self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _free_slot(self) -> int:
+        for step in range(1, self.capacity + 1):
+            slot = (self.latest_slot + step) % self.capacity
+            if not self.pins[slot]:
+                return slot
+        raise RuntimeError("All frame slots are pinned; increase the ring capacity")
+
+    def _write(self, frame: np.ndarray):
+        captured_at = time.perf_counter()
+        with self.cond:
+            slot = self._free_slot()
+        cv2.flip(frame, 1, dst=self.bgr[slot])
+        cv2.cvtColor(self.bgr[slot], cv2.COLOR_BGR2RGB, dst=self.rgb[slot])
+        with self.cond:
+            self.seq += 1
+            self.slot_seq[slot] = self.seq
+            self.slot_time[slot] = captured_at
+            self.latest_slot = slot
+            self.cond.notify_all()
+
+    def _run(self):
+        while self.running:
+            ok, frame = self.source.read()
+            if not ok:
+                break
+            self._write(frame)
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def acquire(self, last_seq: int, timeout: float = 1.0) -> Optional[FrameRef]:
+        """Pin the newest frame if it is newer than last_seq; release() it when done"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > last_seq or self.finished, timeout=timeout)
+            if self.seq <= last_seq:
+                return None
+            slot = self.latest_slot
+            self.pins[slot] += 1
+            return FrameRef(self.slot_seq[slot], slot, self.slot_time[slot], self.bgr[slot], self.rgb[slot])
+
+    def release(self, ref: FrameRef):
+        with self.cond:
+            self.pins[ref.slot] -= 1
+
+    def stop(self):
+        self.running = False
+        self.thread.join(timeout=2)
+        self.source.release()
+
+
+class EmotionWorker:
+    """
+    Runs emotion inference on the newest ring frame every `interval` seconds,
+    on its own thread, so hand tracking keeps its per-frame rate.
+    """
+
+    def __init__(self, ring: FrameRing, interval: float):
+        # Imported here so gesture-only runs don't load TensorFlow
+        from deepface import DeepFace
+
+        self.DeepFace = DeepFace
+        self.ring = ring
+        self.interval = interval
+        self.mood = ""
+        self.confidence = 0.0
+        self.latencies_ms: List[float] = []
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="emotion", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        last_seq = 0
+        while self.running:
+            started = time.perf_counter()
+            ref = self.ring.acquire(last_seq)
+            if ref is None:
+                if self.ring.finished:
+                    break
+                continue
+            try:
+                result = self.DeepFace.analyze(
+                    img_path=ref.bgr,
+                    actions=["emotion"],
+                    detector_backend="opencv",
+                    enforce_detection=False,
+                    silent=True,
+                )
+            except Exception as e:
+                print(f"⚠️ Emotion analysis failed: {e}")
+                result = None
+            finally:
+                self.ring.release(ref)
+            last_seq = ref.seq
+            self.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+            if result:
+                result = result[0] if isinstance(result, list) else result
+                mood = result["dominant_emotion"]
+                self.confidence = float(result["emotion"][mood])
+                if mood != self.mood:
+                    print(f"😊 Mood: {mood} ({self.confidence:.0f}%)")
+                self.mood = mood
+
+            delay = started + self.interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def report(self) -> List[str]:
+        if not self.latencies_ms:
+            return ["Emotion inference: no frames analyzed"]
+        p50, p95 = np.percentile(self.latencies_ms, [50, 95])
+        return [f"Emotion inference ms ({len(self.latencies_ms)} frames): p50 {p50:.0f}, p95 {p95:.0f}"]
+
+    def stop(self):
+        self.running = False
+        self.thread.join(timeout=5)
+
+
+class Debouncer:
+    """
+    Emits a gesture once it has been seen on `hold_frames` consecutive
+    frames and at least `min_interval` seconds after the previous emission.
+    Swipes are already a completed movement and skip the hold.
+    """
+
+    def __init__(self, hold_frames: int = 1, min_interval: float = COOLDOWN_SECONDS):
+        self.hold_frames = hold_frames
+        self.min_interval = min_interval
+        self.candidate = ""
+        self.count = 0
+        self.last_emit = 0.0
+
+    def ready(self, gesture: str, now: float) -> bool:
+        if gesture != self.candidate:
+            self.candidate = gesture
+            self.count = 0
+        if not gesture:
+            return False
+        self.count += 1
+        if self.count < self.hold_frames and not gesture.startswith("Swipe"):
+            return False
+        if now - self.last_emit <= self.min_interval:
+            return False
+        self.last_emit = now
+        return True
+
+
+class KeyPressSink:
+    """Delivers gestures as OS media key presses"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled and PYAUTOGUI_AVAILABLE
+
+    def send(self, gesture: str):
+        if gesture not in ACTIONS:
+            print(f"🤚 {gesture} (no action)")
+            return
+        key, times, message = ACTIONS[gesture]
+        if self.enabled:
+            for _ in range(times):
+                pyautogui.press(key)
+        print(message)
+
+    def report(self) -> List[str]:
+        return []
+
+    def close(self):
+        pass
+
+
+class EventChannel:
+    """
+    Delivers gestures as events over a persistent WebSocket to the server.
+    Sends never wait for the reply; a receiver thread matches
+    acknowledgements to sequence numbers to measure round-trip time.
+    """
+
+    def __init__(self, url: str, session_id: str):
+        if not WEBSOCKETS_AVAILABLE:
+            raise RuntimeError("The event channel needs the websockets package")
+        separator = "&" if "?" in url else "?"
+        self.ws = ws_connect(f"{url}{separator}session_id={quote(session_id)}", open_timeout=5)
+        self.seq = 0
+        self.sent_at: Dict[int, float] = {}
+        self.rtts_ms: List[float] = []
+        self.lock = threading.Lock()
+        self.receiver = threading.Thread(target=self._receive, name="events", daemon=True)
+        self.receiver.start()
+        # Round trip with no state change, to confirm the channel and warm it up
+        self._send("ping")
+
+    def _send(self, command: str):
+        with self.lock:
+            self.seq += 1
+            self.sent_at[self.seq] = time.perf_counter()
+            message = json.dumps({"c": command, "i": self.seq}, separators=(",", ":"))
+        self.ws.send(message)
+
+    def _receive(self):
+        try:
+            for message in self.ws:
+                received_at = time.perf_counter()
+                reply = json.loads(message)
+                with self.lock:
+                    sent_at = self.sent_at.pop(reply.get("i"), None)
+                if sent_at is not None:
+                    self.rtts_ms.append((received_at - sent_at) * 1000)
+                if "e" in reply:
+                    print(f"⚠️ Server rejected event: {reply['e']}")
+        except Exception:
+            pass  # connection closed
+
+    def send(self, gesture: str):
+        command = EVENT_COMMANDS.get(gesture)
+        if command is None:
+            print(f"🤚 {gesture} (no action)")
+            return
+        self._send(command)
+        print(f"📡 {gesture} -> {command}")
+
+    def report(self) -> List[str]:
+        if not self.rtts_ms:
+            return ["Event round trip: no acknowledgements"]
+        p50, p95, p99 = np.percentile(self.rtts_ms, [50, 95, 99])
+        return [f"Event round trip ms ({len(self.rtts_ms)} events): p50 {p50:.2f}, p95 {p95:.2f}, p99 {p99:.2f}"]
+
+    def close(self):
+        self.ws.close()
+        self.receiver.join(timeout=2)
+
+
+class GestureController:
+    """Turns detected hands into media actions, with toggle and debounce handling"""
+
+    def __init__(self, sink, classifier=None, debouncer: Optional[Debouncer] = None):
+        self.sink = sink
+        self.classifier = classifier
+        self.debouncer = debouncer or Debouncer()
+        self.swipes = SwipeTracker()
+        self.enabled = False
+        self.toggle_time = 0.0
+        self.last_gesture = ""
+
+    def classify(self, points: np.ndarray, now: float) -> str:
+        """Gesture for one hand: a swipe if the wrist just swept across, else its pose"""
+        swipe = self.swipes.update(float(points[0, 0]), now)
+        if swipe:
+            return swipe
+        if not self.swipes.is_steady():
+            # Mid-movement: don't fire static poses from a swipe's first frames
+            return ""
+
+        features = hand_features(points)
+        pose = self.classifier.classify(features) if self.classifier else rule_based_pose(features)
+        if pose == "Open":
+            return "Volume Up" if hand_side(points) == "Right" else "Volume Down"
+        return "" if pose == NO_GESTURE else pose
+
+    def update(self, hands: List[np.ndarray], now: float) -> str:
+        """Process one frame's hands as landmark arrays; returns the gesture acted on, if any"""
+        if len(hands) == 2 and (now - self.toggle_time) > TOGGLE_COOLDOWN_SECONDS:
+            self.enabled = not self.enabled
+            self.toggle_time = now
+            self.swipes.reset()
+            print(f"🌀 Gesture Control Toggled: {'ON' if self.enabled else 'OFF'}")
+            # Skip gesture processing on the frame that toggled
+            return ""
+
+        if not self.enabled or len(hands) != 1:
+            self.swipes.reset()
+            return ""
+
+        gesture = self.classify(hands[0], now)
+        if self.debouncer.ready(gesture, now):
+            self.sink.send(gesture)
+            self.last_gesture = gesture
+            return gesture
+        return ""
+
+
+class PipelineStats:
+    """Frame rates and capture-to-decision latency for a run"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.processed = 0
+        self.dropped = 0
+        self.latencies_ms: List[float] = []
+        self.classify_us: List[float] = []
+
+    def record(self, seq: int, last_seq: int, captured_at: float, classify_seconds: float):
+        self.processed += 1
+        self.dropped += max(0, seq - last_seq - 1)
+        self.latencies_ms.append((time.perf_counter() - captured_at) * 1000)
+        self.classify_us.append(classify_seconds * 1e6)
+
+    def report(self, captured: int) -> str:
+        elapsed = time.perf_counter() - self.start
+        lines = [
+            f"Elapsed: {elapsed:.1f}s",
+            f"Capture FPS: {captured / elapsed:.1f}",
+            f"Processed FPS: {self.processed / elapsed:.1f}",
+            f"Frames skipped (stale): {self.dropped}",
+        ]
+        if self.latencies_ms:
+            p50, p95, p99 = np.percentile(self.latencies_ms, [50, 95, 99])
+            lines.append(f"Capture-to-decision latency ms: p50 {p50:.1f}, p95 {p95:.1f}, p99 {p99:.1f}")
+            p50, p95 = np.percentile(self.classify_us, [50, 95])
+            lines.append(f"Features + classification per frame us: p50 {p50:.0f}, p95 {p95:.0f}")
+        return "\n".join(lines)
+
+
+def downscale(frame: np.ndarray, width: Optional[int]) -> np.ndarray:
+    """Shrink a frame to `width` pixels wide; landmarks are normalized so nothing else changes"""
+    h, w = frame.shape[:2]
+    if not width or w <= width:
+        return frame
+    return cv2.resize(frame, (width, int(h * width / w)), interpolation=cv2.INTER_AREA)
+
+
+def run(args):
+    # Two readers (hand tracking, emotion) can pin a slot each; the writer needs the rest
+    ring = FrameRing(open_source(args.source, loop=args.loop), capacity=4).start()
+    emotions = EmotionWorker(ring, args.emotion_interval).start() if args.emotion_interval else None
+    hands = mp_hands.Hands(max_num_hands=2, min_detection_confidence=0.7, min_tracking_confidence=0.6)
+    classifier = load_classifier(args.gesture_file)
+    print(f"Pose classifier: {'k-NN over ' + args.gesture_file if classifier else 'finger-extension rules'}")
+    if args.events:
+        sink = EventChannel(args.events, args.session)
+        debouncer = Debouncer(hold_frames=args.debounce_frames, min_interval=EVENT_MIN_INTERVAL)
+    else:
+        sink = KeyPressSink(enabled=not args.no_actions)
+        debouncer = Debouncer()
+    controller = GestureController(sink, classifier=classifier, debouncer=debouncer)
+    stats = PipelineStats()
+    recorded: List[np.ndarray] = []
+
+    min_interval = 1.0 / args.process_fps if args.process_fps else 0.0
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    last_seq = 0
+    last_processed = 0.0
+
+    try:
+        while deadline is None or time.perf_counter() < deadline:
+            # Process at our own rate; the capture thread keeps overwriting meanwhile
+            wait = last_processed + min_interval - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+            ref = ring.acquire(last_seq)
+            if ref is None:
+                if ring.finished:
+                    break
+                continue
+            last_processed = time.perf_counter()
+            seq, captured_at = ref.seq, ref.captured_at
+
+            try:
+                result = hands.process(downscale(ref.rgb, args.process_width))
+                # Drawing must not touch the shared buffer the emotion thread may be reading
+                frame = None if args.headless else ref.bgr.copy()
+            finally:
+                ring.release(ref)
+            hand_landmarks = result.multi_hand_landmarks or []
+
+            classify_start = time.perf_counter()
+            hands_points = [landmarks_to_array(landmarks) for landmarks in hand_landmarks]
+            if args.record:
+                recorded.extend(hand_features(points) for points in hands_points[:1])
+                gesture = ""
+            else:
+                gesture = controller.update(hands_points, time.time())
+            classify_seconds = time.perf_counter() - classify_start
+
+            stats.record(seq, last_seq, captured_at, classify_seconds)
+            last_seq = seq
+
+            if args.headless:
+                continue
+
+            h = frame.shape[0]
+            if controller.enabled or args.record:
+                for landmarks in hand_landmarks:
+                    mp_draw.draw_landmarks(frame, landmarks, mp_hands.HAND_CONNECTIONS)
+                if gesture:
+                    cv2.putText(frame, gesture, (20, 60), cv2.FONT_HERSHEY_SIMPLEX,
+                                1.5, (0, 255, 0), 3)
+
+            state_text = f"Gesture Control: {'ON' if controller.enabled else 'OFF'}"
+            cv2.putText(frame, state_text, (10, h - 20), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.9, (0, 255, 255) if controller.enabled else (0, 0, 255), 2)
+            if emotions is not None and emotions.mood:
+                cv2.putText(frame, f"Mood: {emotions.mood}", (10, h - 55), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.9, (255, 200, 0), 2)
+
+            cv2.imshow("🖐 Gesture Media Controller", frame)
+            if cv2.waitKey(1) & 0xFF == 27:  # ESC key
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if emotions is not None:
+            emotions.stop()
+        ring.stop()
+        hands.close()
+        sink.close()
+        if not args.headless:
+            cv2.destroyAllWindows()
+
+    if args.record:
+        if recorded:
+            save_samples(args.gesture_file, recorded, args.record)
+            print(f"Saved {len(recorded)} '{args.record}' samples to {args.gesture_file}")
+        else:
+            print("No hands seen; nothing recorded")
+    reports = [stats.report(ring.seq), *sink.report()]
+    if emotions is not None:
+        reports += emotions.report()
+    print("\n".join(reports))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hand-gesture media controller")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file path, or 'synthetic' (default: 0)")
+    parser.add_argument("--loop", action="store_true", help="loop a video file source")
+    parser.add_argument("--process-fps", type=float, default=0,
+                        help="max frames per second to run hand tracking on (default: as fast as possible)")
+    parser.add_argument("--process-width", type=int, default=0,
+                        help="downscale frames to this width before hand tracking")
+    parser.add_argument("--headless", action="store_true", help="no drawing or preview window")
+    parser.add_argument("--no-actions", action="store_true", help="detect gestures but don't press media keys")
+    parser.add_argument("--events", metavar="URL",
+                        help="send gestures to the server's control channel (e.g. ws://localhost:8000/ws/control) "
+                             "instead of pressing media keys")
+    parser.add_argument("--session", default="default", help="session id for --events (default: default)")
+    parser.add_argument("--debounce-frames", type=int, default=EVENT_HOLD_FRAMES,
+                        help=f"frames a pose must be held before an event is sent (default: {EVENT_HOLD_FRAMES})")
+    parser.add_argument("--emotion-interval", type=float, default=0,
+                        help="also detect mood from the same camera every N seconds (default: off)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds")
+    parser.add_argument("--gesture-file", default="gestures.npz",
+                        help="recorded pose samples for the k-NN classifier (default: gestures.npz)")
+    parser.add_argument("--record", metavar="LABEL",
+                        help="record pose samples under LABEL (e.g. Open, Fist, Point) instead of acting")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -4,9 +4,12 @@ import random
 import json
 import time
 import re
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple
 from urllib.parse import quote_plus
 import streamlit as st
+from remote_backend import REMOTE_MODE, remote_recommendations
 
 # mood mapping with keywords for diverse search results
 MOOD_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
@@ -49,14 +52,16 @@ MOOD_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
 
 SUPPORTED_LANGS = {"english", "hindi", "bengali"}
 
-def safe_request(url: str, headers: dict, timeout: int = 10) -> Optional[requests.Response]:
+def safe_request(url: str, headers: dict, timeout: int = 10,
+                 report_errors: bool = True) -> Optional[requests.Response]:
     """Make a safe HTTP request with error handling"""
     try:
         response = requests.get(url, headers=headers, timeout=timeout)
         response.raise_for_status()
         return response
     except requests.RequestException as e:
-        st.error(f"Network error: {str(e)}")
+        if report_errors:
+            st.error(f"Network error: {str(e)}")
         return None
 
 def extract_video_id(url: str) -> Optional[str]:
@@ -73,14 +78,38 @@ def extract_video_id(url: str) -> Optional[str]:
             return match.group(1)
     return None
 
-def get_youtube_results(query: str, max_results: int = 20) -> List[Dict[str, str]]:
-    """Scrape YouTube search page for video links with improved error handling"""
+# How long scraped results for a (mood, language, preferences) key are reused
+SEARCH_CACHE_TTL_SECONDS = 15 * 60
+
+# Tracks to have before playback starts; later pages are fetched lazily
+PLAYLIST_INITIAL_TRACKS = 5
+# Videos taken from each search query (one "page" of the playlist)
+PLAYLIST_PAGE_SIZE = 8
+# Fetch the next page once playback is this many tracks from the end
+PLAYLIST_PREFETCH_AHEAD = 3
+
+def get_youtube_results(query: str, max_results: int = 20,
+                        history: Optional[Set[str]] = None,
+                        rate_state: Optional[dict] = None,
+                        report_errors: bool = True) -> List[Dict[str, str]]:
+    """
+    Scrape YouTube search page for video links with improved error handling
+    
+    URLs in `history` (the session's search history by default) are skipped
+    and new ones are added to it. Background threads must pass their own
+    `history` and `rate_state` and disable `report_errors`, since they
+    cannot touch st.session_state or draw messages.
+    """
+    if history is None:
+        history = st.session_state["search_history"]
+    if rate_state is None:
+        rate_state = st.session_state
     
     # Rate limiting
     current_time = time.time()
-    if current_time - st.session_state.get("last_search_time", 0) < 1:
+    if current_time - rate_state.get("last_search_time", 0) < 1:
         time.sleep(1)
-    st.session_state["last_search_time"] = current_time
+    rate_state["last_search_time"] = current_time
     
     search_url = f"https://www.youtube.com/results?search_query={quote_plus(query)}"
     headers = {
@@ -95,7 +124,7 @@ def get_youtube_results(query: str, max_results: int = 20) -> List[Dict[str, str
         "Connection": "keep-alive",
     }
     
-    response = safe_request(search_url, headers, timeout=15)
+    response = safe_request(search_url, headers, timeout=15, report_errors=report_errors)
     if not response:
         return []
 
@@ -149,9 +178,9 @@ def get_youtube_results(query: str, max_results: int = 20) -> List[Dict[str, str
                                 
                                 url = f"https://www.youtube.com/watch?v={video_id}"
                                 
-                                if url not in st.session_state["search_history"]:
+                                if url not in history:
                                     results.append({"url": url, "title": title})
-                                    st.session_state["search_history"].add(url)
+                                    history.add(url)
                                     
                                 if len(results) >= max_results:
                                     break
@@ -173,15 +202,16 @@ def get_youtube_results(query: str, max_results: int = 20) -> List[Dict[str, str
                         title = link.get_text(strip=True) or "Untitled"
                         url = f"https://www.youtube.com/watch?v={video_id}"
                         
-                        if url not in st.session_state["search_history"] and len(title) > 3:
+                        if url not in history and len(title) > 3:
                             results.append({"url": url, "title": title})
-                            st.session_state["search_history"].add(url)
+                            history.add(url)
                             
                         if len(results) >= max_results:
                             break
                             
     except Exception as e:
-        st.warning(f"Error parsing YouTube results: {str(e)}")
+        if report_errors:
+            st.warning(f"Error parsing YouTube results: {str(e)}")
     
     return results
 
@@ -213,44 +243,187 @@ def create_search_queries(mood: str, language: str, custom: str = "") -> List[st
     
     return base_queries + custom_queries
 
-def fetch_recommendations(queries: List[str], total: int = 12) -> List[Dict[str, str]]:
-    """Fetch video recommendations from multiple queries with progress tracking"""
-    accumulated: List[Dict[str, str]] = []
-    per_query = max(2, total // len(queries))
+def normalize_search_key(mood: str, language: str, custom: str) -> Tuple[str, str, str]:
+    """Normalize search inputs so equivalent searches share a cache entry"""
+    return mood.lower().strip(), language.lower().strip(), " ".join(custom.lower().split())
+
+class SearchCache:
+    """
+    TTL cache of scraped candidate pools keyed by normalized search inputs.
+    Each pool records how many of the key's queries it covers, so a pool
+    from a session that stopped early can be resumed by the next one.
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    Held with st.cache_resource rather than st.cache_data because it is one
+    shared, lock-guarded object that playlist threads of every session read
+    and extend; cache_data would hand each caller a copy.
+    """
+    def __init__(self, ttl_seconds: float, max_entries: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: Dict[Tuple[str, str, str], Tuple[float, List[Dict[str, str]], int]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
     
-    for i, query in enumerate(queries):
-        status_text.text(f"🔍 Searching: {query}")
-        
-        batch_results = get_youtube_results(query, max_results=per_query)
-        accumulated.extend(batch_results)
-        
-        progress = (i + 1) / len(queries)
-        progress_bar.progress(progress)
+    def get(self, key: Tuple[str, str, str]) -> Optional[Tuple[List[Dict[str, str]], int]]:
+        """(pool, number of queries scraped into it), or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.time() - entry[0] < self.ttl_seconds:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+    
+    def put(self, key: Tuple[str, str, str], pool: List[Dict[str, str]], queries_done: int):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.time() - entry[0] < self.ttl_seconds and entry[2] > queries_done:
+                # Don't replace a fresher, more complete pool with a partial one
+                return
+            self.entries[key] = (time.time(), pool, queries_done)
+            while len(self.entries) > self.max_entries:
+                oldest = min(self.entries, key=lambda k: self.entries[k][0])
+                del self.entries[oldest]
+
+@st.cache_resource
+def get_search_cache() -> SearchCache:
+    """Search cache shared by all sessions of this Streamlit server"""
+    return SearchCache(SEARCH_CACHE_TTL_SECONDS)
+
+@st.cache_resource
+def get_playlist_executor() -> ThreadPoolExecutor:
+    """Worker threads extending playlists in the background, shared by all sessions"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="playlist")
+
+class LazyPlaylist:
+    """
+    Playlist that starts with the first query's results and fetches one
+    more query at a time as playback approaches the end.
+    
+    Pages are fetched on a background thread that never touches st.* or
+    st.session_state; sync_playlist() copies new tracks into the session
+    on the next rerun.
+    """
+    def __init__(self, mood: str, language: str, custom: str, history: Set[str]):
+        self.key = normalize_search_key(mood, language, custom)
+        self.queries = create_search_queries(*self.key)
+        self.next_query = 0
+        self.tracks: List[Dict[str, str]] = []
+        self.synced = 0
+        # Everything scraped, independent of this session's history, for the shared cache
+        self.pool: List[Dict[str, str]] = []
+        # Private copies: the background thread reads and mutates these
+        self.shown: Set[str] = set(history)
+        self.scraped: Set[str] = set()
+        self.rate_state = {"last_search_time": 0}
+        # Guards tracks, backlog and next_query, which the script thread reads while a page is fetched
+        self.lock = threading.Lock()
+        self.pending: Optional[Future] = None
         
-        if len(accumulated) >= total:
-            break
+        # Cached tracks not yet paged into the playlist
+        self.backlog: List[Dict[str, str]] = []
         
-        time.sleep(0.5)
+        cached = get_search_cache().get(self.key)
+        self.cache_hit = cached is not None
+        if cached is not None:
+            # Page through what was scraped recently, then resume any queries it didn't cover
+            pool, queries_done = cached
+            fresh = [video for video in pool if video["url"] not in self.shown]
+            random.shuffle(fresh)
+            self.backlog = fresh or list(pool)
+            self.pool = list(pool)
+            self.scraped = {video["url"] for video in pool}
+            self.next_query = queries_done
     
-    progress_bar.empty()
-    status_text.empty()
-
-    seen_urls = set()
-    unique_videos = []
+    @property
+    def exhausted(self) -> bool:
+        with self.lock:
+            return not self.backlog and self.next_query >= len(self.queries)
+    
+    def track_count(self) -> int:
+        with self.lock:
+            return len(self.tracks)
+    
+    def fetch_next_page(self) -> int:
+        """Take a page of cached tracks, or scrape queries until one yields new tracks; returns how many were added"""
+        with self.lock:
+            if self.backlog:
+                page = self.backlog[:PLAYLIST_PAGE_SIZE]
+                del self.backlog[:PLAYLIST_PAGE_SIZE]
+                self.tracks.extend(page)
+                return len(page)
+        while True:
+            # Claim the next query under the lock; scrape outside it
+            with self.lock:
+                if self.next_query >= len(self.queries):
+                    return 0
+                query = self.queries[self.next_query]
+                self.next_query += 1
+                queries_done = self.next_query
+            results = get_youtube_results(
+                query,
+                max_results=20,
+                history=self.scraped,
+                rate_state=self.rate_state,
+                report_errors=False,
+            )
+            self.pool.extend(results)
+            if self.pool:
+                # Cache partial pools too, so sessions that stop early still fill it
+                get_search_cache().put(self.key, list(self.pool), queries_done)
+            
+            page = [video for video in results if video["url"] not in self.shown]
+            random.shuffle(page)
+            page = page[:PLAYLIST_PAGE_SIZE]
+            if page:
+                with self.lock:
+                    self.tracks.extend(page)
+                return len(page)
+    
+    def fill(self, count: int):
+        """Fetch synchronously until at least `count` tracks are available"""
+        while self.track_count() < count and not self.exhausted:
+            self.fetch_next_page()
     
-    for video in accumulated:
-        if video["url"] not in seen_urls:
-            seen_urls.add(video["url"])
-            unique_videos.append(video)
+    def prefetch(self, position: int):
+        """Start fetching the next page in the background if playback is near the end"""
+        if self.exhausted or self.track_count() - position > PLAYLIST_PREFETCH_AHEAD:
+            return
+        if self.pending is None or self.pending.done():
+            self.pending = get_playlist_executor().submit(self.fetch_next_page)
+    
+    def wait(self, timeout: float = 20.0):
+        """Wait for an in-flight page, if any"""
+        if self.pending is not None and not self.pending.done():
+            try:
+                self.pending.result(timeout=timeout)
+            except Exception:
+                pass
+    
+    def take_new(self) -> List[Dict[str, str]]:
+        """Tracks fetched since the last call"""
+        with self.lock:
+            new = self.tracks[self.synced:]
+            self.synced = len(self.tracks)
+        return new
 
-    random.shuffle(unique_videos)
-    return unique_videos[:total]
+def sync_playlist():
+    """Append tracks fetched in the background to the session's playlist"""
+    playlist: Optional[LazyPlaylist] = st.session_state.get("playlist")
+    if playlist is None:
+        return
+    new = playlist.take_new()
+    if new:
+        st.session_state["video_urls"].extend(v["url"] for v in new)
+        st.session_state["video_titles"].extend(v["title"] for v in new)
+        st.session_state["search_history"].update(v["url"] for v in new)
+    playlist.prefetch(st.session_state["current_video_index"])
 
 def render_playback_controls():
     """Render the playback controls UI"""
+    sync_playlist()
     if not st.session_state["video_urls"]:
         st.info("👈 Detect your mood first to see playback controls!")
         st.markdown("### 🎵 How it works:")
@@ -286,6 +459,14 @@ def render_playback_controls():
 
     with control_cols[2]:
         if st.button("⏭️ Next", use_container_width=True):
+            playlist: Optional[LazyPlaylist] = st.session_state.get("playlist")
+            if current_idx + 1 >= total_tracks and playlist is not None and not playlist.exhausted:
+                # At the end of what has been fetched: wait for the next page only
+                with st.spinner("🔍 Loading more tracks..."):
+                    playlist.prefetch(current_idx)
+                    playlist.wait()
+                sync_playlist()
+                total_tracks = len(st.session_state["video_urls"])
             st.session_state["current_video_index"] = (current_idx + 1) % total_tracks
             st.rerun()
             
@@ -345,8 +526,20 @@ def render_now_playing():
 def process_music_search(detected_mood: str, language: str, custom_input: str):
     """Process music search and update session state"""
     with st.spinner("🔍 Finding perfect music for your mood..."):
-        search_queries = create_search_queries(detected_mood, language, custom_input)
-        video_results = fetch_recommendations(search_queries, total=15)
+        if REMOTE_MODE:
+            st.session_state["playlist"] = None
+            video_results = remote_recommendations(detected_mood, language, custom_input, total=15)
+        else:
+            # Start playing after the first page; the rest is fetched as playback nears the end
+            playlist = LazyPlaylist(detected_mood, language, custom_input, st.session_state["search_history"])
+            playlist.fill(PLAYLIST_INITIAL_TRACKS)
+            video_results = playlist.take_new()
+            st.session_state["playlist"] = playlist
+            st.session_state["search_history"].update(v["url"] for v in video_results)
+            
+            stats = st.session_state.setdefault("cache_stats", {})
+            key = "search_hits" if playlist.cache_hit else "search_misses"
+            stats[key] = stats.get(key, 0) + 1
 
         if video_results:
             # Update session state
@@ -0,0 +1,70 @@
+import os
+import uuid
+import httpx
+import streamlit as st
+from typing import Dict, List, Optional, Tuple
+from api_client import MoodMusicClient, MoodMusicAPIError, ServerStatus
+
+# Set MOOD_API_URL (e.g. http://localhost:8000) to delegate emotion detection
+# and music search to the FastAPI server instead of loading TensorFlow here
+REMOTE_API_URL = os.environ.get("MOOD_API_URL", "").strip()
+REMOTE_MODE = bool(REMOTE_API_URL)
+
+# How long a /status response is reused before asking the server again
+STATUS_TTL_SECONDS = 30
+
+@st.cache_resource
+def get_client() -> MoodMusicClient:
+    """One pooled keep-alive client per Streamlit process, shared by all sessions"""
+    return MoodMusicClient(REMOTE_API_URL)
+
+def get_session_id() -> str:
+    """Stable id for this browser session, so the server can learn its moods"""
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+    return st.session_state["session_id"]
+
+def describe_error(error: Exception) -> str:
+    """Short, user-facing description of a failed server call"""
+    if isinstance(error, MoodMusicAPIError):
+        if error.status_code == 429:
+            return f"Server is busy, try again in {error.retry_after or 1:.0f}s"
+        return error.detail
+    if isinstance(error, httpx.TimeoutException):
+        return "Server took too long to respond"
+    return f"Cannot reach server at {REMOTE_API_URL}"
+
+@st.cache_data(ttl=STATUS_TTL_SECONDS, show_spinner=False)
+def get_server_status() -> Tuple[Optional[ServerStatus], Optional[str]]:
+    """
+    Returns:
+        Tuple of (server status or None, error message or None)
+    """
+    try:
+        return get_client().status(), None
+    except (MoodMusicAPIError, httpx.HTTPError) as e:
+        return None, describe_error(e)
+
+def remote_detect_mood(img_bytes) -> Tuple[str, float]:
+    """Analyze a camera image on the server"""
+    try:
+        result = get_client().detect_mood(img_bytes.getvalue())
+        return result.emotion, result.confidence
+    except (MoodMusicAPIError, httpx.HTTPError) as e:
+        st.error(f"❌ Emotion analysis failed: {describe_error(e)}")
+        return "neutral", 50.0
+
+def remote_recommendations(mood: str, language: str, custom: str, total: int = 15) -> List[Dict[str, str]]:
+    """Fetch recommendations from the server, which tracks search history itself"""
+    try:
+        result = get_client().get_music(
+            manual_mood=mood,
+            language=language.lower(),
+            custom_preferences=custom,
+            max_results=total,
+            session_id=get_session_id(),
+        )
+    except (MoodMusicAPIError, httpx.HTTPError) as e:
+        st.error(f"❌ Music search failed: {describe_error(e)}")
+        return []
+    return [{"url": video.url, "title": video.title} for video in result.videos]
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from metrics import Counter, GaugeCallback
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+class StageOverloaded(Exception):
+    """Raised when a stage's queue is full and the request should be shed"""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"{stage} stage is overloaded, retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageDeadlineExceeded(Exception):
+    """Raised when the request's own deadline runs out while it waits for a slot"""
+
+    def __init__(self, stage: str, waited: float):
+        super().__init__(f"Request deadline reached after waiting {waited:.1f}s for the {stage} stage")
+        self.stage = stage
+        self.waited = waited
+
+
+STAGE_SHED = Counter(
+    "mood_stage_shed_total", "Requests shed with 429 per stage", ["stage"]
+)
+STAGE_DEADLINE_EXPIRED = Counter(
+    "mood_stage_deadline_expired_total", "Requests whose deadline ran out waiting for a stage slot", ["stage"]
+)
+
+
+class StageLimiter:
+    """
+    Bounded work queue for one pipeline stage.
+
+    At most `concurrency` requests run the stage at once and at most
+    `max_queue` wait for a slot per lane. Priority waiters are always
+    granted a slot before normal ones. Requests that would exceed the queue,
+    or that wait longer than `queue_timeout`, are shed with StageOverloaded;
+    requests whose own shorter timeout runs out first get StageDeadlineExceeded.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int,
+                 queue_timeout: float = 10.0, retry_after: int = 2):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.active = 0
+        self._waiters: Dict[bool, Deque[asyncio.Future]] = {True: deque(), False: deque()}
+
+        # Monitoring counters
+        self.admitted = 0
+        self.shed_count = 0
+        self.timed_out = 0
+        self.deadline_expired = 0
+        self.peak_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters[True]) + len(self._waiters[False])
+
+    def is_saturated(self, priority: bool = False) -> bool:
+        """True when a new request on this lane would be shed immediately"""
+        return self.active >= self.concurrency and len(self._waiters[priority]) >= self.max_queue
+
+    def shed(self) -> StageOverloaded:
+        """Count a request shed from this stage and return the error to raise"""
+        self.shed_count += 1
+        STAGE_SHED.labels(stage=self.name).inc()
+        return StageOverloaded(self.name, self.retry_after)
+
+    def _wake_next(self):
+        """Hand a free slot to the next waiter, priority lane first"""
+        for lane in (True, False):
+            waiters = self._waiters[lane]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.active += 1
+                    waiter.set_result(None)
+                    return
+
+    async def acquire(self, priority: bool = False, timeout: Optional[float] = None):
+        """Wait for a slot for at most queue_timeout, or timeout if that is shorter"""
+        if self.active < self.concurrency and not self.queue_depth:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters[priority]) >= self.max_queue:
+            raise self.shed()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        # The caller's deadline, not overload, is the limit when it is the shorter wait
+        deadline_bound = timeout is not None and timeout < self.queue_timeout
+        wait = timeout if deadline_bound else self.queue_timeout
+        try:
+            await asyncio.wait_for(waiter, timeout=wait)
+        except asyncio.TimeoutError:
+            if deadline_bound:
+                self.deadline_expired += 1
+                STAGE_DEADLINE_EXPIRED.labels(stage=self.name).inc()
+                raise StageDeadlineExceeded(self.name, wait)
+            self.timed_out += 1
+            raise self.shed()
+        except asyncio.CancelledError:
+            # If the slot was granted just before cancellation, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._wake_next()
+
+    @asynccontextmanager
+    async def slot(self, priority: bool = False, timeout: Optional[float] = None):
+        """Hold one slot of this stage for the duration of the block"""
+        await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "queue_depth": self.queue_depth,
+            "priority_queue_depth": len(self._waiters[True]),
+            "max_queue": self.max_queue,
+            "peak_queue_depth": self.peak_queue_depth,
+            "admitted": self.admitted,
+            "shed": self.shed_count,
+            "timed_out": self.timed_out,
+            "deadline_expired": self.deadline_expired,
+        }
+
+
+# Inference is CPU bound, so keep it close to the core count; scraping is
+# network bound and can run wider
+inference_limiter = StageLimiter(
+    "inference",
+    concurrency=_env_int("MOOD_INFERENCE_CONCURRENCY", os.cpu_count() or 2),
+    max_queue=_env_int("MOOD_INFERENCE_MAX_QUEUE", 16),
+    queue_timeout=_env_float("MOOD_INFERENCE_QUEUE_TIMEOUT", 10.0),
+    retry_after=_env_int("MOOD_INFERENCE_RETRY_AFTER", 2),
+)
+scraping_limiter = StageLimiter(
+    "scraping",
+    concurrency=_env_int("MOOD_SCRAPING_CONCURRENCY", 8),
+    max_queue=_env_int("MOOD_SCRAPING_MAX_QUEUE", 32),
+    queue_timeout=_env_float("MOOD_SCRAPING_QUEUE_TIMEOUT", 20.0),
+    retry_after=_env_int("MOOD_SCRAPING_RETRY_AFTER", 5),
+)
+
+
+def _limiter_samples(field: str):
+    return lambda: {
+        (limiter.name,): limiter.get_stats()[field]
+        for limiter in (inference_limiter, scraping_limiter)
+    }
+
+
+GaugeCallback("mood_stage_queue_depth", "Requests waiting for a stage slot",
+              _limiter_samples("queue_depth"), ["stage"])
+GaugeCallback("mood_stage_active", "Requests currently running a stage",
+              _limiter_samples("active"), ["stage"])
+
+
+def get_admission_stats() -> Dict[str, Dict[str, int]]:
+    """Queue depth and shed counts for every stage"""
+    return {
+        "inference": inference_limiter.get_stats(),
+        "scraping": scraping_limiter.get_stats(),
+    }
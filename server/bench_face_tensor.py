@@ -0,0 +1,95 @@
+"""
+Benchmark server CPU per /detect-mood request: full-frame JPEG upload versus
+a client-cropped face tensor (face_tensor.py).
+
+The full-frame path is base64 decode, image decode, face detection and
+classification; the tensor path is only tensor decode and classification.
+CPU time is process-wide, so TensorFlow's worker threads are included.
+
+Usage:
+    python bench_face_tensor.py [--image capture.jpg] [--iterations 50]
+"""
+import argparse
+import base64
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from emotion_detector import (
+    EMOTION_INPUT_SIZE,
+    analyze_emotion_deepface,
+    analyze_face_tensor,
+    get_deepface_error,
+    is_deepface_available,
+    warm_up,
+    _decode_image,
+    _extract_face,
+    _to_model_input,
+)
+from face_tensor import decode_face_tensor, encode_face_tensor
+
+
+def synthetic_jpeg(width: int = 640, height: int = 480) -> bytes:
+    """A webcam-sized JPEG; without a real face detection still scans the whole frame"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def full_frame_path(payload: str):
+    return analyze_emotion_deepface(base64.b64decode(payload))
+
+
+def tensor_path(payload: bytes):
+    return analyze_face_tensor(decode_face_tensor(payload, EMOTION_INPUT_SIZE))
+
+
+def measure(func, payload, iterations: int):
+    """Return mean (CPU ms, wall ms) per call"""
+    func(payload)  # warm-up
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        func(payload)
+    cpu = (time.process_time() - cpu_start) / iterations * 1000
+    wall = (time.perf_counter() - wall_start) / iterations * 1000
+    return cpu, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full-frame versus face tensor /detect-mood input")
+    parser.add_argument("--image", help="Capture to use (default: synthetic 640x480 JPEG)")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    if not is_deepface_available():
+        print(f"DeepFace not available: {get_deepface_error()}")
+        return
+    warm_up()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            jpeg = f.read()
+    else:
+        jpeg = synthetic_jpeg()
+    frame_payload = base64.b64encode(jpeg).decode("ascii")
+
+    # What a client-side detector would send for the same capture
+    face = _to_model_input(_extract_face(_decode_image(jpeg)))
+    tensor_payload = encode_face_tensor((face * 255).round().astype(np.uint8))
+
+    rows = [
+        ("full frame", len(frame_payload), *measure(full_frame_path, frame_payload, args.iterations)),
+        ("face tensor", len(tensor_payload), *measure(tensor_path, tensor_payload, args.iterations)),
+    ]
+    print(f"{'input':>12} {'bytes':>8} {'CPU ms':>8} {'wall ms':>8}")
+    for name, size, cpu, wall in rows:
+        print(f"{name:>12} {size:>8} {cpu:>8.2f} {wall:>8.2f}")
+    print(f"CPU per request: {rows[0][2] / max(rows[1][2], 1e-6):.1f}x lower with face tensors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark the cost of serializing a /get-music response.
+
+Compares the pydantic path (build VideoResult/MusicResponse, validate, encode)
+with the fast path in serialization.py for several max_results sizes.
+
+Usage:
+    python bench_serialization.py [--iterations 2000]
+"""
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from schemas import VideoResult, MusicResponse
+from serialization import ORJSON_AVAILABLE, to_video_records, encode_music_response
+
+SEARCH_STATS = {
+    "total_entries": 25,
+    "auto_clean_threshold": 45,
+    "target_size": 25,
+    "auto_clean_active": True,
+    "notes": "History auto-manages at 45 entries, keeps 25 most recent"
+}
+
+
+def make_results(count: int):
+    """Build scraper-shaped result dicts"""
+    return [
+        {
+            "url": f"https://www.youtube.com/watch?v={i:011d}",
+            "title": f"Upbeat feel good track number {i} - Official Music Video",
+            "duration": "3:45",
+            "duration_seconds": 225,
+            "view_count": 1_234_567 + i,
+            "channel": "Some Artist - Topic",
+            "thumbnail": f"https://i.ytimg.com/vi/{i:011d}/hq720.jpg",
+            "published": "2 years ago"
+        }
+        for i in range(count)
+    ]
+
+
+def pydantic_path(results):
+    """What FastAPI did before: model construction, validation and re-encoding"""
+    response = MusicResponse(
+        videos=[VideoResult(**v) for v in results],
+        total_count=len(results),
+        mood="happy",
+        language="english",
+        search_stats=SEARCH_STATS
+    )
+    validated = MusicResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def fast_path(results):
+    return encode_music_response(
+        to_video_records(results),
+        mood="happy",
+        language="english",
+        search_stats=SEARCH_STATS
+    )
+
+
+def time_per_call(func, results, iterations: int) -> float:
+    """Return mean microseconds per call"""
+    func(results)  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(results)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /get-music response serialization")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"orjson available: {ORJSON_AVAILABLE}")
+    print(f"{'max_results':>12} {'pydantic us':>12} {'fast us':>10} {'speedup':>8} {'bytes':>7}")
+    for count in (5, 15, 50, 200):
+        results = make_results(count)
+        slow = time_per_call(pydantic_path, results, args.iterations)
+        fast = time_per_call(fast_path, results, args.iterations)
+        size = len(fast_path(results))
+        print(f"{count:>12} {slow:>12.1f} {fast:>10.1f} {slow / fast:>7.1f}x {size:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Clients may send their own budget in seconds, e.g. "X-Request-Timeout: 8"
+DEADLINE_HEADER = "X-Request-Timeout"
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+DEFAULT_REQUEST_TIMEOUT = _env_float("MOOD_REQUEST_TIMEOUT", 30.0)
+MAX_REQUEST_TIMEOUT = _env_float("MOOD_MAX_REQUEST_TIMEOUT", 120.0)
+MIN_REQUEST_TIMEOUT = 1.0
+
+# Fraction of a /get-music budget inference may use, leaving the rest for
+# scraping even when inference falls back to neutral at its own deadline
+INFERENCE_BUDGET_SHARE = min(1.0, max(0.1, _env_float("MOOD_INFERENCE_BUDGET_SHARE", 0.5)))
+
+
+class Deadline:
+    """
+    Absolute end time for one request, passed down to every stage so each
+    can size its own timeouts from what is left and stop early with a
+    partial result instead of overrunning
+    """
+
+    __slots__ = ("budget", "expires_at")
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: float) -> float:
+        """The smaller of a stage's own timeout and the time left"""
+        return min(cap, self.remaining())
+
+    def share(self, fraction: float) -> "Deadline":
+        """A tighter deadline for one stage: `fraction` of the time left"""
+        return Deadline(self.remaining() * fraction)
+
+    def allows(self, seconds: float) -> bool:
+        """True if `seconds` of work (a backoff, a retry) still fits"""
+        return self.remaining() > seconds
+
+    def __repr__(self) -> str:
+        return f"Deadline(budget={self.budget:.1f}s, remaining={self.remaining():.2f}s)"
+
+
+def stage_timeout(deadline: Optional[Deadline], default: float) -> float:
+    """Time a stage may spend: the remaining budget, or `default` without a deadline"""
+    return deadline.timeout(default) if deadline else default
+
+
+def deadline_from_header(value: Optional[str]) -> Deadline:
+    """Deadline from the client's header, clamped, or the server default"""
+    seconds = DEFAULT_REQUEST_TIMEOUT
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+    return Deadline(min(MAX_REQUEST_TIMEOUT, max(MIN_REQUEST_TIMEOUT, seconds)))
@@ -1,11 +1,14 @@
 import os
 import warnings
-import tempfile
 import numpy as np
 from PIL import Image
-from typing import Tuple, Union, BinaryIO
+from typing import List, Optional, Tuple, Union, BinaryIO
 import io
 
+from metrics import IMAGE_DECODE_SECONDS, FACE_DETECTION_SECONDS, EMOTION_INFERENCE_SECONDS
+from deadline import Deadline
+from tracing import span
+
 # Suppress TensorFlow warnings
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
@@ -15,6 +18,17 @@ warnings.filterwarnings("ignore", category=UserWarning)
 DEEPFACE_AVAILABLE = False
 DEEPFACE_ERROR = None
 
+# In preload-and-fork serving (gunicorn.conf.py) the master only loads the
+# weights and every worker runs warm_up() after fork, because TensorFlow's
+# thread pools do not survive fork once inference has run in the parent
+DEFER_WARMUP = os.environ.get("MOOD_DEFER_WARMUP", "0") == "1"
+
+# Optional replacement for DeepFace's emotion classifier, e.g. a distilled
+# student exported by training/distill.py. It must take (N, 48, 48, 1)
+# grayscale in [0, 1] and return probabilities in EMOTION_LABELS order.
+# DeepFace is still used for face detection.
+EMOTION_MODEL_PATH = os.environ.get("MOOD_EMOTION_MODEL_PATH")
+
 try:
     import cv2
     import tensorflow as tf
@@ -24,25 +38,28 @@ try:
     
     from deepface import DeepFace
     
-    # test DeepFace with a dummy analysis to ensure it's working
-    # create a small test image
-    test_img = np.ones((48, 48, 3), dtype=np.uint8) * 128
-    test_path = "temp_test.jpg"
-    cv2.imwrite(test_path, test_img)
-    
-    try:
-        _ = DeepFace.analyze(
-            img_path=test_path,
-            actions=["emotion"],
-            enforce_detection=False,
-            silent=True
-        )
+    if DEFER_WARMUP:
         DEEPFACE_AVAILABLE = True
-        os.remove(test_path)
-    except Exception as test_error:
-        DEEPFACE_ERROR = f"DeepFace test failed: {str(test_error)}"
-        if os.path.exists(test_path):
+    else:
+        # test DeepFace with a dummy analysis to ensure it's working
+        # create a small test image
+        test_img = np.ones((48, 48, 3), dtype=np.uint8) * 128
+        test_path = "temp_test.jpg"
+        cv2.imwrite(test_path, test_img)
+        
+        try:
+            _ = DeepFace.analyze(
+                img_path=test_path,
+                actions=["emotion"],
+                enforce_detection=False,
+                silent=True
+            )
+            DEEPFACE_AVAILABLE = True
             os.remove(test_path)
+        except Exception as test_error:
+            DEEPFACE_ERROR = f"DeepFace test failed: {str(test_error)}"
+            if os.path.exists(test_path):
+                os.remove(test_path)
     
 except ImportError as e:
     DEEPFACE_ERROR = f"Import error: {str(e)}"
@@ -62,22 +79,49 @@ def get_deepface_error() -> str:
     """Get the DeepFace error message if any"""
     return DEEPFACE_ERROR or "No error"
 
-def analyze_emotion_deepface(img_input: Union[BinaryIO, io.BytesIO, bytes]) -> Tuple[str, float]:
+# Output order of DeepFace's emotion model
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+EMOTION_INPUT_SIZE = 48
+
+_emotion_model = None
+
+def preload_models():
     """
-    Analyze emotion using DeepFace with enhanced error handling
-    
-    Args:
-        img_input: Can be a file-like object, BytesIO, or bytes
-        
-    Returns:
-        Tuple of (emotion, confidence)
+    Load the emotion classifier weights without running inference, so a
+    forking server can share them copy-on-write with its workers
     """
+    global DEEPFACE_AVAILABLE, DEEPFACE_ERROR
     if not DEEPFACE_AVAILABLE:
-        print(f"⚠ DeepFace not available: {DEEPFACE_ERROR}")
-        return "neutral", 50.0
-    
-    tmp_path = None
+        return
     try:
+        _get_emotion_model()
+    except Exception as e:
+        DEEPFACE_AVAILABLE = False
+        DEEPFACE_ERROR = f"DeepFace model load failed: {str(e)}"
+
+def warm_up():
+    """Run one dummy detection and classification to initialise the runtime"""
+    global DEEPFACE_AVAILABLE, DEEPFACE_ERROR
+    if not DEEPFACE_AVAILABLE:
+        return
+    try:
+        test_img = np.ones((48, 48, 3), dtype=np.uint8) * 128
+        if EMOTION_MODEL_PATH:
+            classify_faces(_to_model_input(_extract_face(test_img))[np.newaxis])
+        else:
+            DeepFace.analyze(
+                img_path=test_img,
+                actions=["emotion"],
+                enforce_detection=False,
+                silent=True
+            )
+    except Exception as test_error:
+        DEEPFACE_AVAILABLE = False
+        DEEPFACE_ERROR = f"DeepFace test failed: {str(test_error)}"
+
+def _decode_image(img_input: Union[BinaryIO, io.BytesIO, bytes]) -> np.ndarray:
+    """Decode image bytes or a file-like object into a BGR array"""
+    with IMAGE_DECODE_SECONDS.time(), span("image.decode"):
         # Handle different input types
         if isinstance(img_input, bytes):
             pil_image = Image.open(io.BytesIO(img_input))
@@ -92,24 +136,175 @@ def analyze_emotion_deepface(img_input: Union[BinaryIO, io.BytesIO, bytes]) -> T
         if pil_image.mode != 'RGB':
             pil_image = pil_image.convert('RGB')
         
-        img_array = np.array(pil_image)
+        # DeepFace takes BGR arrays directly, no temporary JPEG needed
+        return np.array(pil_image)[:, :, ::-1]
+
+def _extract_face(img_array: np.ndarray) -> np.ndarray:
+    """
+    Detect and align the most prominent face as a BGR uint8 crop; without
+    a face DeepFace falls back to the whole frame
+    """
+    with FACE_DETECTION_SECONDS.time(), span("face.detect"):
+        faces = DeepFace.extract_faces(
+            img_path=img_array,
+            detector_backend="opencv",
+            enforce_detection=False,
+            align=True
+        )
+        return (faces[0]["face"][:, :, ::-1] * 255).astype(np.uint8)
+
+def _get_emotion_model():
+    """Return the underlying Keras emotion classifier, built once"""
+    global _emotion_model
+    if _emotion_model is None:
+        if EMOTION_MODEL_PATH:
+            import keras
+            _emotion_model = keras.models.load_model(EMOTION_MODEL_PATH, compile=False)
+            print(f"✅ Using emotion model from {EMOTION_MODEL_PATH}")
+        else:
+            _emotion_model = DeepFace.build_model(model_name="Emotion", task="facial_attribute").model
+    return _emotion_model
+
+def _to_model_input(face: np.ndarray) -> np.ndarray:
+    """Convert a BGR face crop into the classifier's 48x48 grayscale input"""
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    # Pad to square first like DeepFace does, so crops keep their aspect ratio
+    h, w = gray.shape
+    side = max(h, w)
+    top, left = (side - h) // 2, (side - w) // 2
+    gray = cv2.copyMakeBorder(gray, top, side - h - top, left, side - w - left,
+                              cv2.BORDER_CONSTANT, value=0)
+    gray = cv2.resize(gray, (EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE))
+    return gray.astype(np.float32) / 255.0
+
+def classify_faces(gray_faces: np.ndarray) -> List[Tuple[str, float]]:
+    """
+    Run the emotion classifier over a batch of preprocessed faces in one pass
+    
+    Args:
+        gray_faces: float32 array of shape (N, 48, 48) with values in [0, 1]
         
-        # create temporary file
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-            
-        pil_image.save(tmp_path, 'JPEG')
+    Returns:
+        List of (emotion, confidence) with confidence in percent
+    """
+    batch = np.asarray(gray_faces, dtype=np.float32).reshape(
+        -1, EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE, 1
+    )
+    with EMOTION_INFERENCE_SECONDS.time(), span("emotion.classify", batch=len(batch)):
+        predictions = np.asarray(_get_emotion_model()(batch, training=False))
+    
+    results = []
+    for row in predictions:
+        total = float(row.sum()) or 1.0
+        best = int(np.argmax(row))
+        results.append((EMOTION_LABELS[best], 100.0 * float(row[best]) / total))
+    return results
+
+def _out_of_time(deadline: Optional[Deadline], stage: str) -> bool:
+    """True (and logged) if the request's deadline passed before `stage`"""
+    if deadline is not None and deadline.expired():
+        print(f"⏱ Deadline reached before {stage}, falling back to neutral")
+        return True
+    return False
+
+def analyze_face_tensor(gray_faces: np.ndarray) -> Tuple[str, float]:
+    """
+    Classify a face the client already detected and cropped, skipping image
+    decoding and face detection. Only the first face is used.
+    
+    Args:
+        gray_faces: float32 array of shape (N, 48, 48) with values in [0, 1],
+            as returned by face_tensor.decode_face_tensor
+    """
+    if not DEEPFACE_AVAILABLE:
+        print(f"⚠ DeepFace not available: {DEEPFACE_ERROR}")
+        return "neutral", 50.0
+    
+    try:
+        return classify_faces(gray_faces[:1])[0]
+    except Exception as e:
+        print(f"❌ Face tensor classification failed: {str(e)}")
+        return "neutral", 50.0
+
+def analyze_emotion_batch(img_inputs: List[Union[bytes, np.ndarray]],
+                          deadline: Optional[Deadline] = None) -> List[Tuple[str, float]]:
+    """
+    Analyze several captures with per-image face detection and a single
+    batched classifier pass. Items may also be decoded face tensors (a
+    (48, 48) float array), which skip straight to the classifier. Images
+    that fail to decode, or that are not reached before the deadline, get
+    neutral.
+    
+    Returns:
+        List of (emotion, confidence) in input order
+    """
+    if not DEEPFACE_AVAILABLE:
+        print(f"⚠ DeepFace not available: {DEEPFACE_ERROR}")
+        return [("neutral", 50.0)] * len(img_inputs)
+    
+    results: List[Tuple[str, float]] = [("neutral", 50.0)] * len(img_inputs)
+    faces = []
+    indices = []
+    for i, img_input in enumerate(img_inputs):
+        if _out_of_time(deadline, f"face detection for batch item {i}"):
+            break
+        try:
+            if isinstance(img_input, np.ndarray):
+                faces.append(img_input)
+            else:
+                faces.append(_to_model_input(_extract_face(_decode_image(img_input))))
+            indices.append(i)
+        except Exception as e:
+            print(f"❌ Emotion analysis failed for batch item {i}: {str(e)}")
+    
+    if faces and not _out_of_time(deadline, "batched classification"):
+        try:
+            for i, result in zip(indices, classify_faces(np.stack(faces))):
+                results[i] = result
+        except Exception as e:
+            print(f"❌ Batched emotion inference failed: {str(e)}")
+    return results
+
+def analyze_emotion_deepface(img_input: Union[BinaryIO, io.BytesIO, bytes],
+                             deadline: Optional[Deadline] = None) -> Tuple[str, float]:
+    """
+    Analyze emotion using DeepFace with enhanced error handling
+    
+    Args:
+        img_input: Can be a file-like object, BytesIO, or bytes
+        deadline: checked between stages; once it passes the result is
+            neutral so the caller still has time to fetch music
+        
+    Returns:
+        Tuple of (emotion, confidence)
+    """
+    if not DEEPFACE_AVAILABLE:
+        print(f"⚠ DeepFace not available: {DEEPFACE_ERROR}")
+        return "neutral", 50.0
+    
+    try:
+        img_array = _decode_image(img_input)
+        if _out_of_time(deadline, "face detection"):
+            return "neutral", 50.0
         
-        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
-            raise Exception("Failed to save temporary image file")
+        # Detect and align the face separately so each stage can be timed
+        face = _extract_face(img_array)
+        if _out_of_time(deadline, "emotion classification"):
+            return "neutral", 50.0
         
-        # analyze with DeepFace
-        result = DeepFace.analyze(
-            img_path=tmp_path,
-            actions=["emotion"],
-            enforce_detection=False,
-            silent=True
-        )
+        if EMOTION_MODEL_PATH:
+            # Custom classifiers are only reachable through classify_faces
+            return classify_faces(_to_model_input(face)[np.newaxis])[0]
+        
+        # analyze the cropped face with DeepFace
+        with EMOTION_INFERENCE_SECONDS.time(), span("emotion.classify", batch=1):
+            result = DeepFace.analyze(
+                img_path=face,
+                actions=["emotion"],
+                detector_backend="skip",
+                enforce_detection=False,
+                silent=True
+            )
         
         # handle both single result and list of results
         if isinstance(result, list):
@@ -118,10 +313,6 @@ def analyze_emotion_deepface(img_input: Union[BinaryIO, io.BytesIO, bytes]) -> T
         dominant_emotion = result["dominant_emotion"]
         confidence = result["emotion"][dominant_emotion]
         
-        # Clean up
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-        
         # Validate results
         if dominant_emotion not in MOOD_KEYWORDS:
             print(f"Unknown emotion detected: {dominant_emotion}, using neutral")
@@ -130,13 +321,6 @@ def analyze_emotion_deepface(img_input: Union[BinaryIO, io.BytesIO, bytes]) -> T
         return dominant_emotion, confidence
         
     except Exception as e:
-        # Clean up on error
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-        
         error_msg = str(e)
         print(f"❌ Emotion analysis failed: {error_msg}")
         
@@ -0,0 +1,103 @@
+"""
+Compact binary encoding for face crops a client has already detected.
+
+A face tensor is a 12-byte little-endian header followed by the pixels:
+
+    offset  size  field
+    0       4     magic b"MFT1"
+    4       1     dtype: 0 = uint8 (0-255), 1 = float16 (0.0-1.0)
+    5       1     reserved, 0
+    6       2     count of faces
+    8       2     height
+    10      2     width
+    12      ...   count * height * width grayscale pixels, row-major
+
+48x48 uint8 (the classifier's native input) is 2,316 bytes per face,
+against tens of kB for a full-frame JPEG. Other sizes are accepted and
+resized on the server.
+"""
+import struct
+from typing import Tuple
+
+import numpy as np
+
+from metrics import Histogram
+
+FACE_TENSOR_CONTENT_TYPE = "application/x-face-tensor"
+
+MAGIC = b"MFT1"
+HEADER = struct.Struct("<4sBBHHH")
+DTYPE_UINT8 = 0
+DTYPE_FLOAT16 = 1
+_DTYPES = {DTYPE_UINT8: np.dtype(np.uint8), DTYPE_FLOAT16: np.dtype("<f2")}
+
+MAX_FACES = 32
+MAX_SIDE = 256
+
+FACE_TENSOR_DECODE_SECONDS = Histogram(
+    "mood_face_tensor_decode_seconds", "Time to decode a client-cropped face tensor"
+)
+
+
+class FaceTensorError(ValueError):
+    """The payload is not a valid face tensor"""
+
+
+def parse_header(data: bytes) -> Tuple[int, int, int, int]:
+    """Return (dtype, count, height, width), validating sizes against the payload"""
+    if len(data) < HEADER.size:
+        raise FaceTensorError(f"Face tensor too short: {len(data)} bytes")
+    magic, dtype, _, count, height, width = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FaceTensorError("Not a face tensor (bad magic)")
+    if dtype not in _DTYPES:
+        raise FaceTensorError(f"Unsupported face tensor dtype {dtype}")
+    if not 1 <= count <= MAX_FACES:
+        raise FaceTensorError(f"Face count must be 1-{MAX_FACES}, got {count}")
+    if not (1 <= height <= MAX_SIDE and 1 <= width <= MAX_SIDE):
+        raise FaceTensorError(f"Face size must be at most {MAX_SIDE}x{MAX_SIDE}, got {height}x{width}")
+    expected = HEADER.size + count * height * width * _DTYPES[dtype].itemsize
+    if len(data) != expected:
+        raise FaceTensorError(f"Face tensor should be {expected} bytes, got {len(data)}")
+    return dtype, count, height, width
+
+
+def decode_face_tensor(data: bytes, size: int) -> np.ndarray:
+    """
+    Decode into float32 faces of shape (count, size, size) in [0, 1], ready
+    for emotion_detector.classify_faces
+    """
+    with FACE_TENSOR_DECODE_SECONDS.time():
+        dtype, count, height, width = parse_header(data)
+        pixels = np.frombuffer(data, dtype=_DTYPES[dtype], offset=HEADER.size)
+        faces = pixels.reshape(count, height, width).astype(np.float32)
+        if dtype == DTYPE_UINT8:
+            faces /= 255.0
+        else:
+            np.clip(faces, 0.0, 1.0, out=faces)
+        if (height, width) != (size, size):
+            import cv2
+            faces = np.stack([
+                cv2.resize(face, (size, size), interpolation=cv2.INTER_AREA) for face in faces
+            ])
+        return faces
+
+
+def encode_face_tensor(faces: np.ndarray) -> bytes:
+    """
+    Encode grayscale faces, (height, width) or (count, height, width):
+    uint8 arrays are sent as-is, floats in [0, 1] as float16
+    """
+    faces = np.asarray(faces)
+    if faces.ndim == 2:
+        faces = faces[np.newaxis]
+    if faces.ndim != 3:
+        raise FaceTensorError(f"Expected (count, height, width) faces, got shape {faces.shape}")
+    if faces.dtype == np.uint8:
+        dtype = DTYPE_UINT8
+    else:
+        dtype = DTYPE_FLOAT16
+        faces = np.clip(faces, 0.0, 1.0)
+    count, height, width = faces.shape
+    header = HEADER.pack(MAGIC, dtype, 0, count, height, width)
+    return header + np.ascontiguousarray(faces, dtype=_DTYPES[dtype]).tobytes()
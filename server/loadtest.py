@@ -0,0 +1,417 @@
+"""
+Offline end-to-end load test for the Mood Music API.
+
+Starts a local YouTube stand-in that serves recorded (or synthetic)
+search-result pages (and JSON continuation pages after them) with
+configurable latency and error injection, starts
+main.py under uvicorn pointed at it via MOOD_YOUTUBE_BASE_URL, drives it
+with simulated webcam clients and reports throughput, latency percentiles
+per endpoint and server CPU/RSS.
+
+Usage:
+    # Optionally record real result pages once (needs network)
+    python loadtest.py record --pages pages/ "happy songs english" "sad songs hindi"
+
+    # Run the load test (fully offline)
+    python loadtest.py run --clients 16 --duration 60 --pages pages/ \\
+        --latency-ms 300 --jitter-ms 150 --error-rate 0.05
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, quote_plus, urlparse
+
+import requests
+
+from memory_report import read_memory
+
+MOODS = ["happy", "sad", "angry", "fear", "surprise", "disgust", "neutral"]
+LANGUAGES = ["english", "hindi", "bengali"]
+
+
+def page_key(query: str) -> str:
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+# Synthetic continuation tokens are "<page>:<query>"
+CONTINUATION_PAGES = 5
+
+
+def synthetic_sections(query: str, page: int, videos: int = 20) -> List[dict]:
+    """Result sections for one page of a query, ending in a continuation item if more follow"""
+    rng = random.Random(f"{query}#{page}" if page else query)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    items = []
+    for i in range(page * videos, (page + 1) * videos):
+        video_id = "".join(rng.choice(alphabet) for _ in range(11))
+        items.append({"videoRenderer": {
+            "videoId": video_id,
+            "title": {"runs": [{"text": f"{query.title()} - Track {i + 1}"}]},
+            "lengthText": {"simpleText": f"{rng.randint(2, 6)}:{rng.randint(0, 59):02d}"},
+            "viewCountText": {"simpleText": f"{rng.randint(1000, 9_999_999):,} views"},
+            "ownerText": {"runs": [{"text": f"Channel {rng.randint(1, 50)}"}]},
+            "thumbnail": {"thumbnails": [
+                {"url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg", "width": 480, "height": 360},
+            ]},
+            "publishedTimeText": {"simpleText": f"{rng.randint(1, 11)} months ago"},
+        }})
+    sections = [{"itemSectionRenderer": {"contents": items}}]
+    if page + 1 < CONTINUATION_PAGES:
+        sections.append({"continuationItemRenderer": {"continuationEndpoint": {
+            "continuationCommand": {"token": f"{page + 1}:{query}"}
+        }}})
+    return sections
+
+
+def continuation_response(token: str) -> str:
+    """JSON for a youtubei/v1/search continuation; tokens from recorded pages get synthetic results"""
+    page, _, query = token.partition(":")
+    if not page.isdigit():
+        page, query = "1", token
+    data = {"onResponseReceivedCommands": [{"appendContinuationItemsAction": {
+        "continuationItems": synthetic_sections(query, int(page))
+    }}]}
+    return json.dumps(data)
+
+
+def synthetic_page(query: str, videos: int = 20) -> str:
+    """A results page shaped like YouTube's, with stable per-query video IDs"""
+    data = {"contents": {"twoColumnSearchResultsRenderer": {"primaryContents": {
+        "sectionListRenderer": {"contents": synthetic_sections(query, 0, videos)}
+    }}}}
+    # Pad to roughly the size of a real results page so parse cost is realistic
+    padding = "<div>" + ("x" * 1000 + "</div><div>") * 200 + "</div>"
+    return (
+        "<html><head><title>YouTube</title></head><body>"
+        f"{padding}<script>var ytInitialData = {json.dumps(data)};</script>"
+        "</body></html>"
+    )
+
+
+class StandInConfig:
+    def __init__(self, pages_dir: Optional[str], latency_ms: float, jitter_ms: float,
+                 error_rate: float, throttle_rate: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.pages: Dict[str, str] = {}
+        if pages_dir and os.path.isdir(pages_dir):
+            for name in os.listdir(pages_dir):
+                if name.endswith(".html"):
+                    with open(os.path.join(pages_dir, name), encoding="utf-8") as f:
+                        self.pages[name[:-5]] = f.read()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def page_for(self, query: str) -> str:
+        key = page_key(query)
+        if key in self.pages:
+            return self.pages[key]
+        if self.pages:
+            # Unknown query: replay a recorded page chosen stably by query
+            keys = sorted(self.pages)
+            return self.pages[keys[int(key, 16) % len(keys)]]
+        return synthetic_page(query)
+
+
+def make_handler(config: StandInConfig):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: str, headers: Optional[Dict[str, str]] = None,
+                  content_type: str = "text/html; charset=utf-8"):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _inject(self) -> bool:
+            """Apply latency and maybe send an injected failure; True if one was sent"""
+            with config.lock:
+                config.requests += 1
+            delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+            time.sleep(delay)
+
+            roll = random.random()
+            if roll < config.error_rate:
+                self._send(500, "injected error")
+                return True
+            if roll < config.error_rate + config.throttle_rate:
+                self._send(429, "injected throttle", {"Retry-After": "1"})
+                return True
+            return False
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/results":
+                self._send(404, "not found")
+                return
+            if self._inject():
+                return
+            query = parse_qs(url.query).get("search_query", [""])[0]
+            self._send(200, config.page_for(query))
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if urlparse(self.path).path != "/youtubei/v1/search":
+                self._send(404, "not found")
+                return
+            if self._inject():
+                return
+            try:
+                token = json.loads(body)["continuation"]
+            except (ValueError, KeyError):
+                self._send(400, "bad continuation request")
+                return
+            self._send(200, continuation_response(token), content_type="application/json")
+
+    return StandInHandler
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_capture_images(count: int, images_dir: Optional[str]) -> List[str]:
+    """Base64 data URLs: real images from a directory, or synthetic face-like JPEGs"""
+    encoded = []
+    if images_dir and os.path.isdir(images_dir):
+        for name in sorted(os.listdir(images_dir)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(images_dir, name), "rb") as f:
+                    encoded.append("data:image/jpeg;base64," + base64.b64encode(f.read()).decode())
+        if encoded:
+            return encoded
+
+    from PIL import Image, ImageDraw
+    rng = random.Random(0)
+    for _ in range(count):
+        img = Image.new("RGB", (640, 480), tuple(rng.randint(60, 200) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        cx, cy = 320 + rng.randint(-60, 60), 240 + rng.randint(-40, 40)
+        draw.ellipse((cx - 90, cy - 120, cx + 90, cy + 120), fill=(224, 188, 160))
+        for dx in (-35, 35):
+            draw.ellipse((cx + dx - 12, cy - 40, cx + dx + 12, cy - 25), fill=(40, 30, 30))
+        draw.arc((cx - 45, cy + 20, cx + 45, cy + 70), 0, 180, fill=(120, 40, 40), width=5)
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=85)
+        encoded.append("data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode())
+    return encoded
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def add(self, endpoint: str, seconds: float, status: int):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def client_loop(base_url: str, images: List[str], args, results: Results, stop: threading.Event, seed: int):
+    rng = random.Random(seed)
+    session = requests.Session()
+    session_id = f"loadtest-{seed}"
+    while not stop.is_set():
+        manual = rng.random() < args.manual_ratio
+        detect_only = not manual and rng.random() < args.detect_ratio
+        endpoint = "/detect-mood" if detect_only else "/get-music"
+        payload = {
+            "image_data": "" if manual else rng.choice(images),
+            "language": rng.choice(LANGUAGES),
+            "max_results": args.max_results,
+            "session_id": session_id,
+        }
+        if manual:
+            payload["manual_mood"] = rng.choice(MOODS)
+        label = f"{endpoint} (manual)" if manual else endpoint
+
+        start = time.perf_counter()
+        try:
+            response = session.post(base_url + endpoint, json=payload, timeout=args.request_timeout)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        results.add(label, time.perf_counter() - start, status)
+        if args.think_ms:
+            time.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+
+def read_cpu_seconds(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def wait_for_server(base_url: str, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + "/health", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run(args):
+    config = StandInConfig(args.pages, args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate)
+    stand_in_port = free_port()
+    stand_in = ThreadingHTTPServer(("127.0.0.1", stand_in_port), make_handler(config))
+    threading.Thread(target=stand_in.serve_forever, daemon=True).start()
+    source = f"{len(config.pages)} recorded pages" if config.pages else "synthetic pages"
+    print(f"YouTube stand-in on :{stand_in_port} serving {source}")
+
+    api_port = args.port or free_port()
+    base_url = f"http://127.0.0.1:{api_port}"
+    env = dict(os.environ, MOOD_YOUTUBE_BASE_URL=f"http://127.0.0.1:{stand_in_port}")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(api_port),
+         "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    try:
+        if not wait_for_server(base_url, args.startup_timeout):
+            print("API server did not become healthy in time")
+            return 1
+
+        images = make_capture_images(args.image_variants, args.images)
+        results = Results()
+        stop = threading.Event()
+        clients = [
+            threading.Thread(target=client_loop, args=(base_url, images, args, results, stop, i), daemon=True)
+            for i in range(args.clients)
+        ]
+
+        cpu_start = read_cpu_seconds(server.pid)
+        wall_start = time.perf_counter()
+        peak_rss = 0
+        for client in clients:
+            client.start()
+        while time.perf_counter() - wall_start < args.duration:
+            time.sleep(1)
+            peak_rss = max(peak_rss, read_memory(server.pid).get("rss_kb") or 0)
+        stop.set()
+        for client in clients:
+            client.join(timeout=args.request_timeout)
+        wall = time.perf_counter() - wall_start
+        cpu_end = read_cpu_seconds(server.pid)
+
+        print(f"\n{args.clients} clients for {wall:.1f}s, upstream requests served: {config.requests}")
+        print(f"{'endpoint':<24} {'count':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+        for endpoint in sorted(results.latencies):
+            values = results.latencies[endpoint]
+            statuses = ", ".join(f"{code}:{n}" for code, n in sorted(results.statuses[endpoint].items()))
+            print(
+                f"{endpoint:<24} {len(values):>6} {len(values) / wall:>7.2f} "
+                f"{percentile(values, 50) * 1000:>8.0f} {percentile(values, 95) * 1000:>8.0f} "
+                f"{percentile(values, 99) * 1000:>8.0f}  {statuses}"
+            )
+        all_values = [v for values in results.latencies.values() for v in values]
+        if all_values:
+            print(f"{'all':<24} {len(all_values):>6} {len(all_values) / wall:>7.2f} "
+                  f"{statistics.median(all_values) * 1000:>8.0f}")
+        if cpu_start is not None and cpu_end is not None:
+            print(f"\nServer CPU: {cpu_end - cpu_start:.1f}s ({(cpu_end - cpu_start) / wall * 100:.0f}% of one core)")
+        print(f"Server peak RSS: {peak_rss / 1024:.1f} MB")
+        return 0
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        stand_in.shutdown()
+
+
+def record(args):
+    """Save live result pages so later runs can replay them offline"""
+    from music_manager import SEARCH_HEADERS
+
+    os.makedirs(args.pages, exist_ok=True)
+    for query in args.queries:
+        url = f"https://www.youtube.com/results?search_query={quote_plus(query)}"
+        response = requests.get(url, headers=SEARCH_HEADERS, timeout=15)
+        response.raise_for_status()
+        path = os.path.join(args.pages, page_key(query) + ".html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(response.text)
+        print(f"Recorded {query!r} -> {path} ({len(response.text) // 1024} kB)")
+        time.sleep(1)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Mood Music API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the load test")
+    run_parser.add_argument("--clients", type=int, default=8)
+    run_parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    run_parser.add_argument("--pages", help="Directory of recorded result pages")
+    run_parser.add_argument("--images", help="Directory of capture images (default: synthetic)")
+    run_parser.add_argument("--image-variants", type=int, default=8)
+    run_parser.add_argument("--latency-ms", type=float, default=250)
+    run_parser.add_argument("--jitter-ms", type=float, default=100)
+    run_parser.add_argument("--error-rate", type=float, default=0.0)
+    run_parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of 429 replies")
+    run_parser.add_argument("--manual-ratio", type=float, default=0.2, help="Fraction using manual_mood")
+    run_parser.add_argument("--detect-ratio", type=float, default=0.2, help="Fraction of image requests to /detect-mood")
+    run_parser.add_argument("--max-results", type=int, default=15)
+    run_parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between a client's requests")
+    run_parser.add_argument("--request-timeout", type=float, default=120)
+    run_parser.add_argument("--startup-timeout", type=float, default=180)
+    run_parser.add_argument("--port", type=int, default=0)
+    run_parser.set_defaults(func=run)
+
+    record_parser = sub.add_parser("record", help="Record live result pages for replay")
+    record_parser.add_argument("--pages", required=True)
+    record_parser.add_argument("queries", nargs="+")
+    record_parser.set_defaults(func=record)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,26 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List
 import uvicorn
 import base64
+import json
 import logging
+import os
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
 
 # Import your existing modules
 from emotion_detector import (
     is_deepface_available, 
     get_deepface_error,
     analyze_emotion_deepface,
+    analyze_emotion_batch,
+    analyze_face_tensor,
     validate_emotion,
-    get_supported_emotions
+    get_supported_emotions,
+    EMOTION_INPUT_SIZE
 )
 from music_manager import (
     create_search_queries,
@@ -20,13 +28,68 @@ from music_manager import (
     SUPPORTED_LANGS,
     get_supported_languages,
     clear_search_history,
-    get_search_history_stats
+    get_search_history_stats,
+    get_singleflight_stats,
+    commit_to_history,
+    fetch_query_candidates,
+    select_for_item,
+    is_in_history,
+    FetchControl
 )
+from schemas import (
+    WebcamCapture,
+    EmotionResponse,
+    MusicResponse,
+    SystemStatus,
+    SessionResponse,
+    BatchMusicRequest,
+    BatchMusicResponse,
+    SimilarRequest,
+    SimilarResponse
+)
+from serialization import (
+    FastJSONResponse,
+    to_video_records,
+    encode_music_response,
+    status_cache
+)
+from speculation import SPECULATION_ENABLED, speculation_manager
+from metrics import (
+    REQUEST_SECONDS,
+    BASE64_DECODE_SECONDS,
+    FALLBACKS,
+    GaugeCallback,
+    render_prometheus
+)
+from profiling import (
+    PROFILING_ENABLED,
+    bind_profile,
+    profile_requested,
+    start_request_profile,
+    finish_request_profile,
+    global_sampler
+)
+from memory_report import read_memory
+from playback import playback_registry, handle_control_message
+from admission import (
+    StageOverloaded,
+    StageDeadlineExceeded,
+    inference_limiter,
+    scraping_limiter,
+    get_admission_stats
+)
+from ratelimit import get_rate_limiter_stats
+from face_tensor import FaceTensorError, decode_face_tensor
+from tracing import TRACING_ENABLED, TRACEPARENT_HEADER, get_tracing_stats, span
+from deadline import DEADLINE_HEADER, INFERENCE_BUDGET_SHARE, Deadline, deadline_from_header
+from similarity import similarity_index
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BATCH_MAX_ITEMS = int(os.environ.get("MOOD_BATCH_MAX_ITEMS", 32))
+
 app = FastAPI(
     title="Mood Music API",
     description="Music recommendation based on facial emotion from webcam captures with auto-clean functionality",
@@ -42,52 +105,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Pydantic models
-class WebcamCapture(BaseModel):
-    image_data: str  # base64 encoded image
-    language: str = "english"
-    custom_preferences: Optional[str] = ""
-    max_results: int = 15
-    manual_mood: Optional[str] = None
-    clear_history: bool = False  # Manual clear option (auto-clean happens automatically)
-
-class EmotionResponse(BaseModel):
-    emotion: str
-    confidence: float
-    deepface_available: bool
-
-class VideoResult(BaseModel):
-    url: str
-    title: str
-
-class MusicResponse(BaseModel):
-    videos: List[VideoResult]
-    total_count: int
-    mood: str
-    language: str
-    search_stats: dict  # Includes auto-clean info
-
-class SystemStatus(BaseModel):
-    deepface_available: bool
-    deepface_error: Optional[str]
-    supported_emotions: List[str]
-    supported_languages: List[str]
-    search_history_stats: dict  # Includes auto-clean thresholds
-
-class SessionResponse(BaseModel):
-    message: str
-    search_stats: dict
+@app.exception_handler(StageOverloaded)
+async def stage_overloaded_handler(request: Request, exc: StageOverloaded):
+    """Shed overloaded requests quickly with 429 and a Retry-After hint"""
+    logger.warning(f"Shedding {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "stage": exc.stage},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(StageDeadlineExceeded)
+async def stage_deadline_handler(request: Request, exc: StageDeadlineExceeded):
+    """The request's own deadline ran out in a stage queue: 504, not a shed"""
+    logger.warning(f"Deadline reached for {request.url.path}: {exc}")
+    return JSONResponse(status_code=504, content={"detail": str(exc), "stage": exc.stage})
+
+@app.middleware("http")
+async def shed_before_body(request: Request, call_next):
+    """Reject /detect-mood before reading the base64 body when inference is saturated"""
+    if request.url.path in ("/detect-mood", "/detect-mood/face") and inference_limiter.is_saturated():
+        return await stage_overloaded_handler(request, inference_limiter.shed())
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    """Observe total request time per route template and status code"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.labels(path=path, status=str(status)).observe(time.perf_counter() - start)
+
+if PROFILING_ENABLED:
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """Run opted-in requests under the sampling profiler"""
+        if not profile_requested(request.headers, request.query_params):
+            return await call_next(request)
+        profile, token = start_request_profile(request.url.path)
+        try:
+            response = await call_next(request)
+        finally:
+            profile_path = finish_request_profile(profile, token)
+            logger.info(f"Profile for {request.url.path} written to {profile_path}")
+        response.headers["X-Profile-File"] = profile_path
+        response.headers["X-Profile-Samples"] = str(profile.samples)
+        return response
+
+if TRACING_ENABLED:
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        """Root span per request, continuing the caller's trace if it sent a traceparent"""
+        with span(f"{request.method} {request.url.path}", kind="SERVER",
+                  parent=request.headers.get(TRACEPARENT_HEADER)) as root:
+            root.set_attribute("http.method", request.method)
+            response = await call_next(request)
+            route = request.scope.get("route")
+            root.set_attribute("http.route", getattr(route, "path", "unmatched"))
+            root.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                root.set_error(f"HTTP {response.status_code}")
+            if root.trace_id:
+                response.headers[TRACEPARENT_HEADER] = root.traceparent()
+        return response
+
+if global_sampler is not None:
+    app.add_event_handler("startup", global_sampler.start)
+    app.add_event_handler("shutdown", global_sampler.stop)
+
+GaugeCallback(
+    "mood_search_history_entries",
+    "URLs currently held in the search history",
+    lambda: {(): get_search_history_stats()["total_entries"]},
+)
+
+def _build_static_status() -> dict:
+    """Status fields that are fixed once the models have been loaded"""
+    return {
+        "deepface_available": is_deepface_available(),
+        "deepface_error": get_deepface_error() if not is_deepface_available() else None,
+        "supported_emotions": get_supported_emotions(),
+        "supported_languages": get_supported_languages(),
+    }
 
 @app.get("/status", response_model=SystemStatus)
 async def get_system_status():
     """Check system status and supported features"""
-    return SystemStatus(
-        deepface_available=is_deepface_available(),
-        deepface_error=get_deepface_error() if not is_deepface_available() else None,
-        supported_emotions=get_supported_emotions(),
-        supported_languages=get_supported_languages(),
-        search_history_stats=get_search_history_stats()
-    )
+    return FastJSONResponse({
+        **status_cache.static_fields(_build_static_status),
+        "search_history_stats": get_search_history_stats()
+    })
 
 @app.post("/clear-session", response_model=SessionResponse)
 async def clear_session():
@@ -113,29 +226,98 @@ async def get_search_stats():
             "threshold": stats.get("auto_clean_threshold", 45),
             "target_size": stats.get("target_size", 25),
             "description": "History automatically cleaned when exceeding threshold"
-        }
+        },
+        "singleflight": get_singleflight_stats(),
+        "rate_limiter": get_rate_limiter_stats(),
+        "tracing": get_tracing_stats(),
+        "similarity": similarity_index.get_stats()
     }
 
+@app.get("/admission-stats", response_model=dict)
+async def get_admission_stats_endpoint():
+    """Get per-stage queue depth, concurrency and shed counts"""
+    return get_admission_stats()
+
+@app.get("/speculation-stats", response_model=dict)
+async def get_speculation_stats():
+    """Get speculative prefetch hit rate and wasted upstream requests"""
+    return speculation_manager.get_stats()
+
+def decode_image_data(image_data: str) -> bytes:
+    """Decode a base64 capture, with or without a data URL header"""
+    # Extract base64 image data (remove header if present)
+    if "," in image_data:
+        header, image_data = image_data.split(",", 1)
+    
+    # Decode base64 to bytes
+    with BASE64_DECODE_SECONDS.time():
+        return base64.b64decode(image_data)
+
+def decode_face_tensor_data(face_tensor: str):
+    """Decode a base64 face tensor into classifier-ready (N, 48, 48) faces"""
+    with BASE64_DECODE_SECONDS.time():
+        data = base64.b64decode(face_tensor)
+    return decode_face_tensor(data, EMOTION_INPUT_SIZE)
+
+def request_deadline(request: Request) -> Deadline:
+    """The request's end-to-end deadline, from its header or the server default"""
+    return deadline_from_header(request.headers.get(DEADLINE_HEADER))
+
 @app.post("/detect-mood", response_model=EmotionResponse)
-async def detect_mood_from_webcam(capture: WebcamCapture):
-    """Analyze emotion from webcam capture"""
+async def detect_mood_from_webcam(capture: WebcamCapture, request: Request):
+    """
+    Analyze emotion from webcam capture: a full frame in image_data, or a
+    face the client already cropped in face_tensor
+    """
+    return await detect_mood(capture, request_deadline(request))
+
+@app.post("/detect-mood/face", response_model=EmotionResponse)
+async def detect_mood_from_face_tensor(request: Request):
+    """
+    Classify a client-cropped face sent as a raw face tensor body
+    (Content-Type: application/x-face-tensor, see face_tensor.py), with no
+    base64, JSON, image decoding or face detection on the server
+    """
+    deadline = request_deadline(request)
+    body = await request.body()
+    try:
+        faces = decode_face_tensor(body, EMOTION_INPUT_SIZE)
+    except FaceTensorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async with inference_limiter.slot(timeout=deadline.remaining()):
+        emotion, confidence = await run_in_threadpool(bind_profile(analyze_face_tensor), faces)
+    
+    return EmotionResponse(
+        emotion=emotion,
+        confidence=confidence,
+        deepface_available=is_deepface_available()
+    )
+
+async def detect_mood(capture: WebcamCapture, deadline: Deadline) -> EmotionResponse:
+    """Shared by /detect-mood and /get-music; inference stops early at the deadline"""
     try:
         # Manual clear if requested (auto-clean happens automatically)
         if capture.clear_history:
             clear_search_history()
             logger.info("Search history manually cleared before mood detection")
         
-        # Extract base64 image data (remove header if present)
-        if "," in capture.image_data:
-            header, image_data = capture.image_data.split(",", 1)
-        else:
-            image_data = capture.image_data
-        
-        # Decode base64 to bytes
-        image_bytes = base64.b64decode(image_data)
-        
-        # Analyze emotion
-        emotion, confidence = analyze_emotion_deepface(image_bytes)
+        # Wait for an inference slot before decoding so queued requests
+        # only hold the compact base64 string
+        async with inference_limiter.slot(timeout=deadline.remaining()):
+            if capture.face_tensor:
+                # Already detected and cropped client-side, go straight to the classifier
+                faces = decode_face_tensor_data(capture.face_tensor)
+                emotion, confidence = await run_in_threadpool(
+                    bind_profile(analyze_face_tensor), faces
+                )
+            else:
+                image_bytes = decode_image_data(capture.image_data)
+                
+                # Analyze emotion off the event loop
+                emotion, confidence = await run_in_threadpool(
+                    bind_profile(analyze_emotion_deepface), image_bytes, deadline
+                )
         
         return EmotionResponse(
             emotion=emotion,
@@ -143,19 +325,30 @@ async def detect_mood_from_webcam(capture: WebcamCapture):
             deepface_available=is_deepface_available()
         )
         
+    except (StageOverloaded, StageDeadlineExceeded):
+        raise
+    except FaceTensorError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid face tensor: {str(e)}")
     except Exception as e:
         logger.error(f"Error processing webcam image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 @app.post("/get-music", response_model=MusicResponse)
-async def get_music_recommendations(capture: WebcamCapture):
-    """Get music recommendations based on webcam capture mood with auto-clean"""
+async def get_music_recommendations(capture: WebcamCapture, request: Request):
+    """
+    Get music recommendations based on webcam capture mood with auto-clean.
+    Every stage shares one deadline and the best results found before it
+    passes are returned.
+    """
+    deadline = request_deadline(request)
     try:
         # Manual clear if requested (auto-clean happens automatically at threshold)
         if capture.clear_history:
             clear_search_history()
             logger.info("Search history manually cleared before music recommendation")
         
+        video_results = None
+        
         # Use manual mood if provided, otherwise detect from image
         if capture.manual_mood:
             mood = capture.manual_mood.lower()
@@ -165,9 +358,36 @@ async def get_music_recommendations(capture: WebcamCapture):
                     detail=f"Invalid manual mood. Must be one of: {get_supported_emotions()}"
                 )
         else:
+            # Optionally start fetching for the most likely moods while
+            # inference is still running
+            speculative = []
+            if SPECULATION_ENABLED and capture.language.lower() in SUPPORTED_LANGS:
+                speculative = speculation_manager.start(
+                    capture.language.lower(),
+                    capture.custom_preferences or "",
+                    capture.max_results,
+                    session_id=capture.session_id,
+                    deadline=deadline
+                )
+            
             # First detect mood
-            mood_response = await detect_mood_from_webcam(capture)
+            try:
+                with span("inference") as inference_span:
+                    mood_response = await detect_mood(capture, deadline.share(INFERENCE_BUDGET_SHARE))
+                    inference_span.set_attribute("mood", mood_response.emotion)
+            except BaseException:
+                speculation_manager.cancel_all(speculative)
+                raise
             mood = mood_response.emotion
+            
+            # Commit the prefetch matching the detected mood, cancel the rest
+            with span("speculation.resolve", speculative=len(speculative)) as resolve_span:
+                video_results = await speculation_manager.resolve(
+                    speculative, mood, session_id=capture.session_id
+                )
+                resolve_span.set_attribute("hit", bool(video_results))
+            if video_results:
+                commit_to_history(video_results)
         
         # Validate language
         if capture.language.lower() not in SUPPORTED_LANGS:
@@ -187,52 +407,250 @@ async def get_music_recommendations(capture: WebcamCapture):
             capture.custom_preferences or ""
         )
         
-        # Fetch recommendations (auto-clean happens automatically if threshold exceeded)
-        video_results = fetch_recommendations(search_queries, total=capture.max_results)
+        # Manual mood requests skipped inference entirely and get the
+        # priority lane of the scraping queue
+        if not video_results:
+            # The span includes the wait for a scraping slot
+            with span("scraping", queries=len(search_queries)):
+                async with scraping_limiter.slot(priority=bool(capture.manual_mood),
+                                                 timeout=deadline.remaining()):
+                    # Fetch recommendations (auto-clean happens automatically if threshold exceeded)
+                    video_results = await run_in_threadpool(
+                        bind_profile(fetch_recommendations), search_queries, total=capture.max_results,
+                        control=FetchControl(deadline)
+                    )
+                    
+                    if not video_results and not deadline.expired():
+                        # If no results, try manual clear and search again
+                        logger.warning("No results found, manually clearing history and retrying")
+                        FALLBACKS.labels(kind="clear_and_retry").inc()
+                        clear_search_history()
+                        with span("clear_and_retry"):
+                            video_results = await run_in_threadpool(
+                                bind_profile(fetch_recommendations), search_queries, total=capture.max_results,
+                                control=FetchControl(deadline)
+                            )
         
         if not video_results:
-            # If no results, try manual clear and search again
-            logger.warning("No results found, manually clearing history and retrying")
-            clear_search_history()
-            video_results = fetch_recommendations(search_queries, total=capture.max_results)
-            
-            if not video_results:
-                raise HTTPException(status_code=404, detail="No music found for the detected mood")
+            if deadline.expired():
+                raise HTTPException(
+                    status_code=504,
+                    detail=f"No music found within the {deadline.budget:.0f}s request deadline"
+                )
+            raise HTTPException(status_code=404, detail="No music found for the detected mood")
         
         # Get final search stats (may show auto-clean happened)
         final_stats = get_search_history_stats()
         
-        return MusicResponse(
-            videos=[VideoResult(url=v["url"], title=v["title"]) for v in video_results],
-            total_count=len(video_results),
+        # Scraper output is already well-formed, so encode it directly instead
+        # of building and re-validating a MusicResponse per request
+        return FastJSONResponse(encode_music_response(
+            to_video_records(video_results),
             mood=mood,
             language=capture.language,
             search_stats={
                 **final_stats,
                 "auto_clean_active": True,
-                "notes": "History auto-manages at 45 entries, keeps 25 most recent"
+                "notes": "History auto-manages at 45 entries, keeps 25 most recent",
+                # True when the deadline cut the search short and results may be partial
+                "deadline_exceeded": deadline.expired()
             }
-        )
+        ))
         
-    except HTTPException:
+    except (HTTPException, StageOverloaded, StageDeadlineExceeded):
         raise
     except Exception as e:
         logger.error(f"Error getting music recommendations: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting recommendations: {str(e)}")
 
+@app.post("/get-music/batch", response_model=BatchMusicResponse)
+async def get_music_batch(batch: BatchMusicRequest, request: Request):
+    """
+    Get music for several captures at once: one batched inference pass for
+    all images and one upstream search per distinct query across items
+    """
+    deadline = request_deadline(request)
+    captures = batch.captures
+    if not captures:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one capture")
+    if len(captures) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large. At most {BATCH_MAX_ITEMS} captures per request"
+        )
+    
+    try:
+        if any(capture.clear_history for capture in captures):
+            clear_search_history()
+            logger.info("Search history manually cleared before batch recommendation")
+        
+        items = [
+            {"index": i, "mood": None, "confidence": None, "language": capture.language,
+             "videos": [], "total_count": 0, "error": None}
+            for i, capture in enumerate(captures)
+        ]
+        
+        # Validate every item and split manual moods from images to analyze
+        to_infer = []
+        for item, capture in zip(items, captures):
+            if capture.language.lower() not in SUPPORTED_LANGS:
+                item["error"] = f"Invalid language. Must be one of: {get_supported_languages()}"
+            elif capture.manual_mood:
+                mood = capture.manual_mood.lower()
+                if validate_emotion(mood):
+                    item["mood"] = mood
+                else:
+                    item["error"] = f"Invalid manual mood. Must be one of: {get_supported_emotions()}"
+            else:
+                to_infer.append(item["index"])
+        
+        # One inference slot and one classifier pass for the whole batch
+        if to_infer:
+            async with inference_limiter.slot(timeout=deadline.remaining()):
+                images = []
+                for index in list(to_infer):
+                    try:
+                        if captures[index].face_tensor:
+                            images.append(decode_face_tensor_data(captures[index].face_tensor)[0])
+                        else:
+                            images.append(decode_image_data(captures[index].image_data))
+                    except Exception as e:
+                        items[index]["error"] = f"Error processing image: {str(e)}"
+                        to_infer.remove(index)
+                emotions = await run_in_threadpool(bind_profile(analyze_emotion_batch), images, deadline)
+            for index, (emotion, confidence) in zip(to_infer, emotions):
+                items[index]["mood"] = emotion
+                items[index]["confidence"] = confidence
+                speculation_manager.prior.record(emotion, captures[index].session_id)
+        
+        # Merge identical queries across items so each is fetched once
+        item_queries = {}
+        query_needs = {}
+        for item, capture in zip(items, captures):
+            if item["error"] or not item["mood"]:
+                continue
+            queries = create_search_queries(
+                item["mood"],
+                capture.language.lower(),
+                capture.custom_preferences or ""
+            )
+            item_queries[item["index"]] = queries
+            # Ask for headroom so later items can still skip history duplicates
+            per_query = max(3, -(-capture.max_results // len(queries))) * 2
+            for query in queries:
+                query_needs[query] = min(50, query_needs.get(query, 0) + per_query)
+        
+        candidates = {}
+        if query_needs:
+            all_manual = all(captures[i].manual_mood for i in item_queries)
+            async with scraping_limiter.slot(priority=all_manual, timeout=deadline.remaining()):
+                candidates = await run_in_threadpool(
+                    bind_profile(fetch_query_candidates), query_needs, deadline
+                )
+        
+        # Fan the shared candidates back out with per-item dedup
+        for index, queries in item_queries.items():
+            videos = select_for_item(queries, candidates, captures[index].max_results)
+            if videos:
+                items[index]["videos"] = to_video_records(videos)
+                items[index]["total_count"] = len(videos)
+            else:
+                items[index]["error"] = "No music found for the detected mood"
+        
+        return FastJSONResponse({
+            "results": items,
+            "distinct_queries": len(query_needs),
+            "total_queries": sum(len(queries) for queries in item_queries.values()),
+            "search_stats": get_search_history_stats()
+        })
+        
+    except (HTTPException, StageOverloaded, StageDeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.error(f"Error getting batch recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting batch recommendations: {str(e)}")
+
+@app.post("/similar", response_model=SimilarResponse)
+async def get_similar(similar: SimilarRequest):
+    """
+    More like these tracks, answered from the index of everything already
+    scraped: no upstream search, so it works even while YouTube throttles us
+    """
+    if not similar.seeds and not similar.seed_titles:
+        raise HTTPException(status_code=400, detail="Provide at least one seed or seed title")
+    max_results = max(1, min(50, similar.max_results))
+    exclude = (lambda video: is_in_history(video["url"])) if similar.exclude_history else None
+    
+    try:
+        with span("similarity.query", seeds=len(similar.seeds), seed_titles=len(similar.seed_titles)):
+            results, seeds_found = await run_in_threadpool(
+                similarity_index.more_like_this,
+                similar.seeds, similar.seed_titles, max_results, exclude
+            )
+    except Exception as e:
+        logger.error(f"Error finding similar tracks: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error finding similar tracks: {str(e)}")
+    
+    # Indexed tracks always have a URL, so records line up with results
+    records = to_video_records(video for video, _ in results)
+    return FastJSONResponse({
+        "videos": [{**asdict(record), "score": score} for record, (_, score) in zip(records, results)],
+        "total_count": len(records),
+        "seeds_found": seeds_found,
+        "index_size": len(similarity_index)
+    })
+
+@app.websocket("/ws/control")
+async def gesture_control(websocket: WebSocket, session_id: str = "default"):
+    """Persistent channel for gesture control events; each message is acknowledged with the new state"""
+    await websocket.accept()
+    logger.info(f"Gesture control connected for session {session_id}")
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                reply = handle_control_message(session_id, message)
+            except Exception as e:
+                # A bad message must not tear down the client's control channel
+                logger.error(f"Error handling control message for session {session_id}: {str(e)}")
+                reply = json.dumps({"e": "internal error"})
+            await websocket.send_text(reply)
+    except WebSocketDisconnect:
+        logger.info(f"Gesture control disconnected for session {session_id}")
+
+@app.get("/playback/{session_id}", response_model=dict)
+async def get_playback_state(session_id: str):
+    """Current playback state driven by gesture control events"""
+    return playback_registry.get_state(session_id)
+
+@app.get("/playback-stats", response_model=dict)
+async def get_playback_stats():
+    """Sessions with playback state and total control events"""
+    return playback_registry.get_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose stage latencies and event counters in Prometheus text format"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/worker-memory", response_model=dict)
+async def get_worker_memory():
+    """RSS, PSS and unique (USS) memory of the worker serving this request"""
+    return read_memory()
+
 @app.get("/health")
 async def health_check():
     """Simple health check endpoint"""
     stats = get_search_history_stats()
-    return {
+    return FastJSONResponse({
         "status": "healthy",
-        "timestamp": "2025-06-29",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "search_history": {
             "entries": stats.get("total_entries", 0),
             "auto_clean_enabled": True,
             "threshold": stats.get("auto_clean_threshold", 45)
         }
-    }
+    })
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
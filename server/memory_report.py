@@ -0,0 +1,84 @@
+"""
+Per-process memory accounting for the preload-and-fork serving mode.
+
+RSS counts pages shared copy-on-write with the master, so it overstates
+what each worker costs. USS (private clean + private dirty pages) is the
+memory a worker would free if it exited, and PSS splits shared pages
+evenly between the processes mapping them. Linux only (/proc/<pid>).
+
+Usage:
+    python memory_report.py <master_pid>
+"""
+import os
+import sys
+from typing import Dict, List, Optional
+
+_SMAPS_FIELDS = {
+    "Rss": "rss_kb",
+    "Pss": "pss_kb",
+    "Shared_Clean": "shared_clean_kb",
+    "Shared_Dirty": "shared_dirty_kb",
+    "Private_Clean": "private_clean_kb",
+    "Private_Dirty": "private_dirty_kb",
+}
+
+
+def read_memory(pid: Optional[int] = None) -> Dict[str, Optional[int]]:
+    """Return RSS, PSS, shared and unique (USS) memory in kB for a process"""
+    pid = pid or os.getpid()
+    stats: Dict[str, Optional[int]] = {name: None for name in _SMAPS_FIELDS.values()}
+    stats["pid"] = pid
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    stats[_SMAPS_FIELDS[key]] = int(rest.split()[0])
+    except (OSError, ValueError):
+        return stats
+
+    if stats["private_clean_kb"] is not None and stats["private_dirty_kb"] is not None:
+        stats["uss_kb"] = stats["private_clean_kb"] + stats["private_dirty_kb"]
+    else:
+        stats["uss_kb"] = None
+    return stats
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of a process, e.g. the workers of a gunicorn master"""
+    children = []
+    task_dir = f"/proc/{pid}/task"
+    try:
+        for tid in os.listdir(task_dir):
+            with open(f"{task_dir}/{tid}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return sorted(set(children))
+
+
+def format_report(master_pid: int) -> str:
+    """Table of master and worker memory, in MB"""
+    def mb(value):
+        return f"{value / 1024:.1f}" if value is not None else "n/a"
+
+    rows = [("master", read_memory(master_pid))]
+    rows += [("worker", read_memory(pid)) for pid in child_pids(master_pid)]
+
+    lines = [f"{'role':<8} {'pid':>8} {'rss MB':>9} {'pss MB':>9} {'uss MB':>9} {'shared MB':>10}"]
+    for role, stats in rows:
+        shared = None
+        if stats["shared_clean_kb"] is not None and stats["shared_dirty_kb"] is not None:
+            shared = stats["shared_clean_kb"] + stats["shared_dirty_kb"]
+        lines.append(
+            f"{role:<8} {stats['pid']:>8} {mb(stats['rss_kb']):>9} {mb(stats['pss_kb']):>9} "
+            f"{mb(stats['uss_kb']):>9} {mb(shared):>10}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    print(format_report(int(sys.argv[1])))
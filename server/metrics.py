@@ -0,0 +1,237 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond parsing up to slow scrapes
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str, **kwargs: str):
+        """Return the child metric for a set of label values"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """Bucketed latency distribution, rendered cumulatively"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        """Context manager observing the elapsed wall time of the block"""
+        return self._default().time()
+
+    def _render_child(self, key, child):
+        with child._lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        plain = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{plain} {_format_value(total)}")
+        lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class GaugeCallback(_Metric):
+    """
+    Gauge whose samples are read from a callback at scrape time, so values
+    already tracked elsewhere (queue depths, history size) cost nothing
+    between scrapes. The callback returns {label values tuple: value}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str,
+                 callback: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = self.callback()
+        except Exception:
+            return lines
+        for key, value in samples.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+def render_prometheus() -> str:
+    """Render every registered metric in Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Pipeline stage latencies
+REQUEST_SECONDS = Histogram(
+    "mood_http_request_duration_seconds", "Total HTTP request time", ["path", "status"]
+)
+BASE64_DECODE_SECONDS = Histogram(
+    "mood_base64_decode_seconds", "Time to decode the base64 webcam capture"
+)
+IMAGE_DECODE_SECONDS = Histogram(
+    "mood_image_decode_seconds", "Time to decode the image bytes into an array"
+)
+FACE_DETECTION_SECONDS = Histogram(
+    "mood_face_detection_seconds", "Time spent detecting and aligning faces"
+)
+EMOTION_INFERENCE_SECONDS = Histogram(
+    "mood_emotion_inference_seconds", "Time spent running the emotion classifier"
+)
+YOUTUBE_REQUEST_SECONDS = Histogram(
+    "mood_youtube_request_seconds", "Time per upstream YouTube HTTP request", ["outcome"]
+)
+YOUTUBE_PARSE_SECONDS = Histogram(
+    "mood_youtube_parse_seconds", "Time to parse a YouTube results page", ["method"]
+)
+DEDUP_SECONDS = Histogram(
+    "mood_dedup_seconds", "Time to deduplicate and trim fetched recommendations"
+)
+
+# Event counts
+CACHE_HITS = Counter("mood_cache_hits_total", "Cache hits by cache", ["cache"])
+CACHE_MISSES = Counter("mood_cache_misses_total", "Cache misses by cache", ["cache"])
+FETCH_RETRIES = Counter("mood_fetch_retries_total", "Search attempts retried after an empty or failed result")
+FALLBACKS = Counter("mood_fallbacks_total", "Fallback passes taken", ["kind"])
+HISTORY_AUTO_CLEANS = Counter("mood_history_auto_cleans_total", "Search history auto-clean runs")
+YOUTUBE_RESPONSE_BYTES = Counter(
+    "mood_youtube_response_bytes_total", "Bytes received from YouTube", ["kind"]
+)
+CONTINUATION_PAGES = Counter(
+    "mood_youtube_continuation_pages_total", "Follow-up result pages fetched by continuation token", ["outcome"]
+)
@@ -1,14 +1,32 @@
 import requests
 from bs4 import BeautifulSoup
+import os
 import random
 import json
 import time
 import re
-from typing import List, Dict, Optional, Set
+from typing import Any, List, Dict, Optional, Set
 from urllib.parse import quote_plus
 import logging
+import threading
 from datetime import datetime, timedelta
 
+from metrics import (
+    YOUTUBE_REQUEST_SECONDS,
+    YOUTUBE_PARSE_SECONDS,
+    DEDUP_SECONDS,
+    FETCH_RETRIES,
+    FALLBACKS,
+    HISTORY_AUTO_CLEANS,
+    YOUTUBE_RESPONSE_BYTES,
+    CONTINUATION_PAGES
+)
+from singleflight import SingleFlight
+from ratelimit import youtube_limiter
+from deadline import Deadline, stage_timeout
+from tracing import current_span, span, traced
+from similarity import similarity_index
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,30 +38,35 @@ class SearchHistoryManager:
         self.max_age = timedelta(minutes=max_age_minutes)
         self.auto_clean_threshold = auto_clean_threshold  # Auto-clean when entries exceed this
         self.target_size = target_size  # Target size after cleaning
+        # Requests are served from a thread pool, so guard all access
+        self._lock = threading.RLock()
     
     def add_url(self, url: str):
         """Add URL to history with timestamp and auto-clean if needed"""
-        # Always cleanup old entries first
-        self.cleanup_old_entries()
-        
-        # Add the new URL
-        self.history[url] = datetime.now()
-        
-        # Auto-clean if we exceed the threshold
-        if len(self.history) > self.auto_clean_threshold:
-            self._auto_clean()
+        with self._lock:
+            # Always cleanup old entries first
+            self.cleanup_old_entries()
+            
+            # Add the new URL
+            self.history[url] = datetime.now()
+            
+            # Auto-clean if we exceed the threshold
+            if len(self.history) > self.auto_clean_threshold:
+                self._auto_clean()
     
     def is_duplicate(self, url: str) -> bool:
         """Check if URL was recently searched"""
-        self.cleanup_old_entries()
-        return url in self.history
+        with self._lock:
+            self.cleanup_old_entries()
+            return url in self.history
     
     def cleanup_old_entries(self):
         """Remove entries older than max_age"""
-        cutoff_time = datetime.now() - self.max_age
-        expired_urls = [url for url, timestamp in self.history.items() if timestamp < cutoff_time]
-        for url in expired_urls:
-            del self.history[url]
+        with self._lock:
+            cutoff_time = datetime.now() - self.max_age
+            expired_urls = [url for url, timestamp in self.history.items() if timestamp < cutoff_time]
+            for url in expired_urls:
+                del self.history[url]
     
     def _auto_clean(self):
         """Automatically clean entries when threshold is exceeded"""
@@ -61,20 +84,23 @@ class SearchHistoryManager:
         for url, timestamp in entries_to_keep:
             self.history[url] = timestamp
         
+        HISTORY_AUTO_CLEANS.inc()
         logger.info(f"Auto-cleaned search history: kept {len(self.history)} most recent entries")
     
     def clear_session(self):
         """Clear all history for new session"""
-        self.history.clear()
+        with self._lock:
+            self.history.clear()
     
     def get_stats(self) -> Dict[str, int]:
         """Get history statistics"""
-        self.cleanup_old_entries()
-        return {
-            "total_entries": len(self.history),
-            "auto_clean_threshold": self.auto_clean_threshold,
-            "target_size": self.target_size
-        }
+        with self._lock:
+            self.cleanup_old_entries()
+            return {
+                "total_entries": len(self.history),
+                "auto_clean_threshold": self.auto_clean_threshold,
+                "target_size": self.target_size
+            }
 
 # Global search history manager with auto-clean at 45 entries, target 25
 search_history_manager = SearchHistoryManager(
@@ -82,7 +108,27 @@ search_history_manager = SearchHistoryManager(
     auto_clean_threshold=45, 
     target_size=25
 )
-last_search_time = 0
+
+class FetchControl:
+    """
+    Lets another thread cancel an in-progress fetch_recommendations call and
+    reports how many upstream searches it issued. An optional deadline
+    bounds the whole fetch; it returns what it has when time runs out.
+    """
+    def __init__(self, deadline: Optional[Deadline] = None):
+        self._cancelled = threading.Event()
+        self.deadline = deadline
+        self.requests_made = 0
+    
+    def cancel(self):
+        """Stop the fetch before its next upstream request"""
+        self._cancelled.set()
+    
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def out_of_time(self) -> bool:
+        return self.deadline is not None and self.deadline.expired()
 
 # mood mapping with keywords for diverse search results
 MOOD_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
@@ -125,13 +171,63 @@ MOOD_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
 
 SUPPORTED_LANGS = {"english", "hindi", "bengali"}
 
-def safe_request(url: str, headers: dict, timeout: int = 10) -> Optional[requests.Response]:
-    """Make a safe HTTP request with error handling"""
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds from a Retry-After header, if it holds a number"""
     try:
-        response = requests.get(url, headers=headers, timeout=timeout)
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+def is_throttled(response: requests.Response) -> bool:
+    """A 429, or YouTube's 'unusual traffic' CAPTCHA interstitial"""
+    if response.status_code == 429 or "/sorry/" in response.url:
+        return True
+    # Search the raw bytes: the marker is ASCII, and callers decode the body once themselves
+    return response.status_code == 200 and b'id="captcha-form"' in response.content
+
+@traced("youtube.request")
+def safe_request(url: str, headers: dict, timeout: float = 10,
+                 json_body: Optional[dict] = None,
+                 deadline: Optional[Deadline] = None) -> Optional[requests.Response]:
+    """
+    Make a safe HTTP request with error handling; POSTs json_body if given.
+    Waits for the shared YouTube rate limiter first and reports throttling
+    responses back to it. With a deadline, neither the wait nor the request
+    may outlast it.
+    """
+    # Don't spend a rate limiter token on a request that can't go out
+    if stage_timeout(deadline, timeout) <= 0:
+        current_span().set_attribute("outcome", "deadline")
+        return None
+    with span("rate_limit_wait"):
+        acquired = youtube_limiter.acquire(timeout=deadline.remaining() if deadline else None)
+    if not acquired:
+        logger.warning("Deadline reached waiting for the rate limiter, skipping request")
+        current_span().set_attribute("outcome", "deadline")
+        return None
+    timeout = stage_timeout(deadline, timeout)
+    if timeout <= 0:
+        current_span().set_attribute("outcome", "deadline")
+        return None
+    start = time.perf_counter()
+    try:
+        if json_body is not None:
+            response = requests.post(url, headers=headers, json=json_body, timeout=timeout)
+        else:
+            response = requests.get(url, headers=headers, timeout=timeout)
+        current_span().set_attribute("http.status_code", response.status_code)
+        if is_throttled(response):
+            current_span().set_attribute("outcome", "throttled")
+            YOUTUBE_REQUEST_SECONDS.labels(outcome="throttled").observe(time.perf_counter() - start)
+            youtube_limiter.on_throttle(_retry_after(response))
+            return None
         response.raise_for_status()
+        YOUTUBE_REQUEST_SECONDS.labels(outcome="ok").observe(time.perf_counter() - start)
+        youtube_limiter.on_success()
         return response
     except requests.RequestException as e:
+        YOUTUBE_REQUEST_SECONDS.labels(outcome="error").observe(time.perf_counter() - start)
+        current_span().set_error(str(e))
         logger.error(f"Network error: {str(e)}")
         return None
 
@@ -149,35 +245,155 @@ def extract_video_id(url: str) -> Optional[str]:
             return match.group(1)
     return None
 
-def get_youtube_results(query: str, max_results: int = 20, allow_duplicates: bool = False) -> List[Dict[str, str]]:
-    """Scrape YouTube search page for video links with improved error handling"""
-    global last_search_time
-    
-    # Rate limiting
-    current_time = time.time()
-    if current_time - last_search_time < 1:
-        time.sleep(1)
-    last_search_time = current_time
-    
-    search_url = f"https://www.youtube.com/results?search_query={quote_plus(query)}"
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,/;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate",
-        "Connection": "keep-alive",
+def _renderer_text(obj: Optional[dict]) -> Optional[str]:
+    """Text of a YouTube text renderer, either simpleText or joined runs"""
+    if not obj:
+        return None
+    if "simpleText" in obj:
+        return obj["simpleText"]
+    runs = obj.get("runs")
+    if runs:
+        return "".join(run.get("text", "") for run in runs)
+    return None
+
+def _parse_view_count(text: Optional[str]) -> Optional[int]:
+    """'1,234,567 views' -> 1234567; 'No views' -> 0"""
+    if not text:
+        return None
+    digits = re.sub(r"[^0-9]", "", text)
+    if digits:
+        return int(digits)
+    return 0 if text.lower().startswith("no ") else None
+
+def _parse_duration(text: Optional[str]) -> Optional[int]:
+    """'1:02:03' or '3:45' -> seconds"""
+    if not text:
+        return None
+    seconds = 0
+    try:
+        for part in text.split(":"):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return None
+    return seconds
+
+def video_metadata(video: Dict[str, Any]) -> Dict[str, Any]:
+    """Duration, views, channel, thumbnail and publish date from a videoRenderer"""
+    duration = _renderer_text(video.get("lengthText"))
+    thumbnails = video.get("thumbnail", {}).get("thumbnails") or []
+    return {
+        "duration": duration,
+        "duration_seconds": _parse_duration(duration),
+        "view_count": _parse_view_count(_renderer_text(video.get("viewCountText"))),
+        "channel": _renderer_text(video.get("ownerText") or video.get("longBylineText")),
+        # Thumbnails are listed smallest first
+        "thumbnail": thumbnails[-1].get("url") if thumbnails else None,
+        "published": _renderer_text(video.get("publishedTimeText")),
     }
+
+# Overridable so load tests can point the scraper at a local stand-in server
+YOUTUBE_BASE_URL = os.environ.get("MOOD_YOUTUBE_BASE_URL", "https://www.youtube.com").rstrip("/")
+
+SEARCH_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,/;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+# Follow-up pages fetched per query when the first page doesn't yield
+# enough fresh results. A continuation response is a few tens of kB of JSON
+# instead of a ~1 MB HTML page.
+MAX_CONTINUATION_PAGES = int(os.environ.get("MOOD_MAX_CONTINUATION_PAGES", "2"))
+
+# Used when the page doesn't embed its own client version
+DEFAULT_CLIENT_VERSION = "2.20240101.00.00"
+
+# Concurrent identical searches share one upstream fetch and parse
+# A leader with time for one full page fetch (safe_request's 15s timeout) is worth joining
+search_flight = SingleFlight("youtube_search", join_budget=15.0)
+
+class SearchPage:
+    """
+    One page of search results, plus the continuation token and client
+    config needed to request the page after it
+    """
+    __slots__ = ("videos", "continuation", "api_key", "client_version")
     
-    response = safe_request(search_url, headers, timeout=15)
-    if not response:
-        return []
+    def __init__(self, videos: List[Dict[str, Any]], continuation: Optional[str] = None,
+                 api_key: Optional[str] = None, client_version: Optional[str] = None):
+        self.videos = videos
+        self.continuation = continuation
+        self.api_key = api_key
+        self.client_version = client_version
+
+def normalize_query(query: str) -> str:
+    """Normalize a search string so equivalent queries coalesce"""
+    return " ".join(query.lower().split())
+
+def _append_videos(contents: List[dict], results: List[Dict[str, Any]], seen_ids: Set[str]):
+    """Append the videoRenderer entries of a list of result sections"""
+    for section in contents:
+        items = section.get("itemSectionRenderer", {}).get("contents", [])
+        for item in items:
+            if "videoRenderer" not in item:
+                continue
+            video = item["videoRenderer"]
+            video_id = video.get("videoId")
+            if not video_id or video_id in seen_ids:
+                continue
+            
+            title_obj = video.get("title", {})
+            if "runs" in title_obj:
+                title = title_obj["runs"][0].get("text", "Untitled")
+            elif "simpleText" in title_obj:
+                title = title_obj["simpleText"]
+            else:
+                title = "Untitled"
+            
+            seen_ids.add(video_id)
+            results.append({
+                "url": f"https://www.youtube.com/watch?v={video_id}",
+                "title": title,
+                **video_metadata(video)
+            })
+
+def _continuation_token(contents: List[dict]) -> Optional[str]:
+    """Token of the trailing continuationItemRenderer in a list of sections, if any"""
+    for section in reversed(contents):
+        renderer = section.get("continuationItemRenderer")
+        if renderer:
+            command = renderer.get("continuationEndpoint", {}).get("continuationCommand", {})
+            return command.get("token")
+    return None
+
+def _client_config(html: str) -> Dict[str, Optional[str]]:
+    """INNERTUBE key and client version from the page's ytcfg"""
+    key = re.search(r'"INNERTUBE_API_KEY"\s*:\s*"([^"]+)"', html)
+    version = re.search(r'"INNERTUBE_CLIENT_VERSION"\s*:\s*"([^"]+)"', html)
+    return {
+        "api_key": key.group(1) if key else None,
+        "client_version": version.group(1) if version else None,
+    }
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    results: List[Dict[str, str]] = []
+@traced("youtube.parse")
+def parse_search_page(html: str) -> SearchPage:
+    """
+    Extract every video on a YouTube results page, in page order, with the
+    metadata from video_metadata() (None where the page doesn't have it),
+    and the token for the next page
+    """
+    parse_start = time.perf_counter()
+    parse_method = "json"
+    soup = BeautifulSoup(html, "html.parser")
+    results: List[Dict[str, Any]] = []
+    seen_ids: Set[str] = set()
+    continuation = None
     
     try:
         # Try to extract from JSON data first
@@ -206,37 +422,8 @@ def get_youtube_results(query: str, max_results: int = 20, allow_duplicates: boo
                     section_list = primary.get("sectionListRenderer", {})
                     sections = section_list.get("contents", [])
                     
-                    for section in sections:
-                        item_section = section.get("itemSectionRenderer", {})
-                        items = item_section.get("contents", [])
-                        
-                        for item in items:
-                            if "videoRenderer" in item:
-                                video = item["videoRenderer"]
-                                video_id = video.get("videoId")
-                                if not video_id:
-                                    continue
-                                    
-                                title_obj = video.get("title", {})
-                                if "runs" in title_obj:
-                                    title = title_obj["runs"][0].get("text", "Untitled")
-                                elif "simpleText" in title_obj:
-                                    title = title_obj["simpleText"]
-                                else:
-                                    title = "Untitled"
-                                
-                                url = f"https://www.youtube.com/watch?v={video_id}"
-                                
-                                # Check for duplicates only if not allowing them
-                                if allow_duplicates or not search_history_manager.is_duplicate(url):
-                                    results.append({"url": url, "title": title})
-                                    search_history_manager.add_url(url)
-                                    
-                                if len(results) >= max_results:
-                                    break
-                        
-                        if len(results) >= max_results:
-                            break
+                    _append_videos(sections, results, seen_ids)
+                    continuation = _continuation_token(sections)
                     break
                     
                 except (json.JSONDecodeError, KeyError, IndexError) as e:
@@ -245,26 +432,151 @@ def get_youtube_results(query: str, max_results: int = 20, allow_duplicates: boo
         
         # Fallback to HTML parsing if JSON method fails
         if not results:
+            parse_method = "html"
             links = soup.find_all("a", href=True)
             for link in links:
                 href = link.get("href", "")
                 if "/watch?v=" in href:
                     video_id = extract_video_id(href)
-                    if video_id:
+                    if video_id and video_id not in seen_ids:
                         title = link.get_text(strip=True) or "Untitled"
-                        url = f"https://www.youtube.com/watch?v={video_id}"
-                        
-                        # Check for duplicates only if not allowing them
-                        if (allow_duplicates or not search_history_manager.is_duplicate(url)) and len(title) > 3:
-                            results.append({"url": url, "title": title})
-                            search_history_manager.add_url(url)
-                            
-                        if len(results) >= max_results:
-                            break
+                        if len(title) > 3:
+                            seen_ids.add(video_id)
+                            results.append({
+                                "url": f"https://www.youtube.com/watch?v={video_id}",
+                                "title": title,
+                                # Bare links carry no renderer data
+                                **video_metadata({})
+                            })
                             
     except Exception as e:
         logger.error(f"Error parsing YouTube results: {str(e)}")
     
+    YOUTUBE_PARSE_SECONDS.labels(method=parse_method).observe(time.perf_counter() - parse_start)
+    current_span().set_attribute("method", parse_method)
+    current_span().set_attribute("videos", len(results))
+    if not continuation:
+        return SearchPage(results)
+    return SearchPage(results, continuation, **_client_config(html))
+
+def parse_continuation_response(data: dict) -> SearchPage:
+    """Extract the videos and next token from a youtubei/v1/search continuation response"""
+    parse_start = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    continuation = None
+    for command in data.get("onResponseReceivedCommands", []):
+        items = command.get("appendContinuationItemsAction", {}).get("continuationItems", [])
+        _append_videos(items, results, set())
+        continuation = _continuation_token(items) or continuation
+    YOUTUBE_PARSE_SECONDS.labels(method="continuation").observe(time.perf_counter() - parse_start)
+    return SearchPage(results, continuation)
+
+@traced("youtube.search_page")
+def fetch_search_page(query: str, deadline: Optional[Deadline] = None) -> SearchPage:
+    """Fetch and parse one results page, without touching the search history"""
+    current_span().set_attribute("query", query)
+    search_url = f"{YOUTUBE_BASE_URL}/results?search_query={quote_plus(query)}"
+    response = safe_request(search_url, SEARCH_HEADERS, timeout=15, deadline=deadline)
+    if not response:
+        return SearchPage([])
+    YOUTUBE_RESPONSE_BYTES.labels(kind="search").inc(len(response.content))
+    page = parse_search_page(response.text)
+    similarity_index.add(page.videos)
+    return page
+
+@traced("youtube.continuation")
+def fetch_continuation_page(page: SearchPage, deadline: Optional[Deadline] = None) -> SearchPage:
+    """Fetch the page after `page` through the same JSON endpoint YouTube's own infinite scroll uses"""
+    url = f"{YOUTUBE_BASE_URL}/youtubei/v1/search?prettyPrint=false"
+    if page.api_key:
+        url += f"&key={page.api_key}"
+    body = {
+        "context": {"client": {
+            "clientName": "WEB",
+            "clientVersion": page.client_version or DEFAULT_CLIENT_VERSION,
+            "hl": "en",
+        }},
+        "continuation": page.continuation,
+    }
+    headers = {**SEARCH_HEADERS, "Accept": "application/json", "Content-Type": "application/json"}
+    response = safe_request(url, headers, timeout=15, json_body=body, deadline=deadline)
+    if not response:
+        CONTINUATION_PAGES.labels(outcome="error").inc()
+        return SearchPage([])
+    YOUTUBE_RESPONSE_BYTES.labels(kind="continuation").inc(len(response.content))
+    try:
+        next_page = parse_continuation_response(response.json())
+    except ValueError as e:
+        logger.warning(f"Continuation response was not JSON: {e}")
+        CONTINUATION_PAGES.labels(outcome="error").inc()
+        return SearchPage([])
+    CONTINUATION_PAGES.labels(outcome="ok").inc()
+    similarity_index.add(next_page.videos)
+    # Later pages reuse the first page's client config
+    next_page.api_key = page.api_key
+    next_page.client_version = page.client_version
+    return next_page
+
+@traced("youtube.results")
+def get_youtube_results(query: str, max_results: int = 20, allow_duplicates: bool = False,
+                        record_history: bool = True,
+                        deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+    """
+    Scrape YouTube search page for video links with improved error handling
+    
+    Identical queries already in flight share that fetch; each caller then
+    applies its own history dedup. With record_history=False results are
+    still filtered against the search history but not added to it, so
+    speculative fetches can be discarded.
+    
+    If the first page runs out before max_results (usually because the
+    history filtered most of it), up to MAX_CONTINUATION_PAGES follow-up
+    pages of the same query are fetched by continuation token, time
+    permitting.
+    """
+    # The shared fetch runs under the leader's deadline, so only join leaders with as much time left
+    expires_at = deadline.expires_at if deadline else None
+    wait = deadline.remaining() if deadline else None
+    try:
+        page = search_flight.do(normalize_query(query), lambda: fetch_search_page(query, deadline),
+                                timeout=wait, expires_at=expires_at)
+    except TimeoutError:
+        logger.warning(f"Deadline reached waiting for a shared search for {query}")
+        return []
+    
+    results: List[Dict[str, Any]] = []
+    seen_urls: Set[str] = set()
+    pages_followed = 0
+    while True:
+        for video in page.videos:
+            if len(results) >= max_results:
+                break
+            # Continuation pages can repeat videos from earlier pages
+            if video["url"] in seen_urls:
+                continue
+            # Check for duplicates only if not allowing them
+            if allow_duplicates or not search_history_manager.is_duplicate(video["url"]):
+                seen_urls.add(video["url"])
+                results.append(dict(video))
+                if record_history:
+                    search_history_manager.add_url(video["url"])
+        
+        if len(results) >= max_results or not page.continuation or pages_followed >= MAX_CONTINUATION_PAGES:
+            break
+        if deadline and deadline.expired():
+            break
+        previous = page
+        try:
+            page = search_flight.do(f"continuation:{previous.continuation}",
+                                    lambda: fetch_continuation_page(previous, deadline),
+                                    timeout=deadline.remaining() if deadline else None,
+                                    expires_at=expires_at)
+        except TimeoutError:
+            break
+        pages_followed += 1
+    current_span().set_attribute("query", query)
+    current_span().set_attribute("results", len(results))
+    current_span().set_attribute("continuation_pages", pages_followed)
     return results
 
 def create_search_queries(mood: str, language: str, custom: str = "") -> List[str]:
@@ -295,26 +607,53 @@ def create_search_queries(mood: str, language: str, custom: str = "") -> List[st
     
     return base_queries + custom_queries
 
-def fetch_recommendations(queries: List[str], total: int = 20) -> List[Dict[str, str]]:
-    """Fetch video recommendations from multiple queries - ENHANCED VERSION with fallback"""
-    accumulated: List[Dict[str, str]] = []
+@traced("fetch_recommendations")
+def fetch_recommendations(queries: List[str], total: int = 20, record_history: bool = True,
+                          control: Optional[FetchControl] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch video recommendations from multiple queries - ENHANCED VERSION with fallback
+    
+    If control carries a deadline, retries back off only while the budget
+    allows and the best results so far are returned once it runs out.
+    """
+    control = control or FetchControl()
+    deadline = control.deadline
+    accumulated: List[Dict[str, Any]] = []
     max_attempts = 3
     min_per_query = 3
     
+    current_span().set_attribute("queries", len(queries))
+    current_span().set_attribute("total", total)
     logger.info(f"Fetching up to {total} recommendations from {len(queries)} queries")
     logger.info(f"Search history stats: {search_history_manager.get_stats()}")
     
     # First pass: Try to get fresh results
     for query in queries:
+        if control.out_of_time():
+            break
         attempts = 0
         while attempts < max_attempts:
+            if control.is_cancelled():
+                logger.info("Fetch cancelled, returning partial results")
+                return accumulated
+            if control.out_of_time():
+                break
             try:
                 remaining = total - len(accumulated)
                 per_query = max(min_per_query, remaining // max(1, len(queries) - queries.index(query)))
                 
                 logger.info(f"Attempt {attempts + 1} for: {query} (target: {per_query} results)")
                 
-                batch_results = get_youtube_results(query, max_results=per_query, allow_duplicates=False)
+                control.requests_made += 1
+                with span("query_attempt", query=query, attempt=attempts + 1, target=per_query) as attempt_span:
+                    batch_results = get_youtube_results(
+                        query,
+                        max_results=per_query,
+                        allow_duplicates=False,
+                        record_history=record_history,
+                        deadline=deadline
+                    )
+                    attempt_span.set_attribute("results", len(batch_results))
                 if batch_results:
                     accumulated.extend(batch_results)
                     break
@@ -324,14 +663,23 @@ def fetch_recommendations(queries: List[str], total: int = 20) -> List[Dict[str,
             
             attempts += 1
             if attempts < max_attempts:
-                time.sleep(2 ** attempts)
+                backoff = 2 ** attempts
+                # A retry that can't finish in time only delays the partial result
+                if deadline and not deadline.allows(backoff):
+                    break
+                FETCH_RETRIES.inc()
+                with span("backoff_sleep", seconds=backoff):
+                    time.sleep(backoff)
         
         if len(accumulated) >= total:
             break
     
-    # Fallback: If we don't have enough results, allow some duplicates
-    if len(accumulated) < total // 2:  # Less than 50% of target
+    if control.out_of_time():
+        logger.warning(f"Deadline reached, returning {len(accumulated)} partial results")
+    elif len(accumulated) < total // 2:  # Less than 50% of target
+        # Fallback: If we don't have enough results, allow some duplicates
         logger.warning(f"Only got {len(accumulated)} results, trying fallback with duplicates allowed")
+        FALLBACKS.labels(kind="allow_duplicates").inc()
         
         # Clear some recent history to allow more results
         search_history_manager.cleanup_old_entries()
@@ -339,40 +687,129 @@ def fetch_recommendations(queries: List[str], total: int = 20) -> List[Dict[str,
         for query in queries[:3]:
             try:
                 remaining = total - len(accumulated)
-                if remaining <= 0:
+                if remaining <= 0 or control.is_cancelled() or control.out_of_time():
                     break
-                    
-                fallback_results = get_youtube_results(
-                    query, 
-                    max_results=remaining, 
-                    allow_duplicates=True
-                )
+                
+                control.requests_made += 1
+                with span("fallback_query", query=query, target=remaining):
+                    fallback_results = get_youtube_results(
+                        query, 
+                        max_results=remaining, 
+                        allow_duplicates=True,
+                        record_history=record_history,
+                        deadline=deadline
+                    )
                 accumulated.extend(fallback_results)
                 
             except Exception as e:
                 logger.warning(f"Fallback search failed: {str(e)}")
     
-    # Enhanced deduplication by video ID
-    seen_ids = set()
-    unique_videos = []
-    for video in accumulated:
-        vid_id = extract_video_id(video["url"])
-        if vid_id and vid_id not in seen_ids:
-            seen_ids.add(vid_id)
-            unique_videos.append(video)
-    
-    # Final shuffle and trim
-    random.shuffle(unique_videos)
-    final_results = unique_videos[:total]
+    with DEDUP_SECONDS.time(), span("dedup", candidates=len(accumulated)):
+        # Enhanced deduplication by video ID
+        seen_ids = set()
+        unique_videos = []
+        for video in accumulated:
+            vid_id = extract_video_id(video["url"])
+            if vid_id and vid_id not in seen_ids:
+                seen_ids.add(vid_id)
+                unique_videos.append(video)
+        
+        # Final shuffle and trim
+        random.shuffle(unique_videos)
+        final_results = unique_videos[:total]
     
     logger.info(f"Returning {len(final_results)} unique recommendations")
     return final_results
 
+def fetch_query_candidates(query_needs: Dict[str, int],
+                           deadline: Optional[Deadline] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetch each distinct query once for a batch of requests
+    
+    Args:
+        query_needs: query -> number of candidates wanted across all callers
+        deadline: queries not started before it passes get no candidates
+        
+    Returns:
+        query -> candidate videos, not yet filtered by or added to history
+    """
+    candidates: Dict[str, List[Dict[str, Any]]] = {}
+    for query, need in query_needs.items():
+        if deadline and deadline.expired():
+            candidates[query] = []
+            continue
+        try:
+            candidates[query] = get_youtube_results(
+                query,
+                max_results=need,
+                allow_duplicates=True,
+                record_history=False,
+                deadline=deadline
+            )
+        except Exception as e:
+            logger.warning(f"Batch search failed for {query}: {str(e)}")
+            candidates[query] = []
+    return candidates
+
+def select_for_item(queries: List[str], candidates: Dict[str, List[Dict[str, Any]]],
+                    total: int) -> List[Dict[str, Any]]:
+    """
+    Pick up to `total` videos for one batch item from shared candidates,
+    round-robin across its queries, deduplicated by video ID and against the
+    search history. Falls back to history duplicates if fewer than half the
+    target are fresh. Selected videos are added to the history.
+    """
+    selected: List[Dict[str, Any]] = []
+    seen_ids: Set[str] = set()
+    
+    def take(allow_duplicates: bool):
+        positions = {query: 0 for query in queries}
+        progressed = True
+        while len(selected) < total and progressed:
+            progressed = False
+            for query in queries:
+                pool = candidates.get(query, [])
+                while positions[query] < len(pool):
+                    video = pool[positions[query]]
+                    positions[query] += 1
+                    vid_id = extract_video_id(video["url"])
+                    if not vid_id or vid_id in seen_ids:
+                        continue
+                    if not allow_duplicates and search_history_manager.is_duplicate(video["url"]):
+                        continue
+                    seen_ids.add(vid_id)
+                    selected.append(video)
+                    progressed = True
+                    break
+                if len(selected) >= total:
+                    break
+    
+    take(allow_duplicates=False)
+    if len(selected) < total // 2:
+        FALLBACKS.labels(kind="allow_duplicates").inc()
+        take(allow_duplicates=True)
+    
+    commit_to_history(selected)
+    return selected
+
+def commit_to_history(videos: List[Dict[str, Any]]):
+    """Record results fetched with record_history=False once they are served"""
+    for video in videos:
+        search_history_manager.add_url(video["url"])
+
 def clear_search_history():
     """Clear the search history - useful for new sessions"""
     search_history_manager.clear_session()
     logger.info("Search history cleared")
 
+def get_singleflight_stats() -> Dict[str, int]:
+    """Get counts of upstream searches saved by coalescing"""
+    return search_flight.get_stats()
+
+def is_in_history(url: str) -> bool:
+    """True if the URL was already recommended in this session"""
+    return search_history_manager.is_duplicate(url)
+
 def get_search_history_stats() -> Dict[str, int]:
     """Get search history statistics"""
     return search_history_manager.get_stats()
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Dict
+
+from metrics import Counter
+
+GESTURE_EVENTS = Counter(
+    "mood_gesture_events_total", "Playback control events received", ["command"]
+)
+
+VOLUME_STEP = 10
+MAX_SESSIONS = 256
+
+COMMANDS = {"play_pause", "next", "previous", "volume_up", "volume_down", "mute", "ping"}
+
+
+@dataclass
+class PlaybackState:
+    playing: bool = False
+    volume: int = 50
+    muted: bool = False
+    track_index: int = 0
+    events: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def apply(self, command: str):
+        if command == "play_pause":
+            self.playing = not self.playing
+        elif command == "next":
+            self.track_index += 1
+        elif command == "previous":
+            self.track_index = max(0, self.track_index - 1)
+        elif command == "volume_up":
+            self.volume = min(100, self.volume + VOLUME_STEP)
+            self.muted = False
+        elif command == "volume_down":
+            self.volume = max(0, self.volume - VOLUME_STEP)
+        elif command == "mute":
+            self.muted = not self.muted
+        self.events += 1
+        self.updated_at = time.time()
+
+    def compact(self) -> Dict[str, int]:
+        """State in the short-key form sent over the control channel"""
+        return {"p": int(self.playing), "v": self.volume, "m": int(self.muted), "t": self.track_index}
+
+
+class PlaybackRegistry:
+    """Playback state per session, least recently used sessions evicted first"""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._states: "OrderedDict[str, PlaybackState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> PlaybackState:
+        state = self._states.get(session_id)
+        if state is None:
+            state = self._states[session_id] = PlaybackState()
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(session_id)
+        return state
+
+    def apply(self, session_id: str, command: str) -> Dict[str, int]:
+        with self._lock:
+            state = self._get(session_id)
+            if command != "ping":
+                state.apply(command)
+            return state.compact()
+
+    def get_state(self, session_id: str) -> dict:
+        """State for a session, or the default state; reading never creates a session"""
+        with self._lock:
+            state = self._states.get(session_id)
+            return asdict(state if state is not None else PlaybackState())
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._states),
+                "events": sum(state.events for state in self._states.values()),
+            }
+
+
+playback_registry = PlaybackRegistry()
+
+
+def handle_control_message(session_id: str, message: str) -> str:
+    """
+    Apply one control-channel message and return the reply.
+
+    Requests are {"c": command, "i": sequence number}; replies echo "i" and
+    carry the resulting state ("p" playing, "v" volume, "m" muted, "t" track
+    index), or "e" with an error. "ping" returns the state unchanged.
+    """
+    try:
+        request = json.loads(message)
+        command = request["c"]
+        seq = request.get("i")
+    except (ValueError, KeyError, TypeError):
+        return json.dumps({"e": "malformed message"})
+    if not isinstance(command, str):
+        return json.dumps({"i": seq, "e": "malformed message"})
+
+    if command not in COMMANDS:
+        return json.dumps({"i": seq, "e": f"unknown command {command!r}"})
+
+    GESTURE_EVENTS.labels(command=command).inc()
+    state = playback_registry.apply(session_id, command)
+    return json.dumps({"i": seq, **state}, separators=(",", ":"))
@@ -0,0 +1,218 @@
+"""
+Sampling profiler producing collapsed stacks (flamegraph.pl / speedscope
+compatible: one "frame;frame;frame count" line per unique stack).
+
+Two modes, both off unless configured:
+- Per-request: a request carrying the X-Profile header (or ?profile=1) is
+  sampled while it runs and the profile is written to MOOD_PROFILE_DIR.
+  Requires MOOD_PROFILING_ENABLED=1, and the header/param value must match
+  MOOD_PROFILING_TOKEN when one is set.
+- Global: MOOD_PROFILING_GLOBAL_HZ > 0 samples every thread at a low rate and
+  flushes the aggregate to disk every MOOD_PROFILING_FLUSH_SECONDS.
+
+When disabled nothing is installed: no middleware, no threads, and
+bind_profile returns the function unchanged.
+"""
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get("MOOD_PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILING_TOKEN = os.environ.get("MOOD_PROFILING_TOKEN", "")
+PROFILE_DIR = os.environ.get("MOOD_PROFILE_DIR", "profiles")
+REQUEST_SAMPLE_HZ = float(os.environ.get("MOOD_PROFILING_REQUEST_HZ", 200))
+GLOBAL_SAMPLE_HZ = float(os.environ.get("MOOD_PROFILING_GLOBAL_HZ", 0))
+GLOBAL_FLUSH_SECONDS = float(os.environ.get("MOOD_PROFILING_FLUSH_SECONDS", 60))
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+
+def _collapse(frame) -> str:
+    """Render a frame chain root-first in collapsed-stack form"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+def write_collapsed(stacks: Counter, path: str) -> str:
+    """Write a stack counter to disk in collapsed format"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+class _SamplerThread(threading.Thread):
+    """Background thread calling `sample` at a fixed rate until stopped"""
+
+    def __init__(self, hz: float, sample: Callable[[], None], name: str):
+        super().__init__(name=name, daemon=True)
+        self.interval = 1.0 / max(hz, 0.001)
+        self.sample = sample
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Profiler sample failed: {str(e)}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class RequestProfile:
+    """Samples only the threads doing work for one request"""
+
+    def __init__(self, label: str, hz: float = REQUEST_SAMPLE_HZ):
+        self.label = label
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._threads: Set[int] = set()
+        self._lock = threading.Lock()
+        self._sampler = _SamplerThread(hz, self._sample, f"profile-{label}")
+        self.started = time.time()
+
+    def add_thread(self, ident: int):
+        with self._lock:
+            self._threads.add(ident)
+
+    def remove_thread(self, ident: int):
+        with self._lock:
+            self._threads.discard(ident)
+
+    def _sample(self):
+        with self._lock:
+            threads = set(self._threads)
+        if not threads:
+            return
+        frames = sys._current_frames()
+        for ident in threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+                self.samples += 1
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self) -> str:
+        """Stop sampling and write the profile, returning its path"""
+        self._sampler.stop()
+        self._sampler.join(timeout=1)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        safe_label = self.label.strip("/").replace("/", "_") or "root"
+        path = os.path.join(PROFILE_DIR, f"request-{stamp}-{safe_label}-{id(self):x}.collapsed")
+        return write_collapsed(self.stacks, path)
+
+
+def bind_profile(func: Callable) -> Callable:
+    """
+    Wrap a function that will run in the thread pool so the worker thread
+    is sampled while the calling request is being profiled
+    """
+    if not PROFILING_ENABLED:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        ident = threading.get_ident()
+        profile.add_thread(ident)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.remove_thread(ident)
+    return wrapper
+
+
+def profile_requested(headers, query_params) -> bool:
+    """True if the request asked to be profiled and is allowed to be"""
+    if not PROFILING_ENABLED:
+        return False
+    value = headers.get("x-profile") or query_params.get("profile")
+    if not value:
+        return False
+    if PROFILING_TOKEN:
+        return value == PROFILING_TOKEN
+    return value.lower() in ("1", "true", "yes")
+
+
+def start_request_profile(label: str):
+    """
+    Begin profiling the current request; returns (profile, context token).
+    The event loop thread is shared with other requests, so only worker
+    threads entered through bind_profile are sampled.
+    """
+    profile = RequestProfile(label)
+    token = _active_profile.set(profile)
+    profile.start()
+    return profile, token
+
+
+def finish_request_profile(profile: RequestProfile, token) -> str:
+    _active_profile.reset(token)
+    return profile.stop()
+
+
+class GlobalSampler:
+    """Low-rate sampling of every thread, periodically flushed to disk"""
+
+    def __init__(self, hz: float, flush_seconds: float):
+        self.hz = hz
+        self.flush_seconds = flush_seconds
+        self.stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._sampler: Optional[_SamplerThread] = None
+        self._last_flush = time.time()
+
+    def _sample(self):
+        own = threading.get_ident()
+        frames: Dict[int, object] = sys._current_frames()
+        with self._lock:
+            for ident, frame in frames.items():
+                if ident != own:
+                    self.stacks[_collapse(frame)] += 1
+        if time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> Optional[str]:
+        with self._lock:
+            stacks, self.stacks = self.stacks, Counter()
+        self._last_flush = time.time()
+        if not stacks:
+            return None
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return write_collapsed(stacks, os.path.join(PROFILE_DIR, f"global-{stamp}.collapsed"))
+
+    def start(self):
+        if self._sampler is None:
+            self._sampler = _SamplerThread(self.hz, self._sample, "profile-global")
+            self._sampler.start()
+            logger.info(f"Global sampling profiler running at {self.hz} Hz")
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.join(timeout=1)
+            self._sampler = None
+            self.flush()
+
+
+global_sampler = GlobalSampler(GLOBAL_SAMPLE_HZ, GLOBAL_FLUSH_SECONDS) if GLOBAL_SAMPLE_HZ > 0 else None
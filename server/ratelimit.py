@@ -0,0 +1,163 @@
+import asyncio
+import os
+import threading
+import time
+import logging
+from typing import Dict, Optional
+
+from metrics import Counter, GaugeCallback, Histogram
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "mood_rate_limit_wait_seconds", "Time callers waited for an outbound request token", ["limiter"]
+)
+RATE_LIMIT_THROTTLES = Counter(
+    "mood_rate_limit_throttles_total", "Throttling responses (429 or CAPTCHA) seen by a limiter", ["limiter"]
+)
+RATE_LIMIT_REJECTED = Counter(
+    "mood_rate_limit_rejected_total", "Acquires that gave up because the wait exceeded their timeout", ["limiter"]
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket shared by every thread and coroutine making a given kind of
+    outbound request.
+
+    Tokens refill at `rate` per second up to `burst`. Each acquire reserves a
+    token immediately, letting the balance go negative, and then sleeps off
+    its share of the debt outside the lock, so callers are served in arrival
+    order and nobody holds the lock while waiting.
+
+    The rate adapts AIMD-style: every successful request adds `increase`
+    (up to `max_rate`) and every throttling response multiplies it by
+    `decrease` (down to `min_rate`) and pauses all grants for the server's
+    Retry-After, if it sent one.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, min_rate: float, max_rate: float,
+                 increase: float = 0.05, decrease: float = 0.5):
+        self.name = name
+        self.min_rate = max(1e-3, min_rate)
+        self.max_rate = max(self.min_rate, max_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.burst = max(1.0, burst)
+        self.increase = increase
+        self.decrease = decrease
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        # Monitoring counters
+        self.granted = 0
+        self.rejected = 0
+        self.throttles = 0
+        self.total_wait = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, timeout: Optional[float]) -> Optional[float]:
+        """Take a token and return how long to wait for it, or None if that exceeds timeout"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (1.0 - self._tokens) / self.rate, self._paused_until - now)
+            if timeout is not None and wait > timeout:
+                self.rejected += 1
+                RATE_LIMIT_REJECTED.labels(limiter=self.name).inc()
+                return None
+            self._tokens -= 1.0
+            self.granted += 1
+            self.total_wait += wait
+        RATE_LIMIT_WAIT_SECONDS.labels(limiter=self.name).observe(wait)
+        return wait
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Block the calling thread until a token is available; False if it would take longer than timeout"""
+        wait = self._reserve(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """Like acquire(), but waits without blocking the event loop"""
+        wait = self._reserve(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def on_success(self):
+        """Additive increase after a request that wasn't throttled"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a 429 or CAPTCHA response"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # Drop any saved-up burst so the lower rate takes effect at once
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self.throttles += 1
+            rate = self.rate
+        RATE_LIMIT_THROTTLES.labels(limiter=self.name).inc()
+        logger.warning(f"{self.name} throttled upstream, rate lowered to {rate:.2f}/s"
+                       + (f", paused {retry_after:.1f}s" if retry_after else ""))
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": round(self.rate, 3),
+                "min_rate": self.min_rate,
+                "max_rate": self.max_rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 3),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "throttles": self.throttles,
+                "mean_wait": round(self.total_wait / self.granted, 4) if self.granted else 0.0,
+            }
+
+
+# Every outbound YouTube request in this process goes through this one
+# bucket. The default of one request a second matches the old fixed delay.
+youtube_limiter = AdaptiveTokenBucket(
+    "youtube",
+    rate=_env_float("MOOD_YOUTUBE_RATE", 1.0),
+    burst=_env_float("MOOD_YOUTUBE_BURST", 3),
+    min_rate=_env_float("MOOD_YOUTUBE_MIN_RATE", 0.1),
+    max_rate=_env_float("MOOD_YOUTUBE_MAX_RATE", 2.0),
+    increase=_env_float("MOOD_YOUTUBE_RATE_INCREASE", 0.05),
+    decrease=_env_float("MOOD_YOUTUBE_RATE_DECREASE", 0.5),
+)
+
+GaugeCallback("mood_rate_limit_rate", "Current outbound request rate per second",
+              lambda: {(youtube_limiter.name,): youtube_limiter.rate}, ["limiter"])
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, float]]:
+    """Current rate, tokens and wait counters for every limiter"""
+    return {"youtube": youtube_limiter.get_stats()}
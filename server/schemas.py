@@ -0,0 +1,89 @@
+from pydantic import BaseModel, model_validator
+from typing import Optional, List
+
+# Pydantic models
+class WebcamCapture(BaseModel):
+    image_data: str = ""  # base64 encoded image
+    # Alternative to image_data: base64 of a face tensor (see face_tensor.py),
+    # a face the client already detected and cropped
+    face_tensor: Optional[str] = None
+    language: str = "english"
+    custom_preferences: Optional[str] = ""
+    max_results: int = 15
+    manual_mood: Optional[str] = None
+    clear_history: bool = False  # Manual clear option (auto-clean happens automatically)
+    session_id: Optional[str] = None  # Lets speculative prefetch use this client's last mood
+
+    @model_validator(mode="after")
+    def require_image(self):
+        """Without a manual mood there must be something to run inference on"""
+        if not self.manual_mood and not self.image_data and not self.face_tensor:
+            raise ValueError("image_data or face_tensor is required unless manual_mood is set")
+        return self
+
+class EmotionResponse(BaseModel):
+    emotion: str
+    confidence: float
+    deepface_available: bool
+
+class VideoResult(BaseModel):
+    url: str
+    title: str
+    # Metadata from the search result itself; None when the page didn't have it
+    duration: Optional[str] = None  # As displayed, e.g. "3:45"
+    duration_seconds: Optional[int] = None
+    view_count: Optional[int] = None
+    channel: Optional[str] = None
+    thumbnail: Optional[str] = None
+    published: Optional[str] = None  # Relative, e.g. "2 years ago"
+
+class MusicResponse(BaseModel):
+    videos: List[VideoResult]
+    total_count: int
+    mood: str
+    language: str
+    search_stats: dict  # Includes auto-clean info
+
+class SystemStatus(BaseModel):
+    deepface_available: bool
+    deepface_error: Optional[str]
+    supported_emotions: List[str]
+    supported_languages: List[str]
+    search_history_stats: dict  # Includes auto-clean thresholds
+
+class SessionResponse(BaseModel):
+    message: str
+    search_stats: dict
+
+class BatchMusicRequest(BaseModel):
+    captures: List[WebcamCapture]
+
+class BatchItemResult(BaseModel):
+    index: int
+    mood: Optional[str] = None
+    confidence: Optional[float] = None
+    language: str
+    videos: List[VideoResult] = []
+    total_count: int = 0
+    error: Optional[str] = None
+
+class BatchMusicResponse(BaseModel):
+    results: List[BatchItemResult]
+    distinct_queries: int  # Upstream searches actually issued
+    total_queries: int  # Searches the items would have issued separately
+    search_stats: dict
+
+class SimilarRequest(BaseModel):
+    seeds: List[str] = []  # Watch URLs or video IDs of tracks the user liked
+    seed_titles: List[str] = []  # Free text, e.g. "Artist - Song", for tracks never scraped
+    max_results: int = 15
+    exclude_history: bool = True  # Skip tracks already recommended this session
+
+class SimilarVideo(VideoResult):
+    score: float  # Cosine similarity to the seeds, 0-1
+
+class SimilarResponse(BaseModel):
+    videos: List[SimilarVideo]
+    total_count: int
+    seeds_found: int  # Seeds present in the index; the rest were ignored
+    index_size: int
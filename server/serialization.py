@@ -0,0 +1,135 @@
+import json
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import Response
+
+from metrics import CACHE_HITS, CACHE_MISSES
+
+# orjson is optional - it serializes dataclasses natively and is several times
+# faster than the stdlib encoder, but everything works without it
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+@dataclass(frozen=True, slots=True)
+class VideoRecord:
+    """Compact, pre-validated video entry used on the fast response path"""
+    url: str
+    title: str
+    duration: Optional[str] = None
+    duration_seconds: Optional[int] = None
+    view_count: Optional[int] = None
+    channel: Optional[str] = None
+    thumbnail: Optional[str] = None
+    published: Optional[str] = None
+
+
+def _encode_default(obj: Any) -> Any:
+    """Fallback encoder for the stdlib json module (dataclasses, sets)"""
+    if isinstance(obj, VideoRecord):
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content straight to JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=_encode_default)
+    return json.dumps(
+        content,
+        default=_encode_default,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response that skips FastAPI's response_model validation and
+    jsonable_encoder pass. Only use it for payloads built from
+    already-validated records.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+def _optional_str(value: Any) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def to_video_records(results: Iterable[Dict[str, Any]]) -> List[VideoRecord]:
+    """Convert scraper result dicts into compact records, validating once"""
+    records = []
+    for item in results:
+        url = item.get("url")
+        if not url:
+            continue
+        records.append(VideoRecord(
+            url=str(url),
+            title=str(item.get("title") or "Untitled"),
+            duration=_optional_str(item.get("duration")),
+            duration_seconds=_optional_int(item.get("duration_seconds")),
+            view_count=_optional_int(item.get("view_count")),
+            channel=_optional_str(item.get("channel")),
+            thumbnail=_optional_str(item.get("thumbnail")),
+            published=_optional_str(item.get("published")),
+        ))
+    return records
+
+
+def encode_music_response(
+    records: List[VideoRecord],
+    mood: str,
+    language: str,
+    search_stats: dict,
+) -> bytes:
+    """Encode a MusicResponse-shaped payload directly to JSON bytes"""
+    return dumps({
+        "videos": records,
+        "total_count": len(records),
+        "mood": mood,
+        "language": language,
+        "search_stats": search_stats,
+    })
+
+
+class StatusCache:
+    """
+    Holds the parts of /status and /health that never change after startup
+    (supported emotions and languages, DeepFace availability) so only the
+    search history stats are recomputed per request.
+    """
+
+    def __init__(self):
+        self._static: Optional[Dict[str, Any]] = None
+
+    def static_fields(self, build) -> Dict[str, Any]:
+        """Return the cached static fields, building them on first use"""
+        if self._static is None:
+            CACHE_MISSES.labels(cache="status").inc()
+            self._static = build()
+        else:
+            CACHE_HITS.labels(cache="status").inc()
+        return self._static
+
+    def invalidate(self):
+        """Forget the cached static fields"""
+        self._static = None
+
+
+status_cache = StatusCache()
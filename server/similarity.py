@@ -0,0 +1,300 @@
+"""
+"More like this" over every track the scraper has seen.
+
+Each scraped video becomes a sparse TF-IDF vector of its title words,
+title bigrams and channel, with features hashed into a fixed 2^18-wide
+space so no vocabulary has to be kept. Queries sum the normalised seed
+vectors and score the whole index with one vectorised sparse dot product:
+the postings of the query's few dozen features are gathered from an
+inverted (column-major) index and accumulated per track with np.bincount.
+
+New tracks land in a small pending segment that is re-indexed lazily on
+the next query; once it holds MERGE_THRESHOLD tracks it is merged into the
+main segment, which is also when document norms pick up the latest IDF
+and the oldest tracks are evicted past MOOD_SIMILARITY_MAX_TRACKS.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import GaugeCallback, Histogram
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 1 << 18
+MAX_TRACKS = int(os.environ.get("MOOD_SIMILARITY_MAX_TRACKS", 50000))
+MERGE_THRESHOLD = 2048
+CHANNEL_WEIGHT = 1.5
+BIGRAM_WEIGHT = 0.5
+
+# Words that appear in most music video titles and say nothing about the track
+STOPWORDS = frozenset("""
+a an and the of in on to for with by from is it my your me you i
+official video audio lyric lyrics lyrical full song songs music hd 4k hq
+new latest ft feat featuring version remastered mv visualizer live
+""".split())
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_VIDEO_ID_RE = re.compile(r"(?:v=|youtu\.be/|^)([0-9A-Za-z_-]{11})(?:$|[&?#])")
+
+SIMILARITY_QUERY_SECONDS = Histogram(
+    "mood_similarity_query_seconds", "Time to answer a more-like-this query"
+)
+
+
+def _hash(feature: str) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(feature.encode("utf-8")) & (N_FEATURES - 1)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and not t.isdigit()]
+
+
+def track_features(title: str, channel: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed feature indices and sublinear TF weights for one track"""
+    weights: Dict[int, float] = {}
+    words = tokenize(title)
+    for word in words:
+        key = _hash("w:" + word)
+        weights[key] = weights.get(key, 0.0) + 1.0
+    for first, second in zip(words, words[1:]):
+        key = _hash(f"b:{first} {second}")
+        weights[key] = weights.get(key, 0.0) + BIGRAM_WEIGHT
+    if channel:
+        # The whole channel name is one feature: same artist, not same word
+        key = _hash("c:" + " ".join(channel.lower().split()))
+        weights[key] = weights.get(key, 0.0) + CHANNEL_WEIGHT
+    features = np.fromiter(weights.keys(), dtype=np.int32, count=len(weights))
+    tf = np.fromiter(weights.values(), dtype=np.float32, count=len(weights))
+    # Sublinear TF for repeated words; fractional field weights pass through
+    return features, np.where(tf >= 1.0, 1.0 + np.log(np.maximum(tf, 1.0)), tf).astype(np.float32)
+
+
+def video_id_of(value: str) -> Optional[str]:
+    """Video ID from a watch URL, youtu.be link or bare ID"""
+    match = _VIDEO_ID_RE.search(value.strip())
+    return match.group(1) if match else None
+
+
+class _Segment:
+    """Immutable inverted index over some rows: postings sorted by feature"""
+
+    __slots__ = ("features", "starts", "counts", "rows", "weights")
+
+    def __init__(self, rows: np.ndarray, features: np.ndarray, weights: np.ndarray):
+        order = np.argsort(features, kind="stable")
+        sorted_features = features[order]
+        self.rows = rows[order]
+        self.weights = weights[order]
+        self.features, self.starts, self.counts = np.unique(
+            sorted_features, return_index=True, return_counts=True
+        )
+
+    @classmethod
+    def empty(cls) -> "_Segment":
+        return cls(np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.float32))
+
+    def accumulate(self, query_features: np.ndarray, query_weights: np.ndarray, scores: np.ndarray):
+        """scores[row] += sum over shared features of query weight * document weight"""
+        if not len(self.features) or not len(query_features):
+            return
+        pos = np.searchsorted(self.features, query_features)
+        pos = np.minimum(pos, len(self.features) - 1)
+        hit = self.features[pos] == query_features
+        if not hit.any():
+            return
+        pos, qw = pos[hit], query_weights[hit]
+        counts = self.counts[pos]
+        total = int(counts.sum())
+        # Concatenated postings ranges without a Python loop
+        offsets = np.repeat(self.starts[pos] - np.cumsum(counts) + counts, counts)
+        idx = offsets + np.arange(total)
+        scores += np.bincount(self.rows[idx], weights=self.weights[idx] * np.repeat(qw, counts),
+                              minlength=len(scores))[:len(scores)]
+
+
+class SimilarityIndex:
+    """Thread-safe hashed TF-IDF index of scraped tracks"""
+
+    def __init__(self, max_tracks: int = MAX_TRACKS, merge_threshold: int = MERGE_THRESHOLD):
+        self.max_tracks = max_tracks
+        self.merge_threshold = merge_threshold
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, Any]] = []
+        self._terms: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._row_of: Dict[str, int] = {}
+        self._df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._main = _Segment.empty()
+        self._pending_from = 0
+        self._pending: Optional[_Segment] = _Segment.empty()
+
+        self.queries = 0
+        self.merges = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _idf(self, features: np.ndarray) -> np.ndarray:
+        n = len(self._records)
+        return (np.log((1.0 + n) / (1.0 + self._df[features])) + 1.0).astype(np.float32)
+
+    def _norms_of(self, first: int, rows: np.ndarray, features: np.ndarray,
+                  weights: np.ndarray, count: int) -> np.ndarray:
+        """L2 norms of the TF-IDF vectors of rows first..first+count, in one pass"""
+        squares = (weights * self._idf(features)) ** 2
+        norms = np.sqrt(np.bincount(rows - first, weights=squares, minlength=count)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        return norms
+
+    def _norm(self, features: np.ndarray, weights: np.ndarray) -> float:
+        return float(np.sqrt(np.sum((weights * self._idf(features)) ** 2))) or 1.0
+
+    def add(self, videos: Iterable[Dict[str, Any]]):
+        """Index scraped result dicts; videos already indexed only refresh their metadata"""
+        with self._lock:
+            added = False
+            for video in videos:
+                video_id = video_id_of(video.get("url", ""))
+                if not video_id:
+                    continue
+                row = self._row_of.get(video_id)
+                if row is not None:
+                    self._records[row] = dict(video)
+                    continue
+                features, weights = track_features(video.get("title") or "", video.get("channel"))
+                if not len(features):
+                    continue
+                self._row_of[video_id] = len(self._records)
+                self._records.append(dict(video))
+                self._terms.append((features, weights))
+                self._df[features] += 1
+                added = True
+            if not added:
+                return
+            self._pending = None  # re-indexed on the next query
+            if len(self._records) - self._pending_from >= self.merge_threshold:
+                self._merge()
+
+    def _merge(self):
+        """Fold pending rows into the main segment, evicting the oldest past max_tracks"""
+        start = time.perf_counter()
+        if len(self._records) > self.max_tracks:
+            keep_from = len(self._records) - self.max_tracks * 3 // 4
+            self._records = self._records[keep_from:]
+            self._terms = self._terms[keep_from:]
+            self._row_of = {video_id_of(r["url"]): i for i, r in enumerate(self._records)}
+            self._df = np.bincount(np.concatenate([f for f, _ in self._terms]),
+                                   minlength=N_FEATURES).astype(np.int32)
+        rows, features, weights = self._flatten(0, len(self._records))
+        self._main = _Segment(rows, features, weights)
+        # Every norm picks up the current IDF
+        self._norms = self._norms_of(0, rows, features, weights, len(self._records))
+        self._pending_from = len(self._records)
+        self._pending = _Segment.empty()
+        self.merges += 1
+        logger.info(f"Similarity index merged: {len(self._records)} tracks "
+                    f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def _flatten(self, first: int, last: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row, feature, weight) triples for rows first..last-1"""
+        terms = self._terms[first:last]
+        if not terms:
+            return np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.float32)
+        lengths = [len(f) for f, _ in terms]
+        rows = np.repeat(np.arange(first, last, dtype=np.int64), lengths)
+        return rows, np.concatenate([f for f, _ in terms]), np.concatenate([w for _, w in terms])
+
+    def _query_vector(self, seed_rows: List[int], seed_titles: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Sum of L2-normalised seed TF-IDF vectors, times IDF once more for the dot product"""
+        parts = [self._terms[row] for row in seed_rows]
+        parts += [track_features(title) for title in seed_titles]
+        parts = [(f, w) for f, w in parts if len(f)]
+        if not parts:
+            return np.empty(0, np.int32), np.empty(0, np.float32)
+        features = np.concatenate([f for f, _ in parts])
+        weights = np.concatenate([w * self._idf(f) / self._norm(f, w) for f, w in parts])
+        features, inverse = np.unique(features, return_inverse=True)
+        summed = np.bincount(inverse, weights=weights).astype(np.float32)
+        return features.astype(np.int32), summed * self._idf(features)
+
+    def more_like_this(self, seeds: Iterable[str] = (), seed_titles: Iterable[str] = (),
+                       k: int = 15, exclude=None) -> Tuple[List[Tuple[Dict[str, Any], float]], int]:
+        """
+        Top-k tracks by cosine similarity to the seeds
+
+        Args:
+            seeds: watch URLs or video IDs of indexed tracks
+            seed_titles: free-text titles (e.g. "Artist - Song") for tracks not indexed
+            exclude: optional predicate on a result dict, e.g. a history check
+
+        Returns:
+            ([(video dict, score)], number of seeds found in the index)
+        """
+        with SIMILARITY_QUERY_SECONDS.time():
+            with self._lock:
+                seed_rows = []
+                for seed in seeds:
+                    row = self._row_of.get(video_id_of(seed) or "")
+                    if row is not None:
+                        seed_rows.append(row)
+                if self._pending is None:
+                    first, last = self._pending_from, len(self._records)
+                    rows, features, weights = self._flatten(first, last)
+                    self._pending = _Segment(rows, features, weights)
+                    self._norms = np.concatenate([
+                        self._norms[:first], self._norms_of(first, rows, features, weights, last - first)
+                    ])
+                query_features, query_weights = self._query_vector(seed_rows, list(seed_titles))
+                main, pending, norms = self._main, self._pending, self._norms
+                records = self._records
+                self.queries += 1
+
+            # Scoring runs outside the lock on immutable snapshots
+            scores = np.zeros(len(norms), dtype=np.float64)
+            main.accumulate(query_features, query_weights, scores)
+            pending.accumulate(query_features, query_weights, scores)
+            scores /= norms
+            scores[seed_rows] = 0.0
+
+            results = []
+            candidates = np.flatnonzero(scores > 0)
+            # Take extra in case some are excluded, widening until k survive
+            taken = 0
+            wanted = min(len(candidates), k * 3 if exclude else k)
+            while len(results) < k and taken < wanted:
+                top = candidates[np.argpartition(-scores[candidates], wanted - 1)[:wanted]]
+                for row in top[np.argsort(-scores[top], kind="stable")][taken:]:
+                    video = records[row]
+                    if exclude is not None and exclude(video):
+                        continue
+                    results.append((dict(video), round(float(scores[row]), 4)))
+                    if len(results) >= k:
+                        break
+                taken, wanted = wanted, min(len(candidates), wanted * 4)
+            return results, len(seed_rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracks": len(self._records),
+                "pending": len(self._records) - self._pending_from,
+                "max_tracks": self.max_tracks,
+                "postings": int(len(self._main.rows)) + sum(len(f) for f, _ in self._terms[self._pending_from:]),
+                "queries": self.queries,
+                "merges": self.merges,
+            }
+
+
+# Fed by every page the scraper fetches
+similarity_index = SimilarityIndex()
+
+GaugeCallback("mood_similarity_tracks", "Tracks in the similarity index",
+              lambda: {(): len(similarity_index)})
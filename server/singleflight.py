@@ -0,0 +1,111 @@
+import math
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_CALLS = Counter(
+    "mood_singleflight_calls_total", "Calls into a singleflight group", ["group", "role"]
+)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "joiners", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.joiners = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result (or exception). Nothing is
+    cached once the call completes, so later callers trigger a fresh run.
+
+    The leader's func runs under the leader's own deadline, so a caller only
+    joins a call whose leader has enough time left: as much as the caller,
+    or at least join_budget seconds (the time func normally needs).
+    Otherwise it leads a new call, which later callers join instead.
+    """
+
+    def __init__(self, name: str, join_budget: float = 0.0):
+        self.name = name
+        self.join_budget = join_budget
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.joined = 0
+        self.outlasted = 0
+
+    def do(self, key: str, func: Callable[[], Any], timeout: Optional[float] = None,
+           expires_at: Optional[float] = None) -> Any:
+        """
+        Run func, or wait for the identical call already in flight. A joiner
+        that waits longer than timeout gets TimeoutError; the leader always
+        runs func to completion.
+
+        expires_at is the caller's time.monotonic() deadline, None for none.
+        """
+        expires_at = math.inf if expires_at is None else expires_at
+        with self._lock:
+            call = self._calls.get(key)
+            needed = min(expires_at, time.monotonic() + self.join_budget)
+            if call is not None and call.expires_at >= needed:
+                call.joiners += 1
+                self.joined += 1
+                leader = False
+            else:
+                if call is not None:
+                    # The in-flight leader would give up before this caller needs to
+                    self.outlasted += 1
+                call = _Call(expires_at)
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.labels(group=self.name, role="joined").inc()
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Singleflight {self.name}: gave up waiting for {key!r}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLEFLIGHT_CALLS.labels(group=self.name, role="leader").inc()
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+            if call.joiners:
+                logger.info(f"Singleflight {self.name}: {call.joiners} caller(s) shared one call for {key!r}")
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "upstream_calls": self.leaders,
+            "coalesced_calls": self.joined,
+            "upstream_saved": self.joined,
+            "outlasted_leaders": self.outlasted,
+            "in_flight": self.in_flight(),
+        }
@@ -0,0 +1,220 @@
+import asyncio
+import os
+import time
+import logging
+from collections import Counter, OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from music_manager import FetchControl, create_search_queries, fetch_recommendations
+from admission import scraping_limiter
+from deadline import Deadline
+from metrics import CACHE_HITS, CACHE_MISSES, GaugeCallback
+from profiling import bind_profile
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_ENABLED = os.environ.get("MOOD_SPECULATIVE_PREFETCH", "0").lower() in ("1", "true", "yes")
+
+
+class MoodPrior:
+    """
+    Guesses the likely mood of a capture before inference finishes.
+
+    Uses the session's last detected mood when a session id is known, then
+    the distribution of the most recent detections across all sessions.
+    """
+
+    def __init__(self, window: int = 200, max_sessions: int = 1000):
+        self.recent: Deque[str] = deque(maxlen=window)
+        self.session_moods: "OrderedDict[str, str]" = OrderedDict()
+        self.max_sessions = max_sessions
+
+    def record(self, mood: str, session_id: Optional[str] = None):
+        """Record a detected mood"""
+        self.recent.append(mood)
+        if session_id:
+            self.session_moods[session_id] = mood
+            self.session_moods.move_to_end(session_id)
+            while len(self.session_moods) > self.max_sessions:
+                self.session_moods.popitem(last=False)
+
+    def predict(self, session_id: Optional[str] = None, k: int = 1) -> List[str]:
+        """Return up to k candidate moods, most likely first"""
+        candidates: List[str] = []
+        if session_id and session_id in self.session_moods:
+            candidates.append(self.session_moods[session_id])
+        for mood, _ in Counter(self.recent).most_common():
+            if len(candidates) >= k:
+                break
+            if mood not in candidates:
+                candidates.append(mood)
+        return candidates[:k]
+
+
+class SpeculationBudget:
+    """Caps the number of wasted upstream searches per rolling minute"""
+
+    def __init__(self, max_wasted_per_minute: int):
+        self.max_wasted_per_minute = max_wasted_per_minute
+        self._wasted: Deque[Tuple[float, int]] = deque()
+
+    def _prune(self, now: float):
+        while self._wasted and now - self._wasted[0][0] > 60:
+            self._wasted.popleft()
+
+    def wasted_last_minute(self) -> int:
+        self._prune(time.monotonic())
+        return sum(count for _, count in self._wasted)
+
+    def can_speculate(self) -> bool:
+        return self.wasted_last_minute() < self.max_wasted_per_minute
+
+    def charge(self, requests: int):
+        if requests > 0:
+            self._wasted.append((time.monotonic(), requests))
+
+
+def _retrieve_outcome(task: "asyncio.Task"):
+    """Consume a finished prefetch's exception so abandoned ones don't log 'never retrieved'"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Abandoned speculative fetch failed: {str(task.exception())}")
+
+
+class SpeculativeFetch:
+    """One in-flight prefetch for a guessed mood"""
+
+    def __init__(self, mood: str, queries: List[str], total: int,
+                 deadline: Optional[Deadline] = None):
+        self.mood = mood
+        self.queries = queries
+        self.control = FetchControl(deadline)
+        self.running = False
+        self.task = asyncio.create_task(self._run(total))
+        self.task.add_done_callback(_retrieve_outcome)
+
+    async def _run(self, total: int) -> List[Dict[str, str]]:
+        # Results stay out of the search history until the guess is committed
+        deadline = self.control.deadline
+        async with scraping_limiter.slot(timeout=deadline.remaining() if deadline else None):
+            if self.control.is_cancelled():
+                return []
+            self.running = True
+            return await run_in_threadpool(
+                bind_profile(fetch_recommendations), self.queries, total,
+                record_history=False, control=self.control
+            )
+
+    def cancel(self):
+        """
+        Stop the fetch before its next upstream request. Once the worker
+        thread has started the task runs to completion, so the scraping slot
+        is held until the thread is actually done.
+        """
+        self.control.cancel()
+        if not self.running:
+            # Still queued for a slot: no thread to wait for
+            self.task.cancel()
+
+
+class SpeculationManager:
+    """Starts, commits and cancels speculative prefetches for /get-music"""
+
+    def __init__(self, max_moods: int = 1, max_wasted_per_minute: int = 30):
+        self.max_moods = max_moods
+        self.prior = MoodPrior()
+        self.budget = SpeculationBudget(max_wasted_per_minute)
+
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.wasted_requests = 0
+
+    def start(self, language: str, custom: str, total: int,
+              session_id: Optional[str] = None,
+              deadline: Optional[Deadline] = None) -> List[SpeculativeFetch]:
+        """
+        Start prefetches for the most likely moods if budget and capacity
+        allow; they stop at the calling request's deadline
+        """
+        if not self.budget.can_speculate():
+            self.skipped += 1
+            return []
+
+        fetches = []
+        for mood in self.prior.predict(session_id, self.max_moods):
+            # Never let speculation queue behind real work
+            if scraping_limiter.active + len(fetches) >= scraping_limiter.concurrency:
+                self.skipped += 1
+                break
+            queries = create_search_queries(mood, language, custom)
+            fetches.append(SpeculativeFetch(mood, queries, total, deadline))
+        self.started += len(fetches)
+        return fetches
+
+    async def resolve(self, fetches: List[SpeculativeFetch], mood: str,
+                      session_id: Optional[str] = None) -> Optional[List[Dict[str, str]]]:
+        """
+        Commit the prefetch matching the detected mood and cancel the rest.
+        Returns the committed results, or None when no guess matched.
+        """
+        self.prior.record(mood, session_id)
+        if not fetches:
+            return None
+
+        committed = None
+        for fetch in fetches:
+            if fetch.mood == mood and committed is None:
+                try:
+                    committed = await fetch.task
+                except Exception as e:
+                    logger.warning(f"Speculative fetch for {mood} failed: {str(e)}")
+                    committed = None
+            else:
+                fetch.cancel()
+                self.wasted_requests += fetch.control.requests_made
+                self.budget.charge(fetch.control.requests_made)
+
+        # An empty prefetch still means a full fetch, so only results count as a hit
+        if committed:
+            self.hits += 1
+            CACHE_HITS.labels(cache="speculative_prefetch").inc()
+        else:
+            self.misses += 1
+            CACHE_MISSES.labels(cache="speculative_prefetch").inc()
+        return committed
+
+    def cancel_all(self, fetches: List[SpeculativeFetch]):
+        """Abandon every prefetch, e.g. when inference failed"""
+        for fetch in fetches:
+            fetch.cancel()
+            self.wasted_requests += fetch.control.requests_made
+            self.budget.charge(fetch.control.requests_made)
+
+    def get_stats(self) -> Dict[str, object]:
+        resolved = self.hits + self.misses
+        return {
+            "enabled": SPECULATION_ENABLED,
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": round(self.hits / resolved, 3) if resolved else 0.0,
+            "wasted_requests": self.wasted_requests,
+            "wasted_last_minute": self.budget.wasted_last_minute(),
+            "max_wasted_per_minute": self.budget.max_wasted_per_minute,
+        }
+
+
+speculation_manager = SpeculationManager(
+    max_moods=int(os.environ.get("MOOD_SPECULATIVE_MAX_MOODS", 1)),
+    max_wasted_per_minute=int(os.environ.get("MOOD_SPECULATIVE_WASTE_BUDGET", 30)),
+)
+
+GaugeCallback(
+    "mood_speculation_wasted_requests",
+    "Upstream searches spent on cancelled speculative prefetches",
+    lambda: {(): speculation_manager.wasted_requests},
+)
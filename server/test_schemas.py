@@ -0,0 +1,23 @@
+import pytest
+from pydantic import ValidationError
+
+from schemas import BatchMusicRequest, WebcamCapture
+
+
+def test_capture_without_image_or_face_tensor_is_rejected():
+    with pytest.raises(ValidationError, match="image_data or face_tensor is required"):
+        WebcamCapture(language="english")
+
+
+def test_capture_with_only_a_manual_mood_is_accepted():
+    assert WebcamCapture(manual_mood="happy").image_data == ""
+
+
+def test_capture_with_image_or_face_tensor_is_accepted():
+    assert WebcamCapture(image_data="aGVsbG8=").face_tensor is None
+    assert WebcamCapture(face_tensor="TUZUMQ==").image_data == ""
+
+
+def test_batch_rejects_a_capture_with_neither():
+    with pytest.raises(ValidationError):
+        BatchMusicRequest(captures=[{"image_data": "aGVsbG8="}, {"language": "english"}])
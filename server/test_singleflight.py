@@ -0,0 +1,63 @@
+import threading
+import time
+
+from deadline import Deadline
+from singleflight import SingleFlight
+
+
+def _run_concurrently(flight, deadlines, delay=0.2):
+    """Call flight.do for each deadline, staggered slightly; return the results"""
+    calls = []
+    results = [None] * len(deadlines)
+
+    def fetch():
+        calls.append(1)
+        time.sleep(delay)
+        return "page"
+
+    def caller(i, deadline):
+        results[i] = flight.do("query", fetch, timeout=deadline.remaining(),
+                               expires_at=deadline.expires_at)
+
+    threads = []
+    for i, deadline in enumerate(deadlines):
+        thread = threading.Thread(target=caller, args=(i, deadline))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    return calls, results
+
+
+def test_callers_with_slightly_different_deadlines_share_one_call():
+    flight = SingleFlight("test", join_budget=15.0)
+    deadlines = []
+    for _ in range(5):
+        deadlines.append(Deadline(30))
+        time.sleep(0.005)
+
+    calls, results = _run_concurrently(flight, deadlines)
+
+    assert len(calls) == 1
+    assert results == ["page"] * 5
+    assert flight.get_stats()["coalesced_calls"] == 4
+    assert flight.get_stats()["outlasted_leaders"] == 0
+
+
+def test_caller_does_not_join_a_leader_about_to_expire():
+    flight = SingleFlight("test", join_budget=15.0)
+
+    calls, results = _run_concurrently(flight, [Deadline(1), Deadline(30)])
+
+    assert len(calls) == 2
+    assert results == ["page", "page"]
+    assert flight.get_stats()["outlasted_leaders"] == 1
+
+
+def test_short_caller_joins_a_leader_with_more_time():
+    flight = SingleFlight("test", join_budget=15.0)
+
+    calls, _ = _run_concurrently(flight, [Deadline(30), Deadline(2)])
+
+    assert len(calls) == 1
@@ -0,0 +1,382 @@
+"""
+Lightweight request tracing with OpenTelemetry-compatible identifiers and
+span fields, exported as JSONL to local disk.
+
+- Trace and span IDs are W3C Trace Context (16/8 random bytes as hex). An
+  incoming `traceparent` header continues the caller's trace, and inject()
+  / extract() carry context across process boundaries the same way.
+- The active span lives in a ContextVar, so it follows run_in_threadpool
+  and asyncio tasks automatically; bind_trace() carries it into plain
+  ThreadPoolExecutor workers.
+- Sampling is decided once per trace (MOOD_TRACE_SAMPLE_RATE). Unsampled
+  traces use a shared no-op span, and finished spans are queued to a
+  background writer so request threads never touch the disk.
+- Each line of MOOD_TRACE_DIR/spans-<pid>.jsonl is one span using OTLP's
+  field names (traceId, spanId, parentSpanId, startTimeUnixNano, ...).
+
+Off unless MOOD_TRACING_ENABLED=1. Reconstruct critical paths offline with:
+
+    python tracing.py critical-path traces/*.jsonl [--trace TRACE_ID]
+"""
+import argparse
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import logging
+from collections import defaultdict
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get("MOOD_TRACING_ENABLED", "0").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.environ.get("MOOD_TRACE_SAMPLE_RATE", 0.1))
+TRACE_DIR = os.environ.get("MOOD_TRACE_DIR", "traces")
+TRACE_QUEUE_SIZE = int(os.environ.get("MOOD_TRACE_QUEUE_SIZE", 10000))
+SERVICE_NAME = os.environ.get("MOOD_SERVICE_NAME", "mood-music-api")
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """One timed operation; ended by leaving its `with` block"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "events", "status", "status_message", "_token")
+
+    sampled = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str],
+                 kind: str = "INTERNAL", attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes) if attributes else {}
+        self.events: List[Dict[str, Any]] = []
+        self.status = "UNSET"
+        self.status_message = ""
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes):
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes})
+
+    def set_error(self, message: str):
+        self.status = "ERROR"
+        self.status_message = message
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self.status == "UNSET":
+            self.set_error(f"{exc_type.__name__}: {exc}")
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        exporter.export(self)
+        return False
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind}",
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": f"STATUS_CODE_{self.status}", "message": self.status_message},
+            "resource": {"service.name": SERVICE_NAME, "process.pid": os.getpid()},
+        }
+
+
+class _NoopSpan:
+    """Stands in for every span of an unsampled trace, or when tracing is off"""
+
+    sampled = False
+    trace_id = ""
+    span_id = ""
+
+    def __init__(self, trace_id: str = "", parent_id: str = ""):
+        self.trace_id = trace_id
+        self.span_id = parent_id
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def add_event(self, name: str, **attributes):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+    def __enter__(self):
+        # Children of an unsampled span must stay unsampled
+        if self.trace_id:
+            self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        return False
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-00" if self.trace_id else ""
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+
+def span(name: str, kind: str = "INTERNAL", parent: Optional[str] = None, **attributes):
+    """
+    Start a span as a context manager, as a child of the current span or of
+    `parent` (a traceparent string from another process or service). Starts
+    a new, possibly unsampled, trace when there is neither.
+    """
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+
+    if parent is not None:
+        match = _TRACEPARENT_RE.match(parent.strip().lower())
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            if not int(flags, 16) & 1:
+                return _NoopSpan(trace_id, parent_id)
+            return Span(name, trace_id, parent_id, kind, attributes)
+
+    current = _current_span.get()
+    if current is not None:
+        if not current.sampled:
+            return NOOP_SPAN
+        return Span(name, current.trace_id, current.span_id, kind, attributes)
+
+    trace_id = os.urandom(16).hex()
+    if random.random() >= TRACE_SAMPLE_RATE:
+        return _NoopSpan(trace_id, os.urandom(8).hex())
+    return Span(name, trace_id, None, kind, attributes)
+
+
+def current_span():
+    """The active span, or a no-op span outside any trace"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def inject() -> Dict[str, str]:
+    """Carrier holding the current trace context, e.g. for a process pool task"""
+    parent = _current_span.get()
+    if parent is None or not parent.trace_id:
+        return {}
+    return {TRACEPARENT_HEADER: parent.traceparent()}
+
+
+def extract(carrier: Dict[str, str]) -> Optional[str]:
+    """The traceparent from a carrier made by inject(), to pass as span(parent=...)"""
+    return carrier.get(TRACEPARENT_HEADER) if carrier else None
+
+
+def bind_trace(func: Callable) -> Callable:
+    """
+    Wrap a function submitted to a ThreadPoolExecutor so it runs inside the
+    submitting thread's current span. run_in_threadpool already does this.
+    """
+    if not TRACING_ENABLED:
+        return func
+    context = copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running a function inside a span named after it"""
+    def decorator(func: Callable) -> Callable:
+        if not TRACING_ENABLED:
+            return func
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class JsonlExporter:
+    """
+    Queues finished spans and appends them to a per-process JSONL file from
+    a background thread. When the queue is full spans are dropped, not waited on.
+    """
+
+    def __init__(self, directory: str, max_queue: int):
+        self.directory = directory
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def _ensure_started(self):
+        # Started lazily so forked workers each get their own writer and file
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def export(self, finished: Span):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"spans-{os.getpid()}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                lines = [item]
+                # Write whatever else is already waiting in one go
+                while len(lines) < 512:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._queue.put(None)
+                        break
+                    lines.append(item)
+                try:
+                    f.write("".join(json.dumps(s.to_dict(), default=str) + "\n" for s in lines))
+                    f.flush()
+                    self.exported += len(lines)
+                except Exception as e:
+                    logger.warning(f"Trace export failed: {str(e)}")
+
+    def shutdown(self, timeout: float = 2.0):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "enabled": TRACING_ENABLED,
+            "sample_rate": TRACE_SAMPLE_RATE,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
+
+
+exporter = JsonlExporter(TRACE_DIR, TRACE_QUEUE_SIZE)
+if TRACING_ENABLED:
+    atexit.register(exporter.shutdown)
+
+
+def get_tracing_stats() -> Dict[str, Any]:
+    return exporter.get_stats()
+
+
+def load_traces(paths: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Group exported spans by trace id"""
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    traces[record["traceId"]].append(record)
+    return traces
+
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    From the root, repeatedly follow the child that finished last, i.e. the
+    one its parent was waiting on. Returns the chain root first.
+    """
+    by_id = {s["spanId"]: s for s in spans}
+    children: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    roots = []
+    for s in spans:
+        if s["parentSpanId"] in by_id:
+            children[s["parentSpanId"]].append(s)
+        else:
+            roots.append(s)
+    if not roots:
+        return []
+    node = max(roots, key=lambda s: s["endTimeUnixNano"] - s["startTimeUnixNano"])
+    chain = [node]
+    while children.get(node["spanId"]):
+        node = max(children[node["spanId"]], key=lambda s: s["endTimeUnixNano"])
+        chain.append(node)
+    return chain
+
+
+def _print_critical_path(trace_id: str, spans: List[Dict[str, Any]]):
+    chain = critical_path(spans)
+    if not chain:
+        return
+    total = (chain[0]["endTimeUnixNano"] - chain[0]["startTimeUnixNano"]) / 1e6
+    print(f"trace {trace_id}: {total:.1f} ms, {len(spans)} spans")
+    origin = chain[0]["startTimeUnixNano"]
+    for depth, s in enumerate(chain):
+        duration = (s["endTimeUnixNano"] - s["startTimeUnixNano"]) / 1e6
+        offset = (s["startTimeUnixNano"] - origin) / 1e6
+        attributes = " ".join(f"{k}={v}" for k, v in s.get("attributes", {}).items())
+        print(f"  {'  ' * depth}{s['name']}  +{offset:.1f} ms  {duration:.1f} ms  {attributes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect exported JSONL traces")
+    sub = parser.add_subparsers(dest="command", required=True)
+    critical = sub.add_parser("critical-path", help="Print each trace's critical path")
+    critical.add_argument("files", nargs="+")
+    critical.add_argument("--trace", help="Only this trace id")
+    critical.add_argument("--slowest", type=int, default=10, help="How many of the slowest traces to show")
+    args = parser.parse_args()
+
+    traces = load_traces(args.files)
+    if args.trace:
+        _print_critical_path(args.trace, traces.get(args.trace, []))
+        return
+
+    def root_duration(spans):
+        return max(s["endTimeUnixNano"] for s in spans) - min(s["startTimeUnixNano"] for s in spans)
+
+    for trace_id, spans in sorted(traces.items(), key=lambda item: root_duration(item[1]),
+                                  reverse=True)[:args.slowest]:
+        _print_critical_path(trace_id, spans)
+
+
+if __name__ == "__main__":
+    main()
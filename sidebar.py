@@ -1,5 +1,14 @@
 import streamlit as st
 from emotion_detector import is_deepface_available, get_deepface_error
+from music_manager import get_search_cache
+from remote_backend import REMOTE_MODE, REMOTE_API_URL
+
+def format_hit_rate(hits: int, misses: int) -> str:
+    """Format a cache hit rate with its counts"""
+    total = hits + misses
+    if not total:
+        return "no lookups yet"
+    return f"{hits / total:.0%} ({hits}/{total})"
 
 def render_sidebar():
     """Render the sidebar with settings and options"""
@@ -7,7 +16,7 @@ def render_sidebar():
         st.header("⚙️ Settings & Options")
         
         if st.button("🗑️ Clear Playlist", use_container_width=True):
-            for key in ["video_urls", "video_titles", "current_video_index", "current_mood"]:
+            for key in ["video_urls", "video_titles", "current_video_index", "current_mood", "playlist"]:
                 if key in st.session_state:
                     if key == "current_video_index":
                         st.session_state[key] = 0
@@ -37,13 +46,25 @@ def render_sidebar():
         
         with st.expander("🔧 Technical Details"):
             deepface_status = "✅ Working" if is_deepface_available() else f"❌ Error: {get_deepface_error()}"
+            backend = f"Remote server ({REMOTE_API_URL})" if REMOTE_MODE else "Local"
             st.markdown(f"""
+            - **Backend:** {backend}
             - **DeepFace Status:** {deepface_status}
             - **Supported Languages:** English, Hindi, Bengali
             - **Supported Emotions:** Happy, Sad, Angry, Fear, Surprise, Disgust, Neutral
             - **Search History:** {len(st.session_state.get('search_history', set()))} unique videos
             """)
             
+            stats = st.session_state.get("cache_stats", {})
+            search_cache = get_search_cache()
+            last_rerun = st.session_state.get("last_rerun_ms")
+            st.markdown(f"""
+            - **Last Rerun:** {f"{last_rerun:.0f} ms" if last_rerun is not None else "n/a"}
+            - **Search Cache (this session):** {format_hit_rate(stats.get("search_hits", 0), stats.get("search_misses", 0))}
+            - **Search Cache (all sessions):** {format_hit_rate(search_cache.hits, search_cache.misses)}, {len(search_cache.entries)} cached searches
+            - **Image Analysis Cache:** {format_hit_rate(stats.get("analysis_hits", 0), stats.get("analysis_misses", 0))}
+            """)
+            
             if not is_deepface_available():
                 st.markdown("### 🔧 Troubleshooting:")
                 st.markdown("""
@@ -0,0 +1,277 @@
+"""
+Distil a large emotion classifier into small students for CPU serving.
+
+1. The teacher (the notebook CNN, a saved .keras model, or DeepFace's
+   emotion model) is distilled into a base student.
+2. Each smaller student is made by channel pruning the base student (the
+   filters with the smallest L1 norm are dropped, layer by layer) and
+   fine-tuned with distillation again.
+3. Every model is scored on the test split and timed per image on the CPU,
+   through the same eager call server/emotion_detector.py makes.
+
+    python distill.py --cache-dir fer_cache --teacher deepface --export student.keras
+    python distill.py --synthetic 2000 --epochs 1 --teacher-epochs 1   # smoke test, no GPU needed
+
+Serve an exported student with MOOD_EMOTION_MODEL_PATH=student.keras.
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras.layers import (
+    Activation,
+    BatchNormalization,
+    Conv2D,
+    Dense,
+    Dropout,
+    GlobalAveragePooling2D,
+    Input,
+    MaxPooling2D,
+)
+
+from fer_data import (
+    IMAGE_SIZE,
+    NUM_CLASSES,
+    BatchStream,
+    build_cache,
+    load_cache,
+    load_split,
+    scaled_split_sizes,
+    split_indices,
+    write_synthetic_csv,
+)
+
+# Filters per block; each block is two 3x3 convolutions and a 2x2 pool
+BASE_FILTERS = (32, 64, 128)
+DEFAULT_WIDTHS = (1.0, 0.5, 0.25)
+MIN_FILTERS = 4
+
+
+def build_student(conv_filters: Sequence[int]) -> keras.Sequential:
+    """Small CNN returning logits; conv_filters lists every convolution's width"""
+    layers = [Input(shape=(IMAGE_SIZE, IMAGE_SIZE, 1))]
+    for i, filters in enumerate(conv_filters):
+        layers += [
+            Conv2D(filters, kernel_size=(3, 3), padding="same", use_bias=False),
+            BatchNormalization(),
+            Activation("relu"),
+        ]
+        if i % 2 == 1:
+            layers.append(MaxPooling2D(pool_size=(2, 2)))
+    # Global pooling instead of Flatten keeps channel pruning a simple index selection
+    layers += [GlobalAveragePooling2D(), Dropout(0.3), Dense(NUM_CLASSES)]
+    return keras.Sequential(layers)
+
+
+def base_conv_filters(base_filters: Sequence[int]) -> List[int]:
+    return [filters for filters in base_filters for _ in range(2)]
+
+
+def conv_filters_of(model: keras.Sequential) -> List[int]:
+    return [layer.filters for layer in model.layers if isinstance(layer, Conv2D)]
+
+
+def prune_channels(model: keras.Sequential, ratio: float) -> keras.Sequential:
+    """
+    Structured pruning: keep the `ratio` fraction of each convolution's
+    filters with the largest L1 norm, slicing the following batch norm,
+    the next convolution's input channels and the classifier to match
+    """
+    kept_filters = [max(MIN_FILTERS, int(round(f * ratio))) for f in conv_filters_of(model)]
+    pruned = build_student(kept_filters)
+
+    keep = np.arange(1)  # input channels
+    for old, new in zip(model.layers, pruned.layers):
+        if isinstance(old, Conv2D):
+            kernel = old.get_weights()[0][:, :, keep, :]
+            norms = np.abs(kernel).sum(axis=(0, 1, 2))
+            keep = np.sort(np.argsort(norms)[::-1][:new.filters])
+            new.set_weights([kernel[..., keep]])
+        elif isinstance(old, BatchNormalization):
+            new.set_weights([weights[keep] for weights in old.get_weights()])
+        elif isinstance(old, Dense):
+            kernel, bias = old.get_weights()
+            new.set_weights([kernel[keep], bias])
+    return pruned
+
+
+def distill(student: keras.Model, teacher, stream: BatchStream, epochs: int,
+            temperature: float = 4.0, alpha: float = 0.3, learning_rate: float = 1e-3):
+    """
+    Train the student on alpha * hard-label loss + (1 - alpha) * T^2 * KL to
+    the teacher's temperature-softened predictions
+    """
+    optimizer = keras.optimizers.Adam(learning_rate=learning_rate)
+
+    @tf.function
+    def train_step(x, y):
+        teacher_probs = teacher(x, training=False)
+        soft_targets = tf.nn.softmax(tf.math.log(teacher_probs + 1e-7) / temperature)
+        with tf.GradientTape() as tape:
+            logits = student(x, training=True)
+            hard_loss = keras.losses.categorical_crossentropy(y, logits, from_logits=True)
+            soft_loss = keras.losses.kl_divergence(soft_targets, tf.nn.softmax(logits / temperature))
+            loss = tf.reduce_mean(alpha * hard_loss + (1 - alpha) * temperature ** 2 * soft_loss)
+        gradients = tape.gradient(loss, student.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, student.trainable_variables))
+        return loss
+
+    batches = iter(stream)
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        losses = [float(train_step(*next(batches))) for _ in range(len(stream))]
+        print(f"  epoch {epoch + 1}/{epochs}: loss {np.mean(losses):.4f} ({time.perf_counter() - start:.0f}s)")
+
+
+def probabilities(model, x: np.ndarray, logits: bool) -> np.ndarray:
+    outputs = model.predict(x, batch_size=256, verbose=0)
+    return tf.nn.softmax(outputs).numpy() if logits else outputs
+
+
+def cpu_latency_ms(model, runs: int = 200) -> Dict[str, float]:
+    """Per-image latency of an eager call, as in server/emotion_detector.classify_faces"""
+    x = np.random.rand(1, IMAGE_SIZE, IMAGE_SIZE, 1).astype(np.float32)
+    with tf.device("/CPU:0"):
+        for _ in range(10):
+            model(x, training=False)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            np.asarray(model(x, training=False))
+            timings.append((time.perf_counter() - start) * 1000)
+    p50, p95 = np.percentile(timings, [50, 95])
+    return {"p50": p50, "p95": p95}
+
+
+def load_teacher(spec: str, cache_dir: str, epochs: int, batch_size: int, workers: int):
+    """'deepface', 'notebook' (train the notebook CNN now) or a saved .keras model"""
+    if spec == "deepface":
+        from deepface import DeepFace
+        return DeepFace.build_model(model_name="Emotion", task="facial_attribute").model
+    if spec == "notebook":
+        from train import build_baseline_model, train
+        teacher = build_baseline_model()
+        print(f"Training notebook CNN teacher for {epochs} epoch(s)...")
+        train(teacher, cache_dir, epochs, batch_size, workers)
+        return teacher
+    return keras.models.load_model(spec)
+
+
+def format_table(rows: List[Dict]) -> str:
+    lines = [
+        "| model | conv filters | params | test accuracy | teacher agreement | CPU ms/image p50 | p95 |",
+        "|---|---|---:|---:|---:|---:|---:|",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['name']} | {row['filters']} | {row['params']:,} | {row['accuracy']:.4f} | "
+            f"{row['agreement']:.4f} | {row['latency']['p50']:.2f} | {row['latency']['p95']:.2f} |"
+        )
+    return "\n".join(lines)
+
+
+def export_student(student: keras.Model, path: str):
+    """Save with a softmax head so it is a drop-in for DeepFace's emotion model"""
+    export = keras.Sequential([Input(shape=(IMAGE_SIZE, IMAGE_SIZE, 1)), student, Activation("softmax")])
+    export.save(path)
+
+
+def run(args, cache_dir: str):
+    images, labels, usage = load_cache(cache_dir)
+    stream = BatchStream(images, labels, split_indices(usage, "train"),
+                         batch_size=args.batch_size, workers=args.workers, seed=0)
+    test_x, test_y = load_split(cache_dir, "test")
+    test_true = np.argmax(test_y, axis=1)
+
+    teacher = load_teacher(args.teacher, cache_dir, args.teacher_epochs, args.batch_size, args.workers)
+    teacher_pred = np.argmax(probabilities(teacher, test_x, logits=False), axis=1)
+    rows = [{
+        "name": f"teacher ({args.teacher})",
+        "filters": "-",
+        "params": teacher.count_params(),
+        "accuracy": float(np.mean(teacher_pred == test_true)),
+        "agreement": 1.0,
+        "latency": cpu_latency_ms(teacher, args.latency_runs),
+    }]
+
+    students = {}
+    base, base_width = None, 1.0
+    for width in sorted(args.widths, reverse=True):
+        if base is None:
+            filters = [max(MIN_FILTERS, int(round(f * width))) for f in base_conv_filters(args.base_filters)]
+            student = build_student(filters)
+            print(f"Distilling student x{width} ({'-'.join(map(str, filters))})...")
+        else:
+            student = prune_channels(base, width / base_width)
+            print(f"Pruning to x{width} ({'-'.join(map(str, conv_filters_of(student)))}) and fine-tuning...")
+        distill(student, teacher, stream, args.epochs, args.temperature, args.alpha)
+        if base is None:
+            base, base_width = student, width
+
+        student_pred = np.argmax(probabilities(student, test_x, logits=True), axis=1)
+        rows.append({
+            "name": f"student x{width}" + (" (pruned)" if student is not base else ""),
+            "filters": "-".join(map(str, conv_filters_of(student))),
+            "params": student.count_params(),
+            "accuracy": float(np.mean(student_pred == test_true)),
+            "agreement": float(np.mean(student_pred == teacher_pred)),
+            "latency": cpu_latency_ms(student, args.latency_runs),
+        })
+        students[width] = student
+
+    table = format_table(rows)
+    print("\n" + table)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(table + "\n")
+
+    if args.export:
+        width = args.export_width if args.export_width in students else min(students)
+        export_student(students[width], args.export)
+        print(f"\nExported student x{width} to {args.export}; serve it with MOOD_EMOTION_MODEL_PATH={args.export}")
+
+
+def parse_floats(value: str) -> List[float]:
+    return [float(part) for part in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distil and prune small emotion classifiers")
+    parser.add_argument("--cache-dir", default="fer_cache", help="FER-2013 cache from fer_data.py build")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="ROWS",
+                        help="use a random synthetic dataset of this many rows instead of --cache-dir")
+    parser.add_argument("--teacher", default="notebook",
+                        help="'notebook', 'deepface' or a path to a saved .keras model (default: notebook)")
+    parser.add_argument("--teacher-epochs", type=int, default=30, help="epochs when training the notebook teacher")
+    parser.add_argument("--base-filters", type=lambda v: [int(p) for p in v.split(",")],
+                        default=list(BASE_FILTERS), help="filters per block of the x1.0 student")
+    parser.add_argument("--widths", type=parse_floats, default=list(DEFAULT_WIDTHS),
+                        help="student widths relative to --base-filters (default: 1.0,0.5,0.25)")
+    parser.add_argument("--epochs", type=int, default=20, help="distillation epochs per student")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4, help="augmentation threads")
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--alpha", type=float, default=0.3, help="weight of the hard-label loss")
+    parser.add_argument("--latency-runs", type=int, default=200)
+    parser.add_argument("--report", help="also write the table to this markdown file")
+    parser.add_argument("--export", help="save a student for serving to this .keras path")
+    parser.add_argument("--export-width", type=float, default=0.0,
+                        help="which student to export (default: the smallest)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "fer2013.csv")
+            write_synthetic_csv(csv_path, scaled_split_sizes(args.synthetic))
+            run(args, build_cache(csv_path, os.path.join(tmp, "cache")))
+    else:
+        run(args, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+FER-2013 preprocessing and streaming batches for training.
+
+The CSV is parsed once, chunk by chunk, with a vectorized parse of the
+`pixels` column straight into a uint8 memory-mapped .npy cache (about
+80 MB for the full dataset instead of ~330 MB of float32 arrays).
+Training then streams batches from the memmap, with augmentation applied
+on the fly by a thread pool, instead of holding the whole dataset in
+memory for ImageDataGenerator.
+
+    python fer_data.py build --csv fer_dataset/fer2013.csv --cache-dir fer_cache
+    python fer_data.py bench                 # synthetic CSV of FER-2013 size
+"""
+import argparse
+import json
+import os
+import queue
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+import pandas as pd
+
+IMAGE_SIZE = 48
+PIXELS_PER_IMAGE = IMAGE_SIZE * IMAGE_SIZE
+NUM_CLASSES = 7
+EMOTION_LABELS = ["Angry", "Disgust", "Fear", "Happy", "Sad", "Surprise", "Neutral"]
+USAGE_CODES = {"Training": 0, "PublicTest": 1, "PrivateTest": 2}
+SPLITS = {"train": 0, "val": 1, "test": 2}
+
+# FER-2013 row counts per split, for synthetic benchmarks
+FER_SPLIT_SIZES = {"Training": 28709, "PublicTest": 3589, "PrivateTest": 3589}
+
+CHUNK_ROWS = 4096
+CACHE_VERSION = 1
+
+
+def parse_pixels(pixel_strings: pd.Series) -> np.ndarray:
+    """Space-separated pixel strings -> (n, 48, 48) uint8, in one vectorized parse"""
+    flat = np.fromstring(" ".join(pixel_strings), dtype=np.uint8, sep=" ")
+    if flat.size != len(pixel_strings) * PIXELS_PER_IMAGE:
+        raise ValueError(f"Expected {PIXELS_PER_IMAGE} pixels per row, got {flat.size / len(pixel_strings):.1f}")
+    return flat.reshape(-1, IMAGE_SIZE, IMAGE_SIZE)
+
+
+def _cache_meta(csv_path: str) -> Dict:
+    stat = os.stat(csv_path)
+    return {"version": CACHE_VERSION, "source": os.path.abspath(csv_path),
+            "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def build_cache(csv_path: str, cache_dir: str, force: bool = False) -> str:
+    """
+    Parse the CSV into images.npy (uint8 memmap), labels.npy and usage.npy
+    in cache_dir. Reuses an existing cache built from the same file.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    meta = _cache_meta(csv_path)
+    if not force and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == meta:
+                return cache_dir
+
+    # First pass reads only the small columns, to size the memmap
+    small = pd.read_csv(csv_path, usecols=["emotion", "Usage"])
+    labels = small["emotion"].to_numpy(dtype=np.uint8)
+    usage = small["Usage"].map(USAGE_CODES).to_numpy(dtype=np.uint8)
+    np.save(os.path.join(cache_dir, "labels.npy"), labels)
+    np.save(os.path.join(cache_dir, "usage.npy"), usage)
+
+    images = np.lib.format.open_memmap(
+        os.path.join(cache_dir, "images.npy"), mode="w+", dtype=np.uint8,
+        shape=(len(labels), IMAGE_SIZE, IMAGE_SIZE),
+    )
+    row = 0
+    for chunk in pd.read_csv(csv_path, usecols=["pixels"], chunksize=CHUNK_ROWS):
+        parsed = parse_pixels(chunk["pixels"])
+        images[row:row + len(parsed)] = parsed
+        row += len(parsed)
+    images.flush()
+    del images
+
+    # Written last, so an interrupted build is never mistaken for a complete one
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return cache_dir
+
+
+def load_cache(cache_dir: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(images memmap, labels, usage codes)"""
+    images = np.load(os.path.join(cache_dir, "images.npy"), mmap_mode="r")
+    labels = np.load(os.path.join(cache_dir, "labels.npy"))
+    usage = np.load(os.path.join(cache_dir, "usage.npy"))
+    return images, labels, usage
+
+
+def split_indices(usage: np.ndarray, split: str) -> np.ndarray:
+    return np.flatnonzero(usage == SPLITS[split])
+
+
+def load_split(cache_dir: str, split: str) -> Tuple[np.ndarray, np.ndarray]:
+    """A whole split as model inputs (float32 in [0, 1]) and one-hot labels, for evaluation"""
+    images, labels, usage = load_cache(cache_dir)
+    indices = split_indices(usage, split)
+    return to_model_input(images[indices]), one_hot(labels[indices])
+
+
+def to_model_input(images: np.ndarray) -> np.ndarray:
+    """uint8 (n, 48, 48) -> float32 (n, 48, 48, 1) in [0, 1]"""
+    return (images.astype(np.float32) / 255.0)[..., np.newaxis]
+
+
+def one_hot(labels: np.ndarray) -> np.ndarray:
+    return np.eye(NUM_CLASSES, dtype=np.float32)[labels]
+
+
+def augment(image: np.ndarray, rng: np.random.Generator, rotation: float = 10.0,
+            shift: float = 0.1, zoom: float = 0.1) -> np.ndarray:
+    """
+    Random rotation, shift, zoom and horizontal flip in one affine warp, with
+    the same ranges as the notebook's ImageDataGenerator
+    """
+    center = (IMAGE_SIZE / 2, IMAGE_SIZE / 2)
+    matrix = cv2.getRotationMatrix2D(
+        center, rng.uniform(-rotation, rotation), rng.uniform(1 - zoom, 1 + zoom)
+    )
+    matrix[:, 2] += rng.uniform(-shift, shift, size=2) * IMAGE_SIZE
+    if rng.random() < 0.5:
+        # Mirror: x' = size - x, folded into the same warp
+        matrix[0] = -matrix[0]
+        matrix[0, 2] += IMAGE_SIZE
+    return cv2.warpAffine(image, matrix, (IMAGE_SIZE, IMAGE_SIZE), borderMode=cv2.BORDER_REFLECT_101)
+
+
+class BatchStream:
+    """
+    Endless stream of (inputs, one-hot labels) batches read from the memmap.
+
+    Batches are assembled by a thread pool (cv2 releases the GIL while
+    warping) and queued `prefetch` batches ahead of the consumer; pass the
+    stream straight to model.fit with steps_per_epoch=len(stream).
+    """
+
+    def __init__(self, images: np.ndarray, labels: np.ndarray, indices: np.ndarray,
+                 batch_size: int = 64, augment: bool = True, shuffle: bool = True,
+                 workers: int = 4, prefetch: int = 8, seed: Optional[int] = None):
+        self.images = images
+        self.labels = labels
+        self.indices = indices
+        self.batch_size = batch_size
+        self.augment = augment
+        self.shuffle = shuffle
+        self.workers = workers
+        self.prefetch = prefetch
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return len(self.indices) // self.batch_size
+
+    def _batch_order(self) -> Iterator[np.ndarray]:
+        while True:
+            order = self.rng.permutation(self.indices) if self.shuffle else self.indices
+            for start in range(0, len(self) * self.batch_size, self.batch_size):
+                # Sorted reads walk the memmap forwards
+                yield np.sort(order[start:start + self.batch_size])
+
+    def _make_batch(self, batch_indices: np.ndarray, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+        images = self.images[batch_indices]
+        if self.augment:
+            rng = np.random.default_rng(seed)
+            images = np.stack([augment(image, rng) for image in images])
+        return to_model_input(images), one_hot(self.labels[batch_indices])
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        pending: "queue.Queue" = queue.Queue()
+        order = self._batch_order()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fer-batch") as pool:
+            for _ in range(self.prefetch):
+                pending.put(pool.submit(self._make_batch, next(order), int(self.rng.integers(2**31))))
+            while True:
+                batch = pending.get().result()
+                pending.put(pool.submit(self._make_batch, next(order), int(self.rng.integers(2**31))))
+                yield batch
+
+
+def scaled_split_sizes(rows: int) -> Dict[str, int]:
+    """FER-2013's split proportions scaled to `rows` in total"""
+    total = sum(FER_SPLIT_SIZES.values())
+    return {usage: max(1, count * rows // total) for usage, count in FER_SPLIT_SIZES.items()}
+
+
+def write_synthetic_csv(path: str, sizes: Optional[Dict[str, int]] = None, seed: int = 0):
+    """A CSV shaped like fer2013.csv with random pixels"""
+    sizes = sizes or FER_SPLIT_SIZES
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("emotion,pixels,Usage\n")
+        for usage, count in sizes.items():
+            for start in range(0, count, CHUNK_ROWS):
+                n = min(CHUNK_ROWS, count - start)
+                pixels = rng.integers(0, 256, size=(n, PIXELS_PER_IMAGE), dtype=np.uint8)
+                emotions = rng.integers(0, NUM_CLASSES, size=n)
+                f.writelines(
+                    f"{emotion},{' '.join(map(str, row))},{usage}\n"
+                    for emotion, row in zip(emotions, pixels.tolist())
+                )
+
+
+def notebook_preprocess(csv_path: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """The notebook's CRNO path (per-row list comprehension into float32), for comparison"""
+    data = pd.read_csv(csv_path)
+    splits = {}
+    for name, usage in (("train", "Training"), ("val", "PublicTest"), ("test", "PrivateTest")):
+        df = data[data["Usage"] == usage].copy()
+        df["pixels"] = df["pixels"].apply(lambda pixel_sequence: [int(pixel) for pixel in pixel_sequence.split()])
+        data_x = np.array(df["pixels"].tolist(), dtype="float32").reshape(-1, IMAGE_SIZE, IMAGE_SIZE, 1) / 255.0
+        splits[name] = (data_x, one_hot(df["emotion"].to_numpy()))
+    return splits
+
+
+def _measure(func, *args):
+    """(seconds, peak traced MB, result)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, result
+
+
+def run_benchmark(rows: Optional[int], batches: int, workers: int):
+    sizes = scaled_split_sizes(rows) if rows else FER_SPLIT_SIZES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "fer2013.csv")
+        print(f"Writing synthetic CSV with {sum(sizes.values())} rows...")
+        write_synthetic_csv(csv_path, sizes)
+        print(f"CSV size: {os.path.getsize(csv_path) / 2**20:.0f} MB\n")
+
+        seconds, peak, splits = _measure(notebook_preprocess, csv_path)
+        notebook_mb = sum(x.nbytes + y.nbytes for x, y in splits.values()) / 2**20
+        del splits
+        print(f"{'method':<28} {'seconds':>8} {'peak MB':>9} {'result MB':>10}")
+        print(f"{'notebook CRNO (float32)':<28} {seconds:>8.2f} {peak:>9.0f} {notebook_mb:>10.0f}")
+
+        cache_dir = os.path.join(tmp, "cache")
+        seconds, peak, _ = _measure(build_cache, csv_path, cache_dir)
+        cache_mb = os.path.getsize(os.path.join(cache_dir, "images.npy")) / 2**20
+        print(f"{'vectorized -> uint8 memmap':<28} {seconds:>8.2f} {peak:>9.0f} {cache_mb:>10.0f}")
+
+        seconds, _, _ = _measure(build_cache, csv_path, cache_dir)
+        print(f"{'cached (rebuild skipped)':<28} {seconds:>8.2f}")
+
+        images, labels, usage = load_cache(cache_dir)
+        stream = BatchStream(images, labels, split_indices(usage, "train"), workers=workers, seed=0)
+        batches = min(batches, len(stream))
+        iterator = iter(stream)
+        next(iterator)
+        start = time.perf_counter()
+        for _ in range(batches):
+            next(iterator)
+        elapsed = time.perf_counter() - start
+        print(f"\nAugmented batch stream ({workers} workers): "
+              f"{batches / elapsed:.0f} batches/s, {batches * stream.batch_size / elapsed:.0f} images/s")
+        del images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FER-2013 preprocessing cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="parse the CSV into a memmap cache")
+    build.add_argument("--csv", required=True)
+    build.add_argument("--cache-dir", default="fer_cache")
+    build.add_argument("--force", action="store_true", help="rebuild even if the cache is current")
+
+    bench = subparsers.add_parser("bench", help="time preprocessing on a synthetic CSV")
+    bench.add_argument("--rows", type=int, default=0, help="total rows (default: FER-2013 size)")
+    bench.add_argument("--batches", type=int, default=200)
+    bench.add_argument("--workers", type=int, default=4)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        build_cache(args.csv, args.cache_dir, force=args.force)
+        images, _, usage = load_cache(args.cache_dir)
+        counts = {split: len(split_indices(usage, split)) for split in SPLITS}
+        print(f"Cache ready in {time.perf_counter() - start:.1f}s: {images.shape[0]} images {counts}")
+    else:
+        run_benchmark(args.rows, args.batches, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Train the notebook's emotion CNN on the FER-2013 cache, streaming batches.
+
+    python fer_data.py build --csv fer_dataset/fer2013.csv --cache-dir fer_cache
+    python train.py --cache-dir fer_cache --epochs 50
+"""
+import argparse
+
+from fer_data import (
+    IMAGE_SIZE,
+    NUM_CLASSES,
+    BatchStream,
+    load_cache,
+    load_split,
+    split_indices,
+)
+
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.layers import Activation, BatchNormalization, Conv2D, Dense, Flatten, MaxPooling2D
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.optimizers import Adam
+
+
+def build_baseline_model(num_features: int = 64) -> Sequential:
+    """The CNN from mood_detection.ipynb"""
+    model = Sequential()
+    model.add(Conv2D(4 * num_features, kernel_size=(3, 3), input_shape=(IMAGE_SIZE, IMAGE_SIZE, 1),
+                     data_format="channels_last"))
+    model.add(BatchNormalization())
+    model.add(Activation("relu"))
+    model.add(Conv2D(4 * num_features, kernel_size=(3, 3), padding="same"))
+    model.add(BatchNormalization())
+    model.add(Activation("relu"))
+    model.add(MaxPooling2D(pool_size=(2, 2), strides=(2, 2)))
+
+    for filters in (2 * num_features, num_features):
+        model.add(Conv2D(filters, kernel_size=(3, 3), padding="same"))
+        model.add(BatchNormalization())
+        model.add(Activation("relu"))
+        model.add(Conv2D(filters, kernel_size=(3, 3), padding="same"))
+        model.add(BatchNormalization())
+        model.add(Activation("relu"))
+        model.add(MaxPooling2D(pool_size=(2, 2), strides=(2, 2)))
+
+    model.add(Flatten())
+    for units in (8 * num_features, 4 * num_features, 2 * num_features):
+        model.add(Dense(units))
+        model.add(BatchNormalization())
+        model.add(Activation("relu"))
+    model.add(Dense(NUM_CLASSES, activation="softmax"))
+
+    model.compile(
+        loss="categorical_crossentropy",
+        optimizer=Adam(learning_rate=0.001, beta_1=0.9, beta_2=0.999, epsilon=1e-7),
+        metrics=["accuracy"],
+    )
+    return model
+
+
+def train(model, cache_dir: str, epochs: int, batch_size: int, workers: int, patience: int = 10):
+    """Fit on streamed, augmented training batches; validation is small enough to hold in memory"""
+    images, labels, usage = load_cache(cache_dir)
+    stream = BatchStream(images, labels, split_indices(usage, "train"),
+                         batch_size=batch_size, workers=workers)
+    val_x, val_y = load_split(cache_dir, "val")
+    es = EarlyStopping(monitor="val_loss", patience=patience, mode="min", restore_best_weights=True)
+    return model.fit(
+        iter(stream),
+        steps_per_epoch=len(stream),
+        epochs=epochs,
+        verbose=2,
+        callbacks=[es],
+        validation_data=(val_x, val_y),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the emotion CNN from the FER-2013 cache")
+    parser.add_argument("--cache-dir", default="fer_cache")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4, help="augmentation threads")
+    parser.add_argument("--output", default="emotion_recognition_model.keras")
+    args = parser.parse_args()
+
+    model = build_baseline_model()
+    train(model, args.cache_dir, args.epochs, args.batch_size, args.workers)
+
+    test_x, test_y = load_split(args.cache_dir, "test")
+    _, accuracy = model.evaluate(test_x, test_y, verbose=0)
+    print(f"CNN Model Accuracy on test set: {accuracy:.4f}")
+    model.save(args.output)
+
+
+if __name__ == "__main__":
+    main()